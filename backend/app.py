@@ -7,10 +7,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+from utils.state_store import configure_state_store, get_state_store
 
 # Load environment variables
 load_dotenv()
 
+def default_state_store_url(model_cache='model_cache'):
+    return os.getenv('STATE_STORE_URL', f"sqlite:///{os.path.join(model_cache, 'state.db')}")
+
 def create_app():
     # Initialize Flask app
     app = Flask(__name__)
@@ -20,17 +24,26 @@ def create_app():
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     app.config['UPLOAD_FOLDER'] = 'uploads'
     app.config['MODEL_CACHE'] = 'model_cache'
+    app.config['STATE_STORE_URL'] = default_state_store_url(app.config['MODEL_CACHE'])
+    app.config['MODEL_OWNER_LOCK'] = os.path.join(app.config['MODEL_CACHE'], 'model_owner.lock')
+    app.config['MODEL_OWNER_TIMEOUT'] = None
+    app.config['METRICS_DB'] = os.path.join(app.config['MODEL_CACHE'], 'metrics.db')
 
     # Create necessary directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['MODEL_CACHE'], exist_ok=True)
 
+    # Training/deployment state lives in a store shared by all worker processes
+    configure_state_store(app.config['STATE_STORE_URL'])
+
     # Import routes
     from routes.upload import upload_bp
     from routes.model import model_bp
     from routes.training import training_bp
     from routes.monitor import monitor_bp
     from routes.export import export_bp
+    from routes.evaluate import evaluate_bp
+    from routes.inference import inference_bp
 
     # Register blueprints
     app.register_blueprint(upload_bp, url_prefix='/api')
@@ -38,6 +51,8 @@ def create_app():
     app.register_blueprint(training_bp, url_prefix='/api')
     app.register_blueprint(monitor_bp, url_prefix='/api')
     app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(evaluate_bp, url_prefix='/api')
+    app.register_blueprint(inference_bp, url_prefix='/api')
 
     @app.route('/api/health')
     def health_check():
@@ -50,4 +65,6 @@ def create_app():
 
 if __name__ == '__main__':
     app = create_app()
+    # A fresh single-process server starts without stale state from earlier runs
+    get_state_store().clear()
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Compare CPU training step time and peak RSS of the default settings and training profiles.
+
+Usage:
+    python benchmarks/cpu_profile.py --model sshleifer/tiny-gpt2 --profiles default cpu_memory_saving --compile
+
+Every configuration trains the same model on the same synthetic dataset for a fixed
+number of steps in its own spawned process, so peak RSS is not inflated by earlier
+runs. Step time is averaged after the warm-up steps (which include compilation with
+``--compile``). Results are written as JSON so runs on different machines can be
+compared.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+
+def make_synthetic_dataset(path, num_samples, words_per_sample):
+    """Write a CSV with a ``text`` column of pseudo-random sentences."""
+    vocabulary = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+    rows = [
+        ' '.join(vocabulary[(i * 7 + j * 3) % len(vocabulary)] for j in range(words_per_sample))
+        for i in range(num_samples)
+    ]
+    pd.DataFrame({'text': rows}).to_csv(path, index=False)
+
+
+def run_configuration(model_name, config, dataset_path, output_dir, warmup_steps, results):
+    """Child process: train for ``max_steps`` and report step times and peak RSS."""
+    import resource
+
+    import psutil
+    from transformers import AutoModelForCausalLM, AutoTokenizer, DataCollatorForLanguageModeling, Trainer, TrainerCallback
+
+    from utils.training_utils import get_training_arguments, prepare_dataset
+
+    class StepTimer(TrainerCallback):
+        def __init__(self):
+            self.step_times = []
+            self._start = None
+
+        def on_step_begin(self, args, state, control, **kwargs):
+            self._start = time.perf_counter()
+
+        def on_step_end(self, args, state, control, **kwargs):
+            self.step_times.append(time.perf_counter() - self._start)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    dataset, _ = prepare_dataset(dataset_path, tokenizer, config)
+
+    timer = StepTimer()
+    trainer = Trainer(
+        model=model,
+        args=get_training_arguments(config, output_dir),
+        train_dataset=dataset,
+        data_collator=DataCollatorForLanguageModeling(tokenizer, mlm=False),
+        callbacks=[timer]
+    )
+
+    rss_before = psutil.Process().memory_info().rss
+    trainer.train()
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    measured = timer.step_times[warmup_steps:] or timer.step_times
+    results.put({
+        'rss_before_training_bytes': rss_before,
+        'peak_rss_bytes': peak_rss,
+        'first_step_seconds': timer.step_times[0],
+        'step_seconds': sum(measured) / len(measured),
+        'steps': len(timer.step_times)
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='sshleifer/tiny-gpt2')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'cpu_memory_saving'])
+    parser.add_argument('--compile', action='store_true', help='Also run every profile with torch_compile')
+    parser.add_argument('--samples', type=int, default=512)
+    parser.add_argument('--words-per-sample', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-length', type=int, default=512)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--warmup-steps', type=int, default=3)
+    parser.add_argument('--output', default='cpu_profile.json')
+    args = parser.parse_args()
+
+    variants = [(profile, False) for profile in args.profiles]
+    if args.compile:
+        variants += [(profile, True) for profile in args.profiles]
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        dataset_path = os.path.join(work_dir, 'train.csv')
+        make_synthetic_dataset(dataset_path, args.samples, args.words_per_sample)
+
+        results = []
+        for profile, compiled in variants:
+            config = {
+                'finetune_type': 'full',
+                'training_profile': profile,
+                'use_cpu': True,
+                'torch_compile': compiled,
+                'max_steps': args.steps,
+                'batch_size': args.batch_size,
+                'max_length': args.max_length,
+                'logging_steps': 1000,
+                'report_to': 'none'
+            }
+            output_dir = os.path.join(work_dir, f"{profile}{'-compiled' if compiled else ''}")
+            queue = context.Queue()
+            process = context.Process(
+                target=run_configuration,
+                args=(args.model, config, dataset_path, output_dir, args.warmup_steps, queue)
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f'Run {profile} (torch_compile={compiled}) failed with exit code {process.exitcode}')
+            result = queue.get()
+            results.append({'profile': profile, 'torch_compile': compiled, **result})
+            print(json.dumps(results[-1]))
+
+    baseline = results[0]
+    for result in results:
+        result['speedup'] = baseline['step_seconds'] / result['step_seconds']
+        result['peak_rss_ratio'] = result['peak_rss_bytes'] / baseline['peak_rss_bytes']
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'model': args.model,
+            'cpu_count': os.cpu_count(),
+            'batch_size': args.batch_size,
+            'max_length': args.max_length,
+            'results': results
+        }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
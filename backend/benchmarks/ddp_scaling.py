@@ -0,0 +1,97 @@
+"""Measure data-parallel CPU training throughput for 1/2/4/8 local ranks.
+
+Usage:
+    python benchmarks/ddp_scaling.py --model sshleifer/tiny-gpt2 --ranks 1 2 4 8
+
+Every run trains on the same synthetic dataset for one epoch and records wall-clock
+time and samples/sec. Results are written as JSON so runs on different machines can
+be compared.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from transformers import AutoTokenizer
+
+from utils.distributed import launch_data_parallel, plan_rank_threads, prepare_tokenized_dataset
+
+
+def make_synthetic_dataset(path, num_samples, words_per_sample):
+    """Write a CSV with a ``text`` column of pseudo-random sentences."""
+    vocabulary = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+    rows = [
+        ' '.join(vocabulary[(i * 7 + j * 3) % len(vocabulary)] for j in range(words_per_sample))
+        for i in range(num_samples)
+    ]
+    pd.DataFrame({'text': rows}).to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='sshleifer/tiny-gpt2')
+    parser.add_argument('--ranks', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--samples', type=int, default=2048)
+    parser.add_argument('--words-per-sample', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--output', default='ddp_scaling.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        dataset_path = os.path.join(work_dir, 'train.csv')
+        make_synthetic_dataset(dataset_path, args.samples, args.words_per_sample)
+
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        config = {
+            'finetune_type': 'full',
+            'epochs': 1,
+            'batch_size': args.batch_size,
+            'max_length': args.max_length,
+            'logging_steps': 1000,
+            'report_to': 'none'
+        }
+        dataset_dir = prepare_tokenized_dataset(dataset_path, tokenizer, config, work_dir)
+
+        results = []
+        for world_size in args.ranks:
+            output_dir = os.path.join(work_dir, f'ranks-{world_size}')
+            threads_per_rank = plan_rank_threads(world_size)
+            start = time.perf_counter()
+            metrics = launch_data_parallel(
+                args.model,
+                config,
+                dataset_dir,
+                output_dir,
+                world_size,
+                threads_per_rank=threads_per_rank
+            )
+            elapsed = time.perf_counter() - start
+            results.append({
+                'ranks': world_size,
+                'threads_per_rank': threads_per_rank,
+                'wall_clock_seconds': elapsed,
+                'samples_per_second': args.samples / elapsed,
+                'train_runtime': metrics.get('train_runtime'),
+                'train_samples_per_second': metrics.get('train_samples_per_second')
+            })
+            print(json.dumps(results[-1]))
+
+    baseline = results[0]['samples_per_second']
+    for result in results:
+        result['speedup'] = result['samples_per_second'] / baseline
+
+    with open(args.output, 'w') as f:
+        json.dump({'model': args.model, 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""Load-test the Flask API or a deployed /generate endpoint with concurrent keep-alive clients.
+
+Usage:
+    # Flask API started locally in a scratch directory
+    python benchmarks/loadtest.py --local api --mix monitor=4,logs=4,upload=1 --concurrency 1 8 32
+
+    # /generate served by a local replica of a tiny random model
+    python benchmarks/loadtest.py --local generate --model sshleifer/tiny-gpt2 --mix generate=1 --concurrency 1 4 16
+
+    # An already running deployment
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --mix generate=1 --concurrency 8
+
+Every concurrency level runs ``--concurrency`` asyncio workers, each with its own
+HTTP/1.1 connection, for ``--duration`` seconds (or ``--requests`` requests in
+total). Request types are drawn from the weighted ``--mix``; ``--payload-bytes``
+sets the upload file and prompt sizes. Latency percentiles, throughput and error
+rates per level and per request type are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+
+
+def _text(num_bytes, seed):
+    words = []
+    size = 0
+    while size < num_bytes:
+        word = WORDS[(seed + len(words) * 3) % len(WORDS)]
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def _upload_request(args, n):
+    """Multipart upload of a one-column CSV of about ``payload_bytes``."""
+    boundary = f'loadtest{n:08d}'
+    rows = '\n'.join(_text(80, n + i) for i in range(max(1, args.payload_bytes // 80)))
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="loadtest-{n}.csv"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'
+        f'text\n{rows}\n\r\n'
+        f'--{boundary}--\r\n'
+    ).encode('utf-8')
+    return 'POST', '/api/upload', {'Content-Type': f'multipart/form-data; boundary={boundary}'}, body
+
+
+def _generate_request(args, n):
+    prompt = quote(_text(args.payload_bytes, n))
+    return 'POST', f'/generate?prompt={prompt}&max_length={args.max_length}', {}, b''
+
+
+# Request builders: (args, request number) -> (method, path, headers, body)
+REQUEST_TYPES = {
+    'health': lambda args, n: ('GET', '/api/health', {}, b''),
+    'monitor': lambda args, n: ('GET', '/api/monitor', {}, b''),
+    'logs': lambda args, n: ('GET', '/api/logs', {}, b''),
+    'checkpoints': lambda args, n: ('GET', '/api/checkpoints', {}, b''),
+    'training_status': lambda args, n: ('GET', '/api/training_status', {}, b''),
+    'upload': _upload_request,
+    'generate': _generate_request,
+    'generate_health': lambda args, n: ('GET', '/health', {}, b'')
+}
+
+
+def parse_mix(mix):
+    """``"monitor=4,upload=1"`` -> ``{'monitor': 4.0, 'upload': 1.0}``."""
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in REQUEST_TYPES:
+            raise ValueError(f"Unknown request type {name}; choose from {', '.join(REQUEST_TYPES)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Connection:
+    """A minimal HTTP/1.1 keep-alive client connection on asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers, body):
+        """Send one request and return ``(status, response_bytes)``."""
+        if self.writer is None:
+            await self._connect()
+
+        head = f'{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(body)}\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        self.writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                chunk_size = int((await self.reader.readline()).split(b';')[0], 16)
+                if chunk_size:
+                    size += len(await self.reader.readexactly(chunk_size))
+                await self.reader.readline()
+                if not chunk_size:
+                    break
+        elif 'content-length' in response_headers:
+            size = len(await self.reader.readexactly(int(response_headers['content-length'])))
+        else:
+            # HTTP/1.0 style response: the body ends with the connection
+            size = len(await self.reader.read())
+            self.close()
+            return status, size
+
+        if response_headers.get('connection', '').lower() == 'close' or status_line.startswith(b'HTTP/1.0'):
+            self.close()
+        return status, size
+
+
+async def _worker(host, port, args, weights, deadline, counter, records):
+    rng = random.Random(args.seed + counter['workers'])
+    counter['workers'] += 1
+    names, probabilities = list(weights), list(weights.values())
+    connection = Connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            if args.requests and counter['sent'] >= args.requests:
+                break
+            n = counter['sent']
+            counter['sent'] += 1
+            name = rng.choices(names, probabilities)[0]
+            method, path, headers, body = REQUEST_TYPES[name](args, n)
+
+            start = time.perf_counter()
+            try:
+                status, size = await asyncio.wait_for(
+                    connection.request(method, path, headers, body), args.timeout
+                )
+                error = None if status < 400 else f'HTTP {status}'
+            except Exception as e:
+                connection.close()
+                status, size, error = None, 0, type(e).__name__
+            records.append((name, time.perf_counter() - start, status, size, error))
+    finally:
+        connection.close()
+
+
+def summarize(records, elapsed):
+    """Latency percentiles (ms), throughput and error rate of a list of records."""
+    latencies = np.asarray([latency for _, latency, _, _, _ in records]) * 1000
+    errors = defaultdict(int)
+    statuses = defaultdict(int)
+    for _, _, status, _, error in records:
+        statuses[str(status)] += 1
+        if error:
+            errors[error] += 1
+    count = len(records)
+    summary = {
+        'requests': count,
+        'throughput_rps': count / elapsed if elapsed > 0 else None,
+        'bytes_received': sum(size for _, _, _, size, _ in records),
+        'errors': sum(errors.values()),
+        'error_rate': sum(errors.values()) / count if count else None,
+        'error_types': dict(errors),
+        'status_codes': dict(statuses)
+    }
+    if count:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary['latency_ms'] = {
+            'mean': float(latencies.mean()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(latencies.max())
+        }
+    return summary
+
+
+async def run_level(host, port, args, weights, concurrency):
+    records = []
+    counter = {'sent': 0, 'workers': 0}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[
+        _worker(host, port, args, weights, deadline, counter, records) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    by_type = defaultdict(list)
+    for record in records:
+        by_type[record[0]].append(record)
+    return {
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        **summarize(records, elapsed),
+        'by_type': {name: summarize(type_records, elapsed) for name, type_records in by_type.items()}
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _serve_api(port, work_dir):
+    """Child process: the Flask app on a threaded server, with uploads and state in ``work_dir``."""
+    from werkzeug.serving import make_server
+
+    os.chdir(work_dir)
+    from app import create_app
+
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+
+def _serve_generate(model_name, port, work_dir, num_threads):
+    """Child process: one API replica serving ``model_name`` exported to ``work_dir``."""
+    import torch
+    import uvicorn
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from utils.deployment import build_generation_app, build_generator, export_for_serving
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model_dir = os.path.join(work_dir, 'deployment')
+    export_for_serving(AutoModelForCausalLM.from_pretrained(model_name), AutoTokenizer.from_pretrained(model_name), model_dir)
+    generator = build_generator(model_dir, {})
+    uvicorn.run(build_generation_app(generator), host='127.0.0.1', port=port, log_level='warning')
+
+
+def start_local_server(args, work_dir):
+    """Start the requested local server in a spawned process and wait until it answers."""
+    context = multiprocessing.get_context('spawn')
+    port = _free_port()
+    if args.local == 'api':
+        process = context.Process(target=_serve_api, args=(port, work_dir), daemon=True)
+        health_path = '/api/health'
+    else:
+        process = context.Process(
+            target=_serve_generate, args=(args.model, port, work_dir, args.server_threads), daemon=True
+        )
+        health_path = '/health'
+    process.start()
+
+    async def wait_ready():
+        deadline = time.perf_counter() + args.startup_timeout
+        while time.perf_counter() < deadline:
+            if not process.is_alive():
+                raise RuntimeError(f'Local {args.local} server exited with code {process.exitcode}')
+            connection = Connection('127.0.0.1', port)
+            try:
+                status, _ = await connection.request('GET', health_path, {}, b'')
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            finally:
+                connection.close()
+            await asyncio.sleep(0.5)
+        raise TimeoutError(f'Local {args.local} server did not start within {args.startup_timeout}s')
+
+    asyncio.run(wait_ready())
+    return process, '127.0.0.1', port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running backend or deployment')
+    target.add_argument('--local', choices=['api', 'generate'], help='Start a local server to test')
+    parser.add_argument('--model', default='sshleifer/tiny-gpt2', help='Model served with --local generate')
+    parser.add_argument('--server-threads', type=int, default=None)
+    parser.add_argument('--mix', default='monitor=4,logs=4,upload=1')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per concurrency level')
+    parser.add_argument('--requests', type=int, default=0, help='Stop a level after this many requests')
+    parser.add_argument('--payload-bytes', type=int, default=4096, help='Upload file / prompt size')
+    parser.add_argument('--max-length', type=int, default=64, help='max_length of generate requests')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='loadtest.json')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        process = None
+        if args.local:
+            process, host, port = start_local_server(args, work_dir)
+        else:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+
+        try:
+            results = []
+            for concurrency in args.concurrency:
+                results.append(asyncio.run(run_level(host, port, args, weights, concurrency)))
+                summary = {key: results[-1].get(key) for key in ('concurrency', 'requests', 'throughput_rps', 'error_rate', 'latency_ms')}
+                print(json.dumps(summary))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join(10)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'target': args.url or f'local {args.local}',
+            'model': args.model if args.local == 'generate' else None,
+            'mix': weights,
+            'payload_bytes': args.payload_bytes,
+            'cpu_count': os.cpu_count(),
+            'results': results
+        }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Run with: gunicorn -c gunicorn.conf.py 'app:create_app()'
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+# Long requests (model loading, training) are served by the owner worker
+timeout = 0
+
+
+def on_starting(server):
+    """Clear state left by a previous run before any worker starts."""
+    from app import default_state_store_url
+    from utils.state_store import configure_state_store
+
+    configure_state_store(default_state_store_url()).clear()
@@ -0,0 +1,90 @@
+from flask import Blueprint, request, jsonify, current_app
+import os
+from routes import model as model_routes
+from utils.evaluation import (
+    ScoreCache,
+    checkpoint_model,
+    dataset_fingerprint,
+    evaluate_texts,
+    load_evaluation_texts
+)
+from utils.model_owner import owner_only
+from utils.splits import split_settings
+from utils.training_utils import list_checkpoints
+
+evaluate_bp = Blueprint('evaluate', __name__)
+
+@evaluate_bp.route('/evaluate', methods=['POST'])
+@owner_only
+def evaluate_model():
+    if model_routes.current_model is None:
+        return jsonify({'error': 'No model loaded'}), 400
+
+    data = request.get_json()
+    if not data or 'dataset_file' not in data:
+        return jsonify({'error': 'Missing dataset_file'}), 400
+
+    # Checkpoint adapters are attached to the loaded model while scoring
+    if not model_routes.claim_model('evaluation'):
+        return model_routes.model_busy_response()
+
+    try:
+        dataset_path = os.path.join(current_app.config['UPLOAD_FOLDER'], data['dataset_file'])
+        if not os.path.exists(dataset_path):
+            return jsonify({'error': 'Dataset file not found'}), 404
+
+        checkpoints_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints')
+        available = {checkpoint['name']: checkpoint['path'] for checkpoint in list_checkpoints(checkpoints_dir)}
+        requested = data.get('checkpoints', [])
+        missing = [name for name in requested if name not in available]
+        if missing:
+            return jsonify({'error': f'Checkpoints not found: {", ".join(missing)}'}), 404
+
+        tokenizer = model_routes.current_tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        texts = load_evaluation_texts(dataset_path, data)
+        dataset_hash = dataset_fingerprint(dataset_path)
+        settings = {
+            'max_length': data.get('max_length', 512),
+            'token_budget': data.get('token_budget', 16384),
+            'max_batch_size': data.get('max_batch_size', 64)
+        }
+
+        # Base-model scores don't change between checkpoints, so they are cached
+        cache = ScoreCache(os.path.join(current_app.config['MODEL_CACHE'], 'eval_cache'))
+        cache_key = {
+            **model_routes.weights_key(),
+            'dataset_hash': dataset_hash,
+            'max_length': settings['max_length'],
+            'text_column': data.get('text_column', 'text'),
+            'split': data.get('split'),
+            'split_settings': split_settings(data) if data.get('split') else None,
+            'max_samples': data.get('max_samples')
+        }
+
+        results = []
+        base_result = cache.get(cache_key) if data.get('use_cache', True) else None
+        if base_result is None:
+            base_result = evaluate_texts(model_routes.current_model, tokenizer, texts, **settings)
+            cache.put(cache_key, base_result)
+            results.append({'checkpoint': None, 'cached': False, **base_result})
+        else:
+            results.append({'checkpoint': None, 'cached': True, **base_result})
+
+        for name in requested:
+            with checkpoint_model(model_routes.current_model, available[name]) as model:
+                results.append({'checkpoint': name, 'cached': False, **evaluate_texts(model, tokenizer, texts, **settings)})
+
+        return jsonify({
+            'message': 'Evaluation completed successfully',
+            'dataset_hash': dataset_hash,
+            'results': results
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Error evaluating model: {str(e)}'}), 400
+
+    finally:
+        model_routes.release_model('evaluation')
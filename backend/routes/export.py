@@ -2,19 +2,25 @@ from flask import Blueprint, request, jsonify, current_app
 from huggingface_hub import HfApi, create_repo
 import os
 import json
-import gradio as gr
-from fastapi import FastAPI
-import uvicorn
-import threading
+from routes import model as model_routes
+from utils.deployment import DeploymentSupervisor, export_for_serving
+from utils.http_cache import cached_json_response
+from utils.model_owner import owner_only
+from utils.state_store import SharedState
+from utils.training_utils import list_checkpoints
 
 export_bp = Blueprint('export', __name__)
 
-# Global variables for deployment
-deployment_state = {
+# Deployment state shared by all worker processes
+deployment_state = SharedState('deployment', {
     'is_deployed': False,
     'deployment_type': None,
-    'deployment_url': None
-}
+    'deployment_url': None,
+    'replicas': []
+})
+
+# Replica processes of the active deployment; only set in the model owner process
+deployment_supervisor = None
 
 @export_bp.route('/export', methods=['POST'])
 def export_model():
@@ -30,20 +36,18 @@ def export_model():
         api = HfApi(token=api_key)
         create_repo(repo_name, token=api_key, exist_ok=True)
         
-        # Get the latest checkpoint
+        # Get the latest checkpoint across all runs
         checkpoints_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints')
-        latest_checkpoint = None
-        
-        if os.path.exists(checkpoints_dir):
-            checkpoints = [d for d in os.listdir(checkpoints_dir) if d.startswith('checkpoint-')]
-            if checkpoints:
-                latest_checkpoint = max(checkpoints, key=lambda x: int(x.split('-')[1]))
+        checkpoints = [
+            checkpoint for checkpoint in list_checkpoints(checkpoints_dir)
+            if os.path.basename(checkpoint['name']).startswith('checkpoint-')
+        ]
         
-        if not latest_checkpoint:
+        if not checkpoints:
             return jsonify({'error': 'No checkpoint found'}), 400
         
         # Upload model to Hugging Face Hub
-        model_path = os.path.join(checkpoints_dir, latest_checkpoint)
+        model_path = max(checkpoints, key=lambda checkpoint: os.path.getmtime(checkpoint['path']))['path']
         api.upload_folder(
             folder_path=model_path,
             repo_id=repo_name,
@@ -60,9 +64,10 @@ def export_model():
         return jsonify({'error': f'Error exporting model: {str(e)}'}), 400
 
 @export_bp.route('/deploy', methods=['POST'])
+@owner_only
 def deploy_model():
-    global deployment_state
-    
+    global deployment_supervisor
+
     if deployment_state['is_deployed']:
         return jsonify({'error': 'Model already deployed'}), 400
     
@@ -70,78 +75,58 @@ def deploy_model():
     if not data or 'deployment_type' not in data:
         return jsonify({'error': 'Missing deployment_type'}), 400
     
+    if model_routes.current_model is None:
+        return jsonify({'error': 'No model loaded'}), 400
+    
     try:
         deployment_type = data['deployment_type']
+        if deployment_type not in ('gradio', 'api'):
+            return jsonify({'error': 'Invalid deployment type'}), 400
         
-        if deployment_type == 'gradio':
-            # Create Gradio interface
-            def generate_text(prompt, max_length=100):
-                inputs = current_tokenizer(prompt, return_tensors="pt").to(current_model.device)
-                outputs = current_model.generate(
-                    **inputs,
-                    max_length=max_length,
-                    num_return_sequences=1,
-                    temperature=0.7
-                )
-                return current_tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            interface = gr.Interface(
-                fn=generate_text,
-                inputs=[
-                    gr.Textbox(label="Input Prompt"),
-                    gr.Slider(minimum=10, maximum=200, value=100, label="Max Length")
-                ],
-                outputs=gr.Textbox(label="Generated Text"),
-                title="Fine-tuned LLM Chat Interface"
-            )
-            
-            # Start Gradio server in background
-            def run_gradio():
-                interface.launch(share=True)
-            
-            thread = threading.Thread(target=run_gradio)
-            thread.start()
-            
-            deployment_state.update({
-                'is_deployed': True,
-                'deployment_type': 'gradio',
-                'deployment_url': interface.local_url
-            })
-            
-        elif deployment_type == 'api':
-            # Create FastAPI app
-            app = FastAPI()
-            
-            @app.post("/generate")
-            async def generate(prompt: str, max_length: int = 100):
-                inputs = current_tokenizer(prompt, return_tensors="pt").to(current_model.device)
-                outputs = current_model.generate(
-                    **inputs,
-                    max_length=max_length,
-                    num_return_sequences=1,
-                    temperature=0.7
-                )
-                return {"generated_text": current_tokenizer.decode(outputs[0], skip_special_tokens=True)}
-            
-            # Start FastAPI server in background
-            def run_fastapi():
-                uvicorn.run(app, host="0.0.0.0", port=8000)
-            
-            thread = threading.Thread(target=run_fastapi)
-            thread.start()
-            
-            deployment_state.update({
-                'is_deployed': True,
-                'deployment_type': 'api',
-                'deployment_url': 'http://localhost:8000'
-            })
+        serve_adapters = bool(data.get('serve_adapters', False))
+        if serve_adapters and data.get('draft_model'):
+            return jsonify({'error': 'draft_model cannot be combined with serve_adapters'}), 400
         
-        else:
-            return jsonify({'error': 'Invalid deployment type'}), 400
+        # Replicas memory-map the weights from this directory. With adapters the
+        # untouched base weights are served and LoRA checkpoints are loaded per request.
+        model_dir = export_for_serving(
+            model_routes.current_model,
+            model_routes.current_tokenizer,
+            os.path.join(current_app.config['MODEL_CACHE'], 'deployment'),
+            merge_lora=not serve_adapters
+        )
+        
+        supervisor = DeploymentSupervisor(
+            model_dir,
+            deployment_type=deployment_type,
+            num_replicas=int(data.get('num_replicas', 1)),
+            dispatch_port=int(data.get('port', 7860 if deployment_type == 'gradio' else 8000)),
+            base_port=int(data.get('replica_base_port', 8100)),
+            policy=data.get('dispatch_policy', 'least_busy'),
+            threads_per_replica=data.get('threads_per_replica'),
+            serving_config={
+                'draft_model': data.get('draft_model'),
+                'min_acceptance_rate': float(data.get('min_acceptance_rate', 0.3)),
+                'adapters_dir': os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints') if serve_adapters else None,
+                'adapter_cache_size': int(data.get('adapter_cache_size', 8)),
+                'max_batch_size': int(data.get('max_batch_size', 8))
+            },
+            share=bool(data.get('share', False)),
+            on_update=lambda replicas: deployment_state.update({'replicas': replicas})
+        )
+        urls = supervisor.start()
+        deployment_supervisor = supervisor
+        
+        deployment_state.update({
+            'is_deployed': True,
+            'deployment_type': deployment_type,
+            'deployment_url': urls.get('share_url') or urls['local_url'],
+            'replicas': supervisor.status()
+        })
         
         return jsonify({
             'message': 'Model deployed successfully',
-            'deployment_state': deployment_state
+            'deployment_state': deployment_state.to_dict()
         })
         
     except Exception as e:
@@ -150,25 +135,27 @@ def deploy_model():
 
 @export_bp.route('/deployment_status', methods=['GET'])
 def get_deployment_status():
-    return jsonify({
+    return cached_json_response(deployment_state.version, lambda: {
         'message': 'Deployment status retrieved successfully',
-        'deployment_state': deployment_state
+        'deployment_state': deployment_state.to_dict()
     })
 
 @export_bp.route('/undeploy', methods=['POST'])
+@owner_only
 def undeploy_model():
-    global deployment_state
-    
     if not deployment_state['is_deployed']:
         return jsonify({'error': 'No model deployed'}), 400
     
+    global deployment_supervisor
+
     try:
+        # Terminate the replicas so ports and model memory are released
+        if deployment_supervisor is not None:
+            deployment_supervisor.stop()
+            deployment_supervisor = None
+        
         # Reset deployment state
-        deployment_state.update({
-            'is_deployed': False,
-            'deployment_type': None,
-            'deployment_url': None
-        })
+        deployment_state.reset()
         
         return jsonify({
             'message': 'Model undeployed successfully'
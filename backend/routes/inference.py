@@ -0,0 +1,180 @@
+from flask import Blueprint, request, jsonify, current_app, send_file
+import os
+import json
+import threading
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from routes import model as model_routes
+from utils.batch_inference import BatchInferenceJob
+from utils.evaluation import checkpoint_model
+from utils.http_cache import cached_json_response
+from utils.model_owner import owner_only
+from utils.state_store import SharedState
+from utils.training_utils import list_checkpoints
+
+inference_bp = Blueprint('inference', __name__)
+
+# Batch inference state shared by all worker processes
+inference_state = SharedState('inference', {
+    'is_running': False,
+    'job_id': None,
+    'status': None,
+    'total_prompts': 0,
+    'completed_prompts': 0,
+    'total_batches': 0,
+    'completed_batches': 0,
+    'error': None,
+    'start_time': None,
+    'end_time': None
+})
+
+# Set to cancel the running job after its current batch
+stop_event = threading.Event()
+
+JOB_SETTINGS = ('prompts_file', 'prompt_column', 'checkpoint', 'max_new_tokens', 'max_prompt_length',
+                'token_budget', 'max_batch_size', 'do_sample', 'temperature', 'top_p')
+
+def jobs_dir():
+    return os.path.join(current_app.config['MODEL_CACHE'], 'inference')
+
+@inference_bp.route('/batch_inference', methods=['POST'])
+@owner_only
+def start_batch_inference():
+    if model_routes.current_model is None:
+        return jsonify({'error': 'No model loaded'}), 400
+
+    data = request.get_json()
+    if not data or not (data.get('prompts_file') or data.get('job_id')):
+        return jsonify({'error': 'Missing prompts_file or job_id'}), 400
+
+    # A checkpoint adapter stays attached to the loaded model for the whole job
+    if not model_routes.claim_model('batch inference'):
+        return model_routes.model_busy_response()
+
+    # Once started, the job thread releases the model when it finishes
+    handed_off = False
+    try:
+        os.makedirs(jobs_dir(), exist_ok=True)
+
+        # Resuming reuses the saved settings; the job continues after its last checkpointed batch
+        if data.get('job_id'):
+            job_id = secure_filename(data['job_id'])
+            spec_path = os.path.join(jobs_dir(), f'{job_id}.json')
+            if not job_id or not os.path.exists(spec_path):
+                return jsonify({'error': 'Job not found'}), 404
+            with open(spec_path, 'r') as f:
+                spec = json.load(f)
+        else:
+            job_id = datetime.now().strftime('job-%Y%m%d-%H%M%S-%f')
+            spec = {key: data[key] for key in JOB_SETTINGS if key in data}
+            spec['prompts_file'] = secure_filename(spec['prompts_file'])
+            with open(os.path.join(jobs_dir(), f'{job_id}.json'), 'w') as f:
+                json.dump(spec, f)
+
+        prompts_path = os.path.join(current_app.config['UPLOAD_FOLDER'], spec['prompts_file'])
+        if not os.path.exists(prompts_path):
+            return jsonify({'error': 'Prompts file not found'}), 404
+
+        checkpoint_path = None
+        if spec.get('checkpoint'):
+            checkpoints_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints')
+            available = {checkpoint['name']: checkpoint['path'] for checkpoint in list_checkpoints(checkpoints_dir)}
+            if spec['checkpoint'] not in available:
+                return jsonify({'error': f"Checkpoint not found: {spec['checkpoint']}"}), 404
+            checkpoint_path = available[spec['checkpoint']]
+
+        base_model = model_routes.current_model
+        model_key = model_routes.weights_key()
+        tokenizer = model_routes.current_tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        generation_kwargs = {'do_sample': spec.get('do_sample', False)}
+        if generation_kwargs['do_sample']:
+            generation_kwargs.update({'temperature': spec.get('temperature', 1.0), 'top_p': spec.get('top_p', 1.0)})
+        output_path = os.path.join(jobs_dir(), f'{job_id}.jsonl')
+
+        stop_event.clear()
+        inference_state.update({
+            'is_running': True,
+            'job_id': job_id,
+            'status': 'starting',
+            'total_prompts': 0,
+            'completed_prompts': 0,
+            'total_batches': 0,
+            'completed_batches': 0,
+            'error': None,
+            'start_time': datetime.now(),
+            'end_time': None
+        })
+
+        def run_job():
+            try:
+                with checkpoint_model(base_model, checkpoint_path) as model:
+                    job = BatchInferenceJob(
+                        model,
+                        tokenizer,
+                        prompts_path,
+                        output_path,
+                        prompt_column=spec.get('prompt_column', 'prompt'),
+                        max_new_tokens=spec.get('max_new_tokens', 128),
+                        max_prompt_length=spec.get('max_prompt_length', 1024),
+                        token_budget=spec.get('token_budget', 16384),
+                        max_batch_size=spec.get('max_batch_size', 32),
+                        generation_kwargs=generation_kwargs,
+                        model_key={**model_key, 'checkpoint': spec.get('checkpoint')}
+                    )
+                    job.run(on_progress=inference_state.update, stop_event=stop_event)
+            except Exception as e:
+                inference_state.update({'status': 'failed', 'error': str(e)})
+            finally:
+                inference_state.update({'is_running': False, 'end_time': datetime.now()})
+                model_routes.release_model('batch inference')
+
+        threading.Thread(target=run_job, daemon=True).start()
+        handed_off = True
+
+        return jsonify({
+            'message': 'Batch inference started successfully',
+            'job_id': job_id,
+            'resumed': bool(data.get('job_id'))
+        })
+
+    except Exception as e:
+        inference_state['is_running'] = False
+        return jsonify({'error': f'Error starting batch inference: {str(e)}'}), 400
+
+    finally:
+        if not handed_off:
+            model_routes.release_model('batch inference')
+
+@inference_bp.route('/batch_inference/cancel', methods=['POST'])
+@owner_only
+def cancel_batch_inference():
+    if not inference_state['is_running']:
+        return jsonify({'error': 'No batch inference job is running'}), 400
+
+    stop_event.set()
+    return jsonify({
+        'message': 'Batch inference will stop after the current batch',
+        'job_id': inference_state['job_id']
+    })
+
+@inference_bp.route('/batch_inference_status', methods=['GET'])
+def get_batch_inference_status():
+    return cached_json_response(inference_state.version, lambda: {
+        'message': 'Batch inference status retrieved successfully',
+        'inference_state': inference_state.to_dict()
+    })
+
+@inference_bp.route('/batch_inference/<job_id>/results', methods=['GET'])
+def get_batch_inference_results(job_id):
+    output_path = os.path.join(jobs_dir(), f'{secure_filename(job_id)}.jsonl')
+    if not os.path.exists(output_path):
+        return jsonify({'error': 'Results not found'}), 404
+
+    try:
+        return send_file(os.path.abspath(output_path), mimetype='application/x-ndjson', as_attachment=True)
+
+    except Exception as e:
+        return jsonify({'error': f'Error getting results: {str(e)}'}), 400
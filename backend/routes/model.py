@@ -3,6 +3,12 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 from huggingface_hub import login
 import torch
 import os
+import threading
+import uuid
+from utils.http_cache import cached_json_response
+from utils.huggingface import get_model_info as describe_model
+from utils.model_owner import owner_only
+from utils.state_store import SharedState
 
 model_bp = Blueprint('model', __name__)
 
@@ -10,9 +16,52 @@ model_bp = Blueprint('model', __name__)
 current_model = None
 current_tokenizer = None
 
+# Metadata of the loaded model, computed once per load and shared by all workers
+model_state = SharedState('model', {'model_info': None})
+
+# Job using the loaded model (training, sweep, evaluation, batch inference). Jobs may
+# attach adapters to or train the model in place, so only one runs at a time. All
+# model-bound routes run in the owner process, so a process-local lock is enough.
+_model_job_lock = threading.Lock()
+model_job = None
+
+def claim_model(job):
+    """Reserve the loaded model for ``job``; returns False if another job holds it."""
+    global model_job
+    with _model_job_lock:
+        if model_job is not None:
+            return False
+        model_job = job
+        return True
+
+def release_model(job):
+    global model_job
+    with _model_job_lock:
+        if model_job == job:
+            model_job = None
+
+# None while the loaded weights are as loaded; a fresh ID after every in-place
+# training run, so caches keyed on it never serve results of other weights
+model_revision = None
+
+def mark_model_modified():
+    global model_revision
+    model_revision = uuid.uuid4().hex
+
+def weights_key():
+    """Identity of the loaded weights for cache keys."""
+    return {'model': current_model.name_or_path, 'revision': model_revision}
+
+def model_busy_response():
+    return jsonify({'error': f'Model is busy: {model_job} in progress'}), 400
+
 @model_bp.route('/load_model', methods=['POST'])
+@owner_only
 def load_model():
-    global current_model, current_tokenizer
+    global current_model, current_tokenizer, model_revision
+    
+    if model_job is not None:
+        return model_busy_response()
     
     data = request.get_json()
     if not data or 'model_name' not in data or 'api_key' not in data:
@@ -32,14 +81,12 @@ def load_model():
             torch_dtype=torch.float16,
             device_map="auto"
         )
+        model_revision = None
         
-        # Get model info
-        model_info = {
-            'name': model_name,
-            'type': current_model.__class__.__name__,
-            'parameters': sum(p.numel() for p in current_model.parameters()),
-            'device': str(current_model.device)
-        }
+        # Get model info once; /model_info serves the memoized copy
+        model_info = describe_model(current_model)
+        model_info['name'] = model_name
+        model_state.update({'model_info': model_info})
         
         return jsonify({
             'message': 'Model loaded successfully',
@@ -51,19 +98,12 @@ def load_model():
 
 @model_bp.route('/model_info', methods=['GET'])
 def get_model_info():
-    if current_model is None:
-        return jsonify({'error': 'No model loaded'}), 400
-    
     try:
-        model_info = {
-            'name': current_model.name_or_path,
-            'type': current_model.__class__.__name__,
-            'parameters': sum(p.numel() for p in current_model.parameters()),
-            'device': str(current_model.device),
-            'dtype': str(current_model.dtype)
-        }
+        model_info = model_state['model_info']
+        if model_info is None:
+            return jsonify({'error': 'No model loaded'}), 400
         
-        return jsonify({
+        return cached_json_response(model_state.version, lambda: {
             'message': 'Model info retrieved successfully',
             'model_info': model_info
         })
@@ -72,9 +112,13 @@ def get_model_info():
         return jsonify({'error': f'Error getting model info: {str(e)}'}), 400
 
 @model_bp.route('/unload_model', methods=['POST'])
+@owner_only
 def unload_model():
     global current_model, current_tokenizer
     
+    if model_job is not None:
+        return model_busy_response()
+    
     try:
         if current_model is not None:
             del current_model
@@ -84,6 +128,8 @@ def unload_model():
             del current_tokenizer
             current_tokenizer = None
         
+        model_state.update({'model_info': None})
+        
         # Clear CUDA cache
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -3,8 +3,10 @@ import torch
 import psutil
 import GPUtil
 from datetime import datetime
-import json
 import os
+from utils.http_cache import cached_json_response, directory_version
+from utils.metrics_store import get_metrics_store
+from utils.training_utils import list_checkpoints
 
 monitor_bp = Blueprint('monitor', __name__)
 
@@ -30,22 +32,10 @@ def get_training_metrics():
                     'temperature': gpu.temperature
                 })
         
-        # Get training logs if available
-        training_logs = []
-        log_path = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints', 'trainer_log.jsonl')
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                for line in f:
-                    try:
-                        log_entry = json.loads(line.strip())
-                        training_logs.append(log_entry)
-                    except json.JSONDecodeError:
-                        continue
-        
-        # Get latest training metrics
-        latest_metrics = {}
-        if training_logs:
-            latest_metrics = training_logs[-1]
+        # Latest values of the requested or most recent run
+        store = get_metrics_store(current_app.config['METRICS_DB'])
+        run_id = request.args.get('run_id') or store.latest_run_id()
+        latest_metrics = store.latest(run_id) if run_id else {}
         
         return jsonify({
             'message': 'Training metrics retrieved successfully',
@@ -64,6 +54,7 @@ def get_training_metrics():
                 }
             },
             'gpu_metrics': gpu_metrics,
+            'run_id': run_id,
             'training_metrics': latest_metrics,
             'timestamp': datetime.now().isoformat()
         })
@@ -74,23 +65,18 @@ def get_training_metrics():
 @monitor_bp.route('/logs', methods=['GET'])
 def get_training_logs():
     try:
-        # Get training logs
-        training_logs = []
-        log_path = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints', 'trainer_log.jsonl')
+        store = get_metrics_store(current_app.config['METRICS_DB'])
+        run_id = request.args.get('run_id') or store.latest_run_id()
         
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                for line in f:
-                    try:
-                        log_entry = json.loads(line.strip())
-                        training_logs.append(log_entry)
-                    except json.JSONDecodeError:
-                        continue
+        def build_payload():
+            return {
+                'message': 'Training logs retrieved successfully',
+                'run_id': run_id,
+                'logs': store.logs(run_id) if run_id else []
+            }
         
-        return jsonify({
-            'message': 'Training logs retrieved successfully',
-            'logs': training_logs
-        })
+        # The logs are only re-read and re-encoded when the run records new points
+        return cached_json_response((run_id, store.version(run_id) if run_id else None), build_payload)
         
     except Exception as e:
         return jsonify({'error': f'Error getting training logs: {str(e)}'}), 400
@@ -99,25 +85,74 @@ def get_training_logs():
 def get_checkpoints():
     try:
         checkpoints_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints')
-        checkpoints = []
         
-        if os.path.exists(checkpoints_dir):
-            for item in os.listdir(checkpoints_dir):
-                if item.startswith('checkpoint-'):
-                    checkpoint_path = os.path.join(checkpoints_dir, item)
-                    if os.path.isdir(checkpoint_path):
-                        checkpoints.append({
-                            'name': item,
-                            'path': checkpoint_path,
-                            'created_at': datetime.fromtimestamp(
-                                os.path.getctime(checkpoint_path)
-                            ).isoformat()
-                        })
+        def build_payload():
+            return {
+                'message': 'Checkpoints retrieved successfully',
+                'checkpoints': list_checkpoints(checkpoints_dir)
+            }
+        
+        return cached_json_response(directory_version(checkpoints_dir), build_payload)
+        
+    except Exception as e:
+        return jsonify({'error': f'Error getting checkpoints: {str(e)}'}), 400
+
+
+def _series_options():
+    """Step range and downsampling options shared by the run metric endpoints."""
+    return {
+        'start_step': request.args.get('start_step', type=int),
+        'end_step': request.args.get('end_step', type=int),
+        'max_points': request.args.get('max_points', 1000, type=int),
+        'method': request.args.get('method', 'lttb')
+    }
+
+@monitor_bp.route('/runs', methods=['GET'])
+def get_runs():
+    try:
+        store = get_metrics_store(current_app.config['METRICS_DB'])
+        return jsonify({
+            'message': 'Runs retrieved successfully',
+            'runs': store.list_runs()
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error getting runs: {str(e)}'}), 400
+
+@monitor_bp.route('/runs/compare', methods=['GET'])
+def compare_runs():
+    run_ids = [run_id for run_id in request.args.get('run_ids', '').split(',') if run_id]
+    if not run_ids:
+        return jsonify({'error': 'Missing run_ids'}), 400
+    
+    try:
+        store = get_metrics_store(current_app.config['METRICS_DB'])
+        name = request.args.get('name', 'loss')
+        return jsonify({
+            'message': 'Runs compared successfully',
+            'name': name,
+            'series': store.compare(run_ids, name, **_series_options())
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error comparing runs: {str(e)}'}), 400
+
+@monitor_bp.route('/runs/<run_id>/metrics', methods=['GET'])
+def get_run_metrics(run_id):
+    try:
+        store = get_metrics_store(current_app.config['METRICS_DB'])
+        run = store.get_run(run_id)
+        if run is None:
+            return jsonify({'error': 'Run not found'}), 404
         
+        names = request.args.get('names')
+        names = names.split(',') if names else list(run['metrics'])
+        options = _series_options()
         return jsonify({
-            'message': 'Checkpoints retrieved successfully',
-            'checkpoints': checkpoints
+            'message': 'Run metrics retrieved successfully',
+            'run': run,
+            'series': {name: store.series(run_id, name, **options) for name in names}
         })
         
     except Exception as e:
-        return jsonify({'error': f'Error getting checkpoints: {str(e)}'}), 400 
\ No newline at end of file
+        return jsonify({'error': f'Error getting run metrics: {str(e)}'}), 400
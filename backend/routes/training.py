@@ -1,41 +1,180 @@
 from flask import Blueprint, request, jsonify, current_app
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from transformers import TrainingArguments, Trainer
-from datasets import Dataset
+from transformers import TrainingArguments, Trainer, TrainerCallback, DataCollatorForLanguageModeling
 import torch
 import os
 import json
+import threading
 from datetime import datetime
+from routes import model as model_routes
+from utils.batch_planner import default_memory_limit, plan_batch_size
+from utils.columnar import open_columnar, read_columnar_metadata
+from utils.distributed import launch_data_parallel, plan_rank_threads, prepare_tokenized_dataset
+from utils.dpo import DPODataCollator, DPOTrainer, ReferenceLogProbCache, load_preference_dataset
+from utils.estimator import adjust_config, calibrate, estimate_training
+from utils.evaluation import checkpoint_model, dataset_fingerprint
+from utils.http_cache import cached_json_response
+from utils.ingest import define_dataset
+from utils.metrics_store import MetricsStoreCallback, get_metrics_store
+from utils.model_owner import owner_only
+from utils.state_store import SharedState
+from utils.streaming import read_sample_texts
+from utils.sweep import expand_search_space, prepare_shared_dataset, run_successive_halving
+from utils.training_utils import (
+    TRAINING_PROFILES,
+    apply_training_profile,
+    get_training_arguments,
+    list_checkpoints,
+    performance_arguments,
+    prepare_dataset,
+    prepare_model_for_training
+)
 
 training_bp = Blueprint('training', __name__)
 
-# Global variables for training state
-training_state = {
+# Training state shared by all worker processes
+training_state = SharedState('training', {
     'is_training': False,
     'current_epoch': 0,
     'total_epochs': 0,
     'current_loss': 0.0,
     'start_time': None,
     'end_time': None
-}
+})
+
+# Hyperparameter sweep state shared by all worker processes
+sweep_state = SharedState('sweep', {
+    'is_running': False,
+    'sweep_id': None,
+    'num_rungs': 0,
+    'trials': [],
+    'best_trial': None,
+    'error': None
+})
+
+# Calibration probes per model and sequence length, reused by /estimate and start_finetune
+_calibrations = {}
+
+def estimate_config(config, calibrate_probe=True):
+    """Estimate memory/step time of ``config``; return (config, estimate, adjustments).
+
+    With ``auto_adjust`` a config that does not fit is changed until it does.
+    """
+    model = model_routes.current_model
+    seq_length = config.get('max_length', 512)
+    calibration = None
+    if calibrate_probe:
+        key = (model.name_or_path, seq_length)
+        calibration = _calibrations.get(key)
+        if calibration is None:
+            # A probe that ran out of memory falls back to the uncalibrated estimate
+            calibration = calibrate(model, model_routes.current_tokenizer, seq_length)
+            if calibration is not None:
+                _calibrations[key] = calibration
+    
+    memory_limit = resolve_memory_limit(config)
+    num_samples = None
+    if (config.get('dataset_file') or config.get('dataset_files')) and not config.get('streaming'):
+        dataset_path = resolve_dataset_path(config)
+        if os.path.exists(dataset_path):
+            num_samples = read_columnar_metadata(dataset_path)['statistics']['num_rows']
+    
+    if config.get('auto_adjust'):
+        return adjust_config(model, config, calibration, memory_limit, num_samples)
+    return config, estimate_training(model, config, calibration, memory_limit, num_samples), []
+
+def resolve_dataset_path(config):
+    """Path of the training dataset; ``dataset_files`` patterns are combined into one dataset."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    if config.get('dataset_files'):
+        return define_dataset(upload_folder, config.get('dataset_name', 'training'), config['dataset_files'])
+    return os.path.join(upload_folder, config['dataset_file'])
+
+def resolve_memory_limit(config):
+    """Memory one training process may use, or None for the device default.
+
+    Data-parallel ranks are separate processes, so they split the limit evenly.
+    """
+    num_ranks = config.get('num_ranks', 1)
+    memory_limit_gb = config.get('memory_limit_gb')
+    if memory_limit_gb:
+        return int(memory_limit_gb * 1024 ** 3) // num_ranks
+    if num_ranks > 1:
+        return default_memory_limit(next(model_routes.current_model.parameters()).device) // num_ranks
+    return None
+
+def plan_auto_batch_size(model, tokenizer, dataset_path, config):
+    """Probe micro batch sizes on ``model`` and set batch_size/gradient_accumulation_steps.
+
+    The effective batch size (``effective_batch_size``, default ``batch_size`` x
+    ``gradient_accumulation_steps``) is kept; with data-parallel ranks
+    ``effective_batch_size`` is the total over all ranks.
+    """
+    num_ranks = config.get('num_ranks', 1)
+    effective_batch_size = config.get('effective_batch_size')
+    if effective_batch_size:
+        effective_batch_size //= num_ranks
+    else:
+        effective_batch_size = config.get('batch_size', 4) * config.get('gradient_accumulation_steps', 1)
+    
+    text_column = config.get('text_column', 'text')
+    if config.get('streaming'):
+        sample_texts = read_sample_texts(dataset_path, effective_batch_size, text_column)
+    else:
+        sample_texts = [
+            str(text) for text in open_columnar(dataset_path, [text_column])
+            .slice(0, effective_batch_size)
+            .column(text_column)
+            .to_pylist()
+            if text is not None
+        ]
+    
+    batch_plan = plan_batch_size(
+        model,
+        tokenizer,
+        sample_texts,
+        effective_batch_size=effective_batch_size,
+        max_length=config.get('max_length', 512),
+        memory_limit=resolve_memory_limit(config)
+    )
+    config['batch_size'] = batch_plan['per_device_train_batch_size']
+    config['gradient_accumulation_steps'] = batch_plan['gradient_accumulation_steps']
+    training_state['batch_plan'] = batch_plan
+    return batch_plan
+
+def start_run(config):
+    """Register a new run in the metrics store and return (run_id, output_dir)."""
+    run_id = datetime.now().strftime('run-%Y%m%d-%H%M%S-%f')
+    output_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints', run_id)
+    get_metrics_store(current_app.config['METRICS_DB']).create_run(run_id, config, output_dir)
+    return run_id, output_dir
+
+class TrainingCallback(TrainerCallback):
+    """Mirror epoch and loss of an in-process Trainer run into ``training_state``."""
 
-class TrainingCallback:
     def __init__(self):
         self.current_epoch = 0
         self.total_epochs = 0
         self.current_loss = 0.0
 
-    def on_epoch_end(self, epoch, logs=None):
-        self.current_epoch = epoch
-        self.current_loss = logs.get('loss', 0.0) if logs else 0.0
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs and 'loss' in logs:
+            self.current_loss = logs['loss']
+        self.current_epoch = state.epoch or 0
         
         # Update training state
         training_state.update({
             'current_epoch': self.current_epoch,
-            'current_loss': self.current_loss
+            'current_loss': self.current_loss,
+            'global_step': state.global_step,
+            'max_steps': state.max_steps
         })
 
-    def on_train_end(self, logs=None):
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.current_epoch = state.epoch
+        training_state['current_epoch'] = self.current_epoch
+
+    def on_train_end(self, args, state, control, **kwargs):
         training_state.update({
             'is_training': False,
             'end_time': datetime.now()
@@ -47,6 +186,23 @@ def set_training_config():
     if not data:
         return jsonify({'error': 'No configuration provided'}), 400
     
+    num_ranks = data.get('num_ranks', 1)
+    if not isinstance(num_ranks, int) or num_ranks < 1:
+        return jsonify({'error': 'num_ranks must be a positive integer'}), 400
+    
+    if data.get('finetune_type') == 'dpo' and num_ranks > 1:
+        return jsonify({'error': 'DPO training runs on a single rank'}), 400
+    
+    # Ranks memory-map a tokenized copy of the dataset, which a stream cannot provide
+    if data.get('streaming') and num_ranks > 1:
+        return jsonify({'error': 'Streaming datasets are not supported with num_ranks > 1'}), 400
+    
+    if data.get('effective_batch_size') and data['effective_batch_size'] % num_ranks:
+        return jsonify({'error': 'effective_batch_size must be divisible by num_ranks'}), 400
+    
+    if data.get('training_profile', 'default') not in TRAINING_PROFILES:
+        return jsonify({'error': f"training_profile must be one of {', '.join(TRAINING_PROFILES)}"}), 400
+    
     try:
         # Save training configuration
         config_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'training_config.json')
@@ -62,9 +218,8 @@ def set_training_config():
         return jsonify({'error': f'Error saving configuration: {str(e)}'}), 400
 
 @training_bp.route('/start_finetune', methods=['POST'])
+@owner_only
 def start_finetune():
-    global training_state
-    
     if training_state['is_training']:
         return jsonify({'error': 'Training already in progress'}), 400
     
@@ -72,24 +227,38 @@ def start_finetune():
     if not data:
         return jsonify({'error': 'No training parameters provided'}), 400
     
+    if not model_routes.claim_model('training'):
+        return model_routes.model_busy_response()
+    
+    # The data-parallel path keeps the model claimed until its ranks finish
+    handed_off = False
     try:
         # Load configuration
         config_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'training_config.json')
         with open(config_path, 'r') as f:
-            config = json.load(f)
+            config = apply_training_profile(json.load(f))
         
-        # Set up training parameters
-        training_args = TrainingArguments(
-            output_dir=os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints'),
-            num_train_epochs=config.get('epochs', 3),
-            per_device_train_batch_size=config.get('batch_size', 4),
-            learning_rate=config.get('learning_rate', 2e-4),
-            max_grad_norm=config.get('max_grad_norm', 0.3),
-            warmup_ratio=config.get('warmup_ratio', 0.03),
-            logging_steps=config.get('logging_steps', 10),
-            save_strategy="epoch",
-            evaluation_strategy="epoch" if config.get('validation_split', 0) > 0 else "no",
-        )
+        # Pre-flight check: reject (or, with auto_adjust, fix) configs that won't fit
+        if config.get('preflight', True):
+            config, estimate, adjustments = estimate_config(config)
+            if not estimate['fits']:
+                return jsonify({
+                    'error': 'Training configuration is estimated to exceed the memory limit',
+                    'estimate': estimate,
+                    'adjustments': adjustments
+                }), 400
+            training_state.update({'estimate': estimate, 'adjustments': adjustments})
+        
+        if config.get('num_ranks', 1) > 1:
+            response = start_data_parallel_finetune(config)
+            handed_off = True
+            return response
+        
+        if config.get('finetune_type') == 'dpo':
+            return start_dpo_finetune(config)
+        
+        # LoRA layers are injected into and full training updates the loaded model
+        model_routes.mark_model_modified()
         
         # Initialize callback
         callback = TrainingCallback()
@@ -105,10 +274,10 @@ def start_finetune():
                 bias="none",
                 task_type="CAUSAL_LM"
             )
-            model = get_peft_model(current_model, lora_config)
+            model = get_peft_model(model_routes.current_model, lora_config)
         
         elif config.get('finetune_type') == 'qlora':
-            model = prepare_model_for_kbit_training(current_model)
+            model = prepare_model_for_kbit_training(model_routes.current_model)
             lora_config = LoraConfig(
                 r=config.get('lora_r', 16),
                 lora_alpha=config.get('lora_alpha', 32),
@@ -120,40 +289,68 @@ def start_finetune():
             model = get_peft_model(model, lora_config)
         
         else:  # Full fine-tuning
-            model = current_model
+            model = model_routes.current_model
         
         # Prepare dataset
-        dataset_path = os.path.join(current_app.config['UPLOAD_FOLDER'], config['dataset_file'])
-        if dataset_path.endswith('.csv'):
-            df = pd.read_csv(dataset_path)
-        elif dataset_path.endswith('.xlsx'):
-            df = pd.read_excel(dataset_path)
-        else:
-            with open(dataset_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            df = pd.DataFrame({'text': [content]})
-        
-        dataset = Dataset.from_pandas(df)
+        dataset_path = resolve_dataset_path(config)
+        tokenizer = model_routes.current_tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        dataset, eval_dataset = prepare_dataset(dataset_path, tokenizer, config)
+        data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+        
+        # Probe batch sizes and keep the requested effective batch size
+        if config.get('auto_batch_size'):
+            plan_auto_batch_size(model, tokenizer, dataset_path, config)
+        
+        # Every run gets its own checkpoint directory and metrics series
+        run_id, output_dir = start_run(config)
+        metrics_store = get_metrics_store(current_app.config['METRICS_DB'])
+        
+        # Set up training parameters
+        training_args = TrainingArguments(
+            output_dir=output_dir,
+            num_train_epochs=config.get('epochs', 3),
+            max_steps=config.get('max_steps', -1),
+            per_device_train_batch_size=config.get('batch_size', 4),
+            gradient_accumulation_steps=config.get('gradient_accumulation_steps', 1),
+            learning_rate=config.get('learning_rate', 2e-4),
+            max_grad_norm=config.get('max_grad_norm', 0.3),
+            warmup_ratio=config.get('warmup_ratio', 0.03),
+            logging_steps=config.get('logging_steps', 10),
+            dataloader_num_workers=config.get('dataloader_num_workers', 0),
+            save_strategy="epoch",
+            evaluation_strategy="epoch" if config.get('validation_split', 0) > 0 else "no",
+            **performance_arguments(config, model)
+        )
         
         # Start training
         trainer = Trainer(
             model=model,
             args=training_args,
             train_dataset=dataset,
-            tokenizer=current_tokenizer,
-            callbacks=[callback]
+            eval_dataset=eval_dataset,
+            tokenizer=model_routes.current_tokenizer,
+            data_collator=data_collator,
+            callbacks=[callback, MetricsStoreCallback(metrics_store, run_id)]
         )
         
         # Update training state
         training_state.update({
             'is_training': True,
+            'run_id': run_id,
             'current_epoch': 0,
             'total_epochs': config.get('epochs', 3),
             'start_time': datetime.now()
         })
         
         # Start training in background
-        trainer.train()
+        try:
+            trainer.train()
+        except Exception:
+            metrics_store.finish_run(run_id, 'failed')
+            raise
+        metrics_store.finish_run(run_id)
         
         # Update training state after completion
         training_state.update({
@@ -163,16 +360,309 @@ def start_finetune():
         
         return jsonify({
             'message': 'Training started successfully',
-            'training_state': training_state
+            'training_state': training_state.to_dict()
         })
         
     except Exception as e:
         training_state['is_training'] = False
         return jsonify({'error': f'Error starting training: {str(e)}'}), 400
+    
+    finally:
+        if not handed_off:
+            model_routes.release_model('training')
+
+def start_dpo_finetune(config):
+    """Train the loaded model with DPO against cached reference log-probs.
+
+    The reference is the loaded model as it is before training, or the checkpoint
+    named by ``reference_checkpoint``. Its log-probs are computed once per dataset
+    and reference and memory-mapped from ``model_cache/dpo_cache/`` afterwards.
+    """
+    base_model = model_routes.current_model
+    tokenizer = model_routes.current_tokenizer
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    
+    dataset_path = resolve_dataset_path(config)
+    dataset = load_preference_dataset(dataset_path, tokenizer, config)
+    
+    reference_path = None
+    if config.get('reference_checkpoint'):
+        checkpoints_dir = os.path.join(current_app.config['MODEL_CACHE'], 'checkpoints')
+        available = {checkpoint['name']: checkpoint['path'] for checkpoint in list_checkpoints(checkpoints_dir)}
+        if config['reference_checkpoint'] not in available:
+            raise ValueError(f"Reference checkpoint not found: {config['reference_checkpoint']}")
+        reference_path = available[config['reference_checkpoint']]
+    
+    cache = ReferenceLogProbCache(os.path.join(current_app.config['MODEL_CACHE'], 'dpo_cache'))
+    cache_key = {
+        **model_routes.weights_key(),
+        'reference_checkpoint': config.get('reference_checkpoint'),
+        'dataset_hash': dataset_fingerprint(dataset_path),
+        'columns': [config.get(f'{name}_column', name) for name in ('prompt', 'chosen', 'rejected')],
+        'max_length': config.get('max_length', 512),
+        'max_prompt_length': config.get('max_prompt_length', config.get('max_length', 512) // 2)
+    }
+    reference_log_probs = cache.get(cache_key) if config.get('use_reference_cache', True) else None
+    reference_cached = reference_log_probs is not None
+    if reference_log_probs is None:
+        # The reference model is only needed for this one batched pass
+        with checkpoint_model(base_model, reference_path) as reference_model:
+            reference_log_probs = cache.compute(
+                cache_key,
+                reference_model,
+                dataset,
+                tokenizer.pad_token_id,
+                token_budget=config.get('token_budget', 16384),
+                max_batch_size=config.get('reference_batch_size', 32)
+            )
+    
+    eval_dataset = None
+    if config.get('validation_split', 0) > 0:
+        split_dataset = dataset.train_test_split(test_size=config['validation_split'])
+        dataset, eval_dataset = split_dataset['train'], split_dataset['test']
+    
+    model_routes.mark_model_modified()
+    model = prepare_model_for_training(base_model, config)
+    run_id, output_dir = start_run(config)
+    metrics_store = get_metrics_store(current_app.config['METRICS_DB'])
+    
+    trainer = DPOTrainer(
+        model=model,
+        args=get_training_arguments(config, output_dir, model),
+        train_dataset=dataset,
+        eval_dataset=eval_dataset,
+        tokenizer=tokenizer,
+        data_collator=DPODataCollator(tokenizer.pad_token_id, reference_log_probs),
+        callbacks=[TrainingCallback(), MetricsStoreCallback(metrics_store, run_id)],
+        beta=config.get('dpo_beta', 0.1),
+        label_smoothing=config.get('dpo_label_smoothing', 0.0)
+    )
+    
+    training_state.update({
+        'is_training': True,
+        'run_id': run_id,
+        'current_epoch': 0,
+        'total_epochs': config.get('epochs', 3),
+        'reference_cached': reference_cached,
+        'start_time': datetime.now()
+    })
+    
+    try:
+        trainer.train()
+    except Exception:
+        metrics_store.finish_run(run_id, 'failed')
+        raise
+    metrics_store.finish_run(run_id)
+    
+    training_state.update({
+        'is_training': False,
+        'end_time': datetime.now()
+    })
+    
+    return jsonify({
+        'message': 'Training started successfully',
+        'training_state': training_state.to_dict()
+    })
+
+def start_data_parallel_finetune(config):
+    """Train with ``num_ranks`` local gloo ranks in the background."""
+    num_ranks = config['num_ranks']
+    if config.get('streaming'):
+        raise ValueError('Streaming datasets are not supported with num_ranks > 1')
+    threads_per_rank = plan_rank_threads(num_ranks, config.get('threads_per_rank'))
+    dataset_path = resolve_dataset_path(config)
+    model_name = model_routes.current_model.name_or_path
+
+    tokenizer = model_routes.current_tokenizer
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    
+    # Ranks load their own copy of the model, so one rank's batch is probed here;
+    # LoRA is applied inside the ranks, which makes this probe conservative
+    if config.get('auto_batch_size'):
+        plan_auto_batch_size(model_routes.current_model, tokenizer, dataset_path, config)
+    
+    run_id, output_dir = start_run(config)
+    metrics_store = get_metrics_store(current_app.config['METRICS_DB'])
+    dataset_dir = prepare_tokenized_dataset(
+        dataset_path,
+        tokenizer,
+        config,
+        os.path.join(current_app.config['MODEL_CACHE'], 'distributed')
+    )
+
+    def on_metrics(event):
+        metrics_store.log(run_id, event['global_step'], {'epoch': event['epoch'], **event['logs']})
+        training_state.update({
+            'current_epoch': event['epoch'],
+            'current_loss': event['logs'].get('loss', training_state['current_loss']),
+            'global_step': event['global_step'],
+            'max_steps': event['max_steps']
+        })
+
+    def run_ranks():
+        try:
+            metrics = launch_data_parallel(
+                model_name,
+                config,
+                dataset_dir,
+                output_dir,
+                num_ranks,
+                threads_per_rank=threads_per_rank,
+                on_metrics=on_metrics
+            )
+            training_state['train_metrics'] = metrics
+            metrics_store.finish_run(run_id)
+        except Exception as e:
+            training_state['error'] = str(e)
+            metrics_store.finish_run(run_id, 'failed')
+        finally:
+            training_state.update({
+                'is_training': False,
+                'end_time': datetime.now()
+            })
+            model_routes.release_model('training')
+
+    training_state.update({
+        'is_training': True,
+        'current_epoch': 0,
+        'total_epochs': config.get('epochs', 3),
+        'start_time': datetime.now(),
+        'end_time': None,
+        'run_id': run_id,
+        'num_ranks': num_ranks,
+        'threads_per_rank': threads_per_rank,
+        'error': None
+    })
+    threading.Thread(target=run_ranks, daemon=True).start()
+
+    return jsonify({
+        'message': 'Data-parallel training started successfully',
+        'training_state': training_state.to_dict()
+    })
 
 @training_bp.route('/training_status', methods=['GET'])
 def get_training_status():
-    return jsonify({
+    return cached_json_response(training_state.version, lambda: {
         'message': 'Training status retrieved successfully',
-        'training_state': training_state
-    }) 
\ No newline at end of file
+        'training_state': training_state.to_dict()
+    })
+
+@training_bp.route('/estimate', methods=['POST'])
+@owner_only
+def estimate_training_config():
+    if model_routes.current_model is None:
+        return jsonify({'error': 'No model loaded'}), 400
+    
+    data = request.get_json() or {}
+    
+    try:
+        # Estimate the saved configuration, overridden by any fields in the request
+        config = {}
+        config_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'training_config.json')
+        if os.path.exists(config_path):
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+        config.update(data)
+        
+        adjusted_config, estimate, adjustments = estimate_config(
+            apply_training_profile(config), data.get('calibrate', True)
+        )
+        
+        return jsonify({
+            'message': 'Estimate computed successfully',
+            'estimate': estimate,
+            'adjustments': adjustments,
+            'config': adjusted_config
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error estimating training: {str(e)}'}), 400
+
+@training_bp.route('/sweep', methods=['POST'])
+@owner_only
+def start_sweep():
+    if sweep_state['is_running'] or training_state['is_training']:
+        return jsonify({'error': 'Training already in progress'}), 400
+
+    data = request.get_json()
+    if not data or 'search_space' not in data:
+        return jsonify({'error': 'Missing search_space'}), 400
+
+    if model_routes.current_model is None:
+        return jsonify({'error': 'No model loaded'}), 400
+
+    if not model_routes.claim_model('sweep'):
+        return model_routes.model_busy_response()
+
+    try:
+        config_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'training_config.json')
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+
+        trials = expand_search_space(
+            data['search_space'],
+            num_trials=data.get('num_trials'),
+            seed=data.get('seed', 42)
+        )
+
+        sweep_id = datetime.now().strftime('sweep-%Y%m%d-%H%M%S')
+        sweep_dir = os.path.join(current_app.config['MODEL_CACHE'], 'sweeps', sweep_id)
+        dataset_path = resolve_dataset_path(config)
+        model_name = model_routes.current_model.name_or_path
+        tokenizer = model_routes.current_tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        # Tokenize once; every trial memory-maps the same Arrow files
+        dataset_dir = prepare_shared_dataset(dataset_path, tokenizer, config, sweep_dir)
+
+        sweep_state.update({
+            'is_running': True,
+            'sweep_id': sweep_id,
+            'num_rungs': 0,
+            'trials': [],
+            'best_trial': None,
+            'error': None
+        })
+
+        def run_sweep():
+            try:
+                result = run_successive_halving(
+                    trials,
+                    config,
+                    model_name,
+                    dataset_dir,
+                    sweep_dir,
+                    max_workers=data.get('max_workers'),
+                    threads_per_trial=data.get('threads_per_trial', 1),
+                    eta=data.get('eta', 3),
+                    on_update=sweep_state.update
+                )
+                sweep_state.update(result)
+            except Exception as e:
+                sweep_state['error'] = str(e)
+            finally:
+                sweep_state['is_running'] = False
+                model_routes.release_model('sweep')
+
+        threading.Thread(target=run_sweep, daemon=True).start()
+
+        return jsonify({
+            'message': 'Sweep started successfully',
+            'sweep_id': sweep_id,
+            'num_trials': len(trials)
+        })
+
+    except Exception as e:
+        sweep_state['is_running'] = False
+        model_routes.release_model('sweep')
+        return jsonify({'error': f'Error starting sweep: {str(e)}'}), 400
+
+@training_bp.route('/sweep_status', methods=['GET'])
+def get_sweep_status():
+    return cached_json_response(sweep_state.version, lambda: {
+        'message': 'Sweep status retrieved successfully',
+        'sweep_state': sweep_state.to_dict()
+    })
@@ -1,12 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import os
-import pandas as pd
 from werkzeug.utils import secure_filename
 import json
+from utils.columnar import read_columnar_metadata, read_preview
+from utils.ingest import convert_files, ingest_dataset, read_dataset_definition
 
 upload_bp = Blueprint('upload', __name__)
 
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'txt', 'md'}
+ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'jsonl', 'txt', 'md'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -16,48 +17,84 @@ def upload_file():
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
+    files = request.files.getlist('file')
+    if any(file.filename == '' for file in files):
         return jsonify({'error': 'No selected file'}), 400
     
-    if file and allowed_file(file.filename):
+    if not all(allowed_file(file.filename) for file in files):
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    filepaths = []
+    for file in files:
         filename = secure_filename(file.filename)
         filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
+        filepaths.append(filepath)
+    
+    # Convert once to the canonical Arrow copy (in parallel for several files); later reads memory-map it
+    try:
+        convert_files(filepaths)
         
-        # Validate file structure
-        try:
-            if filename.endswith('.csv'):
-                df = pd.read_csv(filepath)
-            elif filename.endswith('.xlsx'):
-                df = pd.read_excel(filepath)
-            elif filename.endswith('.txt'):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                df = pd.DataFrame({'text': [content]})
-            elif filename.endswith('.md'):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                df = pd.DataFrame({'text': [content]})
+        results = []
+        for filepath in filepaths:
+            metadata = read_columnar_metadata(filepath)
             
             # Basic validation
-            if df.empty:
-                return jsonify({'error': 'File is empty'}), 400
+            if metadata['statistics']['num_rows'] == 0:
+                return jsonify({'error': f'File is empty: {os.path.basename(filepath)}'}), 400
             
             # Preview first 5 rows
-            preview = df.head().to_dict(orient='records')
-            
-            return jsonify({
-                'message': 'File uploaded successfully',
-                'filename': filename,
-                'preview': preview,
-                'total_rows': len(df)
+            results.append({
+                'filename': os.path.basename(filepath),
+                'preview': read_preview(filepath),
+                'total_rows': metadata['statistics']['num_rows']
             })
-            
-        except Exception as e:
-            return jsonify({'error': f'Error processing file: {str(e)}'}), 400
+        
+        if len(results) == 1:
+            return jsonify({'message': 'File uploaded successfully', **results[0]})
+        
+        return jsonify({
+            'message': 'Files uploaded successfully',
+            'files': results,
+            'total_rows': sum(result['total_rows'] for result in results)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 400
+
+@upload_bp.route('/dataset', methods=['POST'])
+def create_dataset():
+    data = request.get_json()
+    if not data or 'name' not in data or not data.get('files'):
+        return jsonify({'error': 'Missing name or files'}), 400
     
-    return jsonify({'error': 'File type not allowed'}), 400
+    name = secure_filename(data['name'])
+    if not name:
+        return jsonify({'error': 'Invalid dataset name'}), 400
+    
+    try:
+        # Parse all matching files in parallel into one logical dataset
+        definition_path = ingest_dataset(
+            current_app.config['UPLOAD_FOLDER'],
+            name,
+            data['files'],
+            max_workers=data.get('max_workers')
+        )
+        definition = read_dataset_definition(definition_path)
+        
+        return jsonify({
+            'message': 'Dataset created successfully',
+            'dataset_file': os.path.basename(definition_path),
+            'files': [shard['source'] for shard in definition['files']],
+            'total_rows': definition['statistics']['num_rows'],
+            'schema': definition['schema'],
+            'string_fallback_columns': definition['string_fallback_columns'],
+            'ingest_seconds': definition['ingest_seconds'],
+            'preview': read_preview(definition_path)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error creating dataset: {str(e)}'}), 400
 
 @upload_bp.route('/validate', methods=['POST'])
 def validate_dataset():
@@ -72,26 +109,19 @@ def validate_dataset():
         return jsonify({'error': 'File not found'}), 404
     
     try:
-        if filename.endswith('.csv'):
-            df = pd.read_csv(filepath)
-        elif filename.endswith('.xlsx'):
-            df = pd.read_excel(filepath)
-        elif filename.endswith('.txt'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            df = pd.DataFrame({'text': [content]})
-        elif filename.endswith('.md'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            df = pd.DataFrame({'text': [content]})
+        # Statistics were computed at ingest, so only the preview rows are read
+        metadata = read_columnar_metadata(filepath)
+        statistics = metadata['statistics']
         
         # Perform validation
         validation_results = {
-            'total_rows': len(df),
-            'columns': list(df.columns),
-            'missing_values': df.isnull().sum().to_dict(),
-            'data_types': df.dtypes.astype(str).to_dict(),
-            'sample_data': df.head().to_dict(orient='records')
+            'total_rows': statistics['num_rows'],
+            'columns': list(metadata['schema']),
+            'missing_values': {
+                name: column['null_count'] for name, column in statistics['columns'].items()
+            },
+            'data_types': metadata['schema'],
+            'sample_data': read_preview(filepath)
         }
         
         return jsonify({
@@ -0,0 +1,74 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+peft = pytest.importorskip('peft')
+
+from peft.tuners.lora import LoraLayer
+
+from utils.evaluation import checkpoint_model
+
+
+def tiny_model(seed):
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(
+        vocab_size=64,
+        hidden_size=16,
+        intermediate_size=32,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        num_key_value_heads=2
+    )
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+def add_lora(model, seed):
+    """Inject a LoRA adapter the way start_finetune does, with non-zero weights."""
+    config = peft.LoraConfig(r=4, lora_alpha=8, target_modules=['q_proj', 'v_proj'], task_type='CAUSAL_LM')
+    peft_model = peft.get_peft_model(model, config)
+    torch.manual_seed(seed)
+    for name, parameter in peft_model.named_parameters():
+        if 'lora_B' in name:
+            parameter.data.normal_()
+    return peft_model
+
+
+@pytest.fixture
+def lora_checkpoint(tmp_path):
+    path = tmp_path / 'checkpoint'
+    add_lora(tiny_model(0), seed=2).save_pretrained(str(path))
+    return str(path)
+
+
+def logits(model, input_ids):
+    with torch.no_grad():
+        return model(input_ids=input_ids).logits
+
+
+def test_lora_checkpoint_keeps_existing_adapter(lora_checkpoint):
+    base_model = tiny_model(0)
+    add_lora(base_model, seed=1).eval()
+    input_ids = torch.arange(8).unsqueeze(0)
+    before = logits(base_model, input_ids)
+
+    with checkpoint_model(base_model, lora_checkpoint) as model:
+        during = logits(model, input_ids)
+
+    layers = [module for module in base_model.modules() if isinstance(module, LoraLayer)]
+    assert layers
+    assert all('default' in layer.lora_A and 'evaluation' not in layer.lora_A for layer in layers)
+    assert all(layer.active_adapters == ['default'] for layer in layers)
+    assert not torch.allclose(before, during)
+    assert torch.allclose(before, logits(base_model, input_ids))
+
+
+def test_lora_checkpoint_on_plain_model_restores_modules(lora_checkpoint):
+    base_model = tiny_model(0)
+    input_ids = torch.arange(8).unsqueeze(0)
+    before = logits(base_model, input_ids)
+
+    with checkpoint_model(base_model, lora_checkpoint) as model:
+        assert not torch.allclose(before, logits(model, input_ids))
+
+    assert not any(isinstance(module, LoraLayer) for module in base_model.modules())
+    assert torch.allclose(before, logits(base_model, input_ids))
@@ -0,0 +1,196 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import torch
+
+ADAPTER_CONFIG = 'adapter_config.json'
+
+
+def resolve_adapter_path(adapters_dir: str, adapter_id: str) -> str:
+    """Map an adapter ID (path relative to ``adapters_dir``) to its directory."""
+    root = os.path.realpath(adapters_dir)
+    path = os.path.realpath(os.path.join(root, adapter_id))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Invalid adapter id: {adapter_id}")
+    if not os.path.isfile(os.path.join(path, ADAPTER_CONFIG)):
+        raise ValueError(f"Adapter not found: {adapter_id}")
+    return path
+
+
+class AdapterCache:
+    """LRU cache of LoRA adapters loaded on one resident base model.
+
+    The first adapter wraps the base model in a ``PeftModel``; later ones are
+    added with ``load_adapter``. Once more than ``capacity`` adapters are loaded,
+    the least recently used one is deleted. ``activate`` is not thread safe:
+    only one adapter can be active at a time, so callers run it from a single
+    generation thread.
+    """
+
+    def __init__(self, base_model, adapters_dir: str, capacity: int = 8):
+        self.base_model = base_model
+        self.adapters_dir = adapters_dir
+        self.capacity = max(1, capacity)
+        self.peft_model = None
+        self._loaded = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _adapter_name(adapter_id: str) -> str:
+        # Module dict keys cannot contain dots or slashes
+        return 'adapter_' + re.sub(r'\W', '_', adapter_id)
+
+    def activate(self, adapter_id: str):
+        """Load ``adapter_id`` if needed, make it the active adapter and return the model."""
+        name = self._adapter_name(adapter_id)
+        if name in self._loaded:
+            self.hits += 1
+            self._loaded.move_to_end(name)
+        else:
+            from peft import PeftModel
+
+            self.misses += 1
+            path = resolve_adapter_path(self.adapters_dir, adapter_id)
+            if self.peft_model is None:
+                self.peft_model = PeftModel.from_pretrained(self.base_model, path, adapter_name=name)
+            else:
+                self.peft_model.load_adapter(path, adapter_name=name)
+            self.peft_model.eval()
+            self._loaded[name] = adapter_id
+
+        self.peft_model.set_adapter(name)
+
+        while len(self._loaded) > self.capacity:
+            evicted, _ = self._loaded.popitem(last=False)
+            self.peft_model.delete_adapter(evicted)
+            self.evictions += 1
+
+        return self.peft_model
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            'loaded': list(self._loaded.values()),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class MultiAdapterGenerator:
+    """Serves many LoRA adapters from one base model with per-adapter micro-batching.
+
+    Requests are queued and picked up by a single generation thread, which waits
+    up to ``max_wait_ms`` for more requests, groups them by adapter and runs each
+    group as one left-padded greedy ``generate`` batch of up to ``max_batch_size``
+    prompts. Requests without an adapter ID run on the base model.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        adapters_dir: str,
+        cache_size: int = 8,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.adapters = AdapterCache(model, adapters_dir, cache_size)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+        self._requests = 0
+        self._batches = 0
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def generate(self, prompt: str, max_length: int = 100, adapter_id: Optional[str] = None) -> str:
+        if adapter_id is not None:
+            # Fail fast on unknown IDs instead of inside the shared batch
+            resolve_adapter_path(self.adapters.adapters_dir, adapter_id)
+        future = Future()
+        self._queue.put((adapter_id, prompt, max_length, future))
+        return future.result()
+
+    def _collect(self) -> List:
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _worker(self):
+        while True:
+            groups = defaultdict(list)
+            for adapter_id, prompt, max_length, future in self._collect():
+                groups[adapter_id].append((prompt, max_length, future))
+
+            for adapter_id, requests in groups.items():
+                for start in range(0, len(requests), self.max_batch_size):
+                    batch = requests[start:start + self.max_batch_size]
+                    try:
+                        texts = self._generate_batch(adapter_id, batch)
+                    except Exception as e:
+                        for _, _, future in batch:
+                            future.set_exception(e)
+                        continue
+                    for (_, _, future), text in zip(batch, texts):
+                        future.set_result(text)
+
+    def _generate_batch(self, adapter_id: Optional[str], batch: List) -> List[str]:
+        prompts = [prompt for prompt, _, _ in batch]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+        prompt_lengths = inputs['attention_mask'].sum(dim=1).tolist()
+        padded_length = inputs['input_ids'].shape[1]
+        # max_length keeps its per-request meaning: prompt plus generated tokens
+        max_new_tokens = max(max_length - length for (_, max_length, _), length in zip(batch, prompt_lengths))
+
+        with torch.inference_mode():
+            if adapter_id is None:
+                model = self.adapters.peft_model
+                if model is None:
+                    outputs = self.model.generate(**inputs, do_sample=False, max_new_tokens=max(1, max_new_tokens))
+                else:
+                    with model.disable_adapter():
+                        outputs = model.generate(**inputs, do_sample=False, max_new_tokens=max(1, max_new_tokens))
+            else:
+                model = self.adapters.activate(adapter_id)
+                outputs = model.generate(**inputs, do_sample=False, max_new_tokens=max(1, max_new_tokens))
+
+        self._requests += len(batch)
+        self._batches += 1
+
+        texts = []
+        for row, (_, max_length, _), length in zip(outputs, batch, prompt_lengths):
+            tokens = row[padded_length - length:][:max(max_length, length)]
+            texts.append(self.tokenizer.decode(tokens, skip_special_tokens=True))
+        return texts
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            'requests': self._requests,
+            'batches': self._batches,
+            'mean_batch_size': self._requests / self._batches if self._batches else None,
+            'adapters': self.adapters.stats
+        }
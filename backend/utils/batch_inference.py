@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from utils.columnar import open_columnar
+from utils.evaluation import dataset_fingerprint, token_budget_batches
+
+
+def load_prompts(file_path: str, prompt_column: str = 'prompt') -> Tuple[List[str], List[int]]:
+    """Prompts of an uploaded CSV/JSONL file and their row indices; empty rows are skipped."""
+    column = open_columnar(file_path, [prompt_column]).column(prompt_column).to_pylist()
+    prompts, indices = [], []
+    for index, prompt in enumerate(column):
+        if prompt is not None and str(prompt).strip():
+            prompts.append(str(prompt))
+            indices.append(index)
+    return prompts, indices
+
+
+class BatchInferenceJob:
+    """Generate a completion for every prompt of a file into a JSONL output file.
+
+    Prompts are tokenized once and packed longest first into batches of at most
+    ``token_budget`` padded tokens (prompt plus ``max_new_tokens``). Every batch is
+    appended to the output as one ``{"index", "prompt", "completion"}`` line per
+    prompt, in batch order rather than file order. After each batch the output is
+    fsynced and ``<output>.progress.json`` records the completed batches and the
+    byte offset. A restarted job truncates the output to that offset and continues
+    with the next batch, as long as the prompts and settings are unchanged.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        prompts_path: str,
+        output_path: str,
+        prompt_column: str = 'prompt',
+        max_new_tokens: int = 128,
+        max_prompt_length: int = 1024,
+        token_budget: int = 16384,
+        max_batch_size: int = 32,
+        generation_kwargs: Optional[Dict] = None,
+        model_key: Optional[Dict] = None
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prompts_path = prompts_path
+        self.output_path = output_path
+        self.prompt_column = prompt_column
+        self.max_new_tokens = max_new_tokens
+        self.max_prompt_length = max_prompt_length
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.generation_kwargs = generation_kwargs or {'do_sample': False}
+        # Identifies the model and adapter so a resume never mixes outputs of two models
+        self.model_key = model_key or {'model': getattr(model, 'name_or_path', None)}
+
+    @property
+    def progress_path(self) -> str:
+        return f'{self.output_path}.progress.json'
+
+    def fingerprint(self) -> str:
+        settings = {
+            'dataset_hash': dataset_fingerprint(self.prompts_path),
+            'prompt_column': self.prompt_column,
+            'max_new_tokens': self.max_new_tokens,
+            'max_prompt_length': self.max_prompt_length,
+            'token_budget': self.token_budget,
+            'max_batch_size': self.max_batch_size,
+            'generation_kwargs': self.generation_kwargs,
+            **self.model_key
+        }
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def read_progress(self, fingerprint: str) -> Dict:
+        """Checkpointed progress of this job, or a fresh start if there is none or it differs."""
+        try:
+            with open(self.progress_path, 'r') as f:
+                progress = json.load(f)
+        except (FileNotFoundError, ValueError):
+            progress = None
+        if progress is None or progress.get('fingerprint') != fingerprint:
+            return {'fingerprint': fingerprint, 'completed_batches': 0, 'completed_prompts': 0, 'offset': 0}
+        return progress
+
+    def _write_progress(self, progress: Dict):
+        tmp_path = f'{self.progress_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.progress_path)
+
+    def _generate(self, encodings: List[List[int]]) -> List[str]:
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+
+        # Left padding keeps every prompt's last token next to the generated ones
+        width = max(len(ids) for ids in encodings)
+        input_ids = torch.full((len(encodings), width), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(encodings), width), dtype=torch.long)
+        for row, ids in enumerate(encodings):
+            input_ids[row, width - len(ids):] = torch.tensor(ids)
+            attention_mask[row, width - len(ids):] = 1
+
+        outputs = self.model.generate(
+            input_ids=input_ids.to(self.model.device),
+            attention_mask=attention_mask.to(self.model.device),
+            max_new_tokens=self.max_new_tokens,
+            pad_token_id=pad_token_id,
+            **self.generation_kwargs
+        )
+        return self.tokenizer.batch_decode(outputs[:, width:], skip_special_tokens=True)
+
+    def run(self, on_progress: Optional[Callable[[Dict], None]] = None, stop_event=None) -> Dict:
+        """Run (or resume) the job; ``stop_event`` cancels it after the current batch."""
+        start = time.perf_counter()
+        prompts, indices = load_prompts(self.prompts_path, self.prompt_column)
+        if not prompts:
+            raise ValueError(f"No prompts found in column {self.prompt_column}")
+
+        encodings = self.tokenizer(prompts, truncation=True, max_length=self.max_prompt_length)['input_ids']
+        lengths = [len(ids) + self.max_new_tokens for ids in encodings]
+        batches = list(token_budget_batches(lengths, self.token_budget, self.max_batch_size))
+
+        fingerprint = self.fingerprint()
+        progress = self.read_progress(fingerprint)
+        resumed_from = progress['completed_prompts']
+
+        # Lines written after the last checkpoint belong to an unfinished batch
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        with open(self.output_path, 'ab'):
+            pass
+        os.truncate(self.output_path, progress['offset'])
+
+        def report(status):
+            if on_progress:
+                elapsed = time.perf_counter() - start
+                done = progress['completed_prompts'] - resumed_from
+                on_progress({
+                    'status': status,
+                    'total_prompts': len(prompts),
+                    'completed_prompts': progress['completed_prompts'],
+                    'total_batches': len(batches),
+                    'completed_batches': progress['completed_batches'],
+                    'resumed_from': resumed_from,
+                    'prompts_per_second': done / elapsed if elapsed > 0 else None
+                })
+
+        was_training = self.model.training
+        self.model.eval()
+        status = 'completed'
+        report('running')
+        try:
+            with open(self.output_path, 'ab') as output, torch.inference_mode():
+                for batch in batches[progress['completed_batches']:]:
+                    if stop_event is not None and stop_event.is_set():
+                        status = 'cancelled'
+                        break
+
+                    completions = self._generate([encodings[i] for i in batch])
+                    for i, completion in zip(batch, completions):
+                        record = {'index': indices[i], 'prompt': prompts[i], 'completion': completion}
+                        output.write((json.dumps(record) + '\n').encode('utf-8'))
+                    output.flush()
+                    os.fsync(output.fileno())
+
+                    progress.update({
+                        'completed_batches': progress['completed_batches'] + 1,
+                        'completed_prompts': progress['completed_prompts'] + len(batch),
+                        'offset': output.tell()
+                    })
+                    self._write_progress(progress)
+                    report('running')
+        finally:
+            if was_training:
+                self.model.train()
+
+        report(status)
+        return {
+            'status': status,
+            'output_path': self.output_path,
+            'total_prompts': len(prompts),
+            'completed_prompts': progress['completed_prompts'],
+            'resumed_from': resumed_from,
+            'elapsed_seconds': time.perf_counter() - start
+        }
@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psutil
+import torch
+
+# Bytes of optimizer state per trainable parameter (two fp32 AdamW moments)
+ADAMW_STATE_BYTES = 8
+
+
+class PeakMemorySampler:
+    """Track peak memory while a probe runs (CUDA allocator or process RSS on CPU)."""
+
+    def __init__(self, device, interval: float = 0.005):
+        self.device = device
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+            torch.cuda.reset_peak_memory_stats(self.device)
+        else:
+            process = psutil.Process()
+            self.peak = process.memory_info().rss
+
+            def sample():
+                while not self._stop.is_set():
+                    self.peak = max(self.peak, process.memory_info().rss)
+                    time.sleep(self.interval)
+
+            self._thread = threading.Thread(target=sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+            self.peak = torch.cuda.max_memory_allocated(self.device)
+        else:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, psutil.Process().memory_info().rss)
+        return False
+
+
+def default_memory_limit(device) -> int:
+    """Memory ceiling for probing: 90% of what the device can still hold."""
+    if device.type == 'cuda':
+        return int(torch.cuda.get_device_properties(device).total_memory * 0.9)
+    return int(psutil.Process().memory_info().rss + psutil.virtual_memory().available * 0.9)
+
+
+def _is_out_of_memory(error: Exception) -> bool:
+    return isinstance(error, MemoryError) or 'out of memory' in str(error).lower()
+
+
+def probe_batch_size(model, batch: Dict[str, torch.Tensor], steps: int = 3) -> Dict:
+    """Run forward/backward steps on one batch and record peak memory and step time."""
+    device = next(model.parameters()).device
+    batch = {k: v.to(device) for k, v in batch.items()}
+    batch_size = batch['input_ids'].shape[0]
+
+    model.train()
+    # Warm-up step so lazy allocations and kernel selection are not timed
+    model(**batch).loss.backward()
+    model.zero_grad(set_to_none=True)
+
+    with PeakMemorySampler(device) as sampler:
+        start = time.perf_counter()
+        for _ in range(steps):
+            model(**batch).loss.backward()
+            model.zero_grad(set_to_none=True)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        step_time = (time.perf_counter() - start) / steps
+
+    return {
+        'batch_size': batch_size,
+        'step_time': step_time,
+        'samples_per_second': batch_size / step_time,
+        'peak_memory': sampler.peak
+    }
+
+
+def plan_batch_size(
+    model,
+    tokenizer,
+    texts: List[str],
+    effective_batch_size: int,
+    max_length: int = 512,
+    memory_limit: Optional[int] = None,
+    max_batch_size: Optional[int] = None,
+    probe_steps: int = 3
+) -> Dict:
+    """Pick the throughput-optimal micro batch size under ``memory_limit``.
+
+    Only divisors of ``effective_batch_size`` are probed, smallest first, with
+    padded ``max_length`` sequences, so the measurement reflects the worst case
+    seen during training. Gradient accumulation is then derived so that
+    ``batch_size * accumulation`` equals the requested effective batch size.
+    """
+    if not texts:
+        raise ValueError("No samples available for batch size probing")
+
+    device = next(model.parameters()).device
+    if memory_limit is None:
+        memory_limit = default_memory_limit(device)
+    max_batch_size = max_batch_size or effective_batch_size
+
+    # Optimizer state is allocated once regardless of batch size
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    optimizer_bytes = trainable * ADAMW_STATE_BYTES
+
+    probes = []
+    divisors = [size for size in range(1, effective_batch_size + 1)
+                if effective_batch_size % size == 0 and size <= max_batch_size]
+    for batch_size in divisors:
+        samples = [texts[i % len(texts)] for i in range(batch_size)]
+        batch = tokenizer(
+            samples,
+            padding='max_length',
+            truncation=True,
+            max_length=max_length,
+            return_tensors='pt'
+        )
+        batch['labels'] = batch['input_ids'].masked_fill(batch['attention_mask'] == 0, -100)
+
+        try:
+            probe = probe_batch_size(model, dict(batch), steps=probe_steps)
+        except (RuntimeError, MemoryError) as e:
+            if not _is_out_of_memory(e):
+                raise
+            model.zero_grad(set_to_none=True)
+            if device.type == 'cuda':
+                torch.cuda.empty_cache()
+            probes.append({'batch_size': batch_size, 'error': 'out of memory'})
+            break
+
+        probe['projected_peak_memory'] = probe['peak_memory'] + optimizer_bytes
+        probe['fits'] = probe['projected_peak_memory'] <= memory_limit
+        probes.append(probe)
+        if not probe['fits']:
+            break
+
+    candidates = [p for p in probes if p.get('fits')]
+    if not candidates:
+        raise ValueError("Even a batch size of 1 exceeds the memory limit")
+
+    best = max(candidates, key=lambda p: p['samples_per_second'])
+    accumulation = effective_batch_size // best['batch_size']
+
+    return {
+        'per_device_train_batch_size': best['batch_size'],
+        'gradient_accumulation_steps': accumulation,
+        'effective_batch_size': best['batch_size'] * accumulation,
+        'memory_limit': memory_limit,
+        'probes': probes
+    }
@@ -0,0 +1,189 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+from pyarrow import json as pa_json
+
+# Canonical copy is stored next to the upload as ``<filename>.arrow``
+COLUMNAR_SUFFIX = '.arrow'
+ROW_GROUP_SIZE = 65536
+METADATA_KEY = b'black_mango'
+# Multi-file datasets are described by ``<name>.dataset.json`` in the upload folder
+DATASET_SUFFIX = '.dataset.json'
+
+
+def columnar_path(file_path: str) -> str:
+    """Path of the canonical Arrow copy of an uploaded dataset."""
+    return file_path + COLUMNAR_SUFFIX
+
+
+def _table_from_pandas(df: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns that mix numbers and text fall back to strings; missing cells stay null
+        object_columns = df.select_dtypes(include='object').columns
+        df = df.assign(**{c: df[c].where(df[c].isna(), df[c].astype(str)) for c in object_columns})
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _read_source_table(file_path: str) -> pa.Table:
+    """Parse the original upload into an Arrow table (the only place raw files are parsed)."""
+    if file_path.endswith('.csv'):
+        # Empty text cells are missing values, as pandas reads them
+        return pa_csv.read_csv(file_path, convert_options=pa_csv.ConvertOptions(strings_can_be_null=True))
+    if file_path.endswith('.jsonl'):
+        try:
+            return pa_json.read_json(file_path)
+        except pa.ArrowInvalid:
+            # pyarrow infers one type per column from the first block; pandas takes mixed types
+            return _table_from_pandas(pd.read_json(file_path, lines=True))
+    if file_path.endswith('.xlsx'):
+        return _table_from_pandas(pd.read_excel(file_path))
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return pa.table({'text': [content]})
+
+
+def _column_statistics(column) -> Dict:
+    """Null count and min/max (string lengths for text columns) of one column."""
+    stats = {'null_count': column.null_count}
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        column = pc.utf8_length(column)
+        stats['length'] = True
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        min_max = pc.min_max(column).as_py()
+        stats.update({'min': min_max['min'], 'max': min_max['max']})
+    return stats
+
+
+def _table_statistics(table: pa.Table, row_group_size: int) -> Dict:
+    row_groups = []
+    for offset in range(0, table.num_rows, row_group_size):
+        group = table.slice(offset, row_group_size)
+        row_groups.append({
+            'offset': offset,
+            'num_rows': group.num_rows,
+            'columns': {name: _column_statistics(group.column(name)) for name in group.column_names}
+        })
+
+    return {
+        'num_rows': table.num_rows,
+        'columns': {name: _column_statistics(table.column(name)) for name in table.column_names},
+        'row_groups': row_groups
+    }
+
+
+def write_columnar(table: pa.Table, output_path: str, source: str, source_mtime: float,
+                   row_group_size: int = ROW_GROUP_SIZE) -> str:
+    """Write ``table`` as an Arrow IPC stream carrying schema and row-group statistics."""
+    metadata = {
+        'source': source,
+        'source_mtime': source_mtime,
+        'row_group_size': row_group_size,
+        'statistics': _table_statistics(table, row_group_size)
+    }
+    schema = table.schema.with_metadata({METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_stream(sink, schema) as writer:
+            writer.write_table(table.replace_schema_metadata(schema.metadata), max_chunksize=row_group_size)
+    os.replace(tmp_path, output_path)
+
+    return output_path
+
+
+def convert_to_columnar(file_path: str, row_group_size: int = ROW_GROUP_SIZE) -> str:
+    """Convert an upload to an Arrow IPC stream with schema and row-group statistics.
+
+    The stream format is what ``datasets.Dataset.from_file`` memory-maps, so the same
+    file serves pandas, pyarrow and Hugging Face readers without another copy.
+    """
+    return write_columnar(
+        _read_source_table(file_path),
+        columnar_path(file_path),
+        os.path.basename(file_path),
+        os.path.getmtime(file_path),
+        row_group_size
+    )
+
+
+def ensure_columnar(file_path: str) -> str:
+    """Return the Arrow copy of ``file_path``, converting it if missing or stale."""
+    output_path = columnar_path(file_path)
+    if not os.path.exists(output_path) or os.path.getmtime(output_path) < os.path.getmtime(file_path):
+        convert_to_columnar(file_path)
+    return output_path
+
+
+def is_dataset_definition(file_path: str) -> bool:
+    """Whether ``file_path`` is a multi-file dataset definition (see ``utils.ingest``)."""
+    return file_path.endswith(DATASET_SUFFIX)
+
+
+def columnar_files(file_path: str) -> List[str]:
+    """Arrow files backing a dataset: one per upload, one per shard for definitions."""
+    if is_dataset_definition(file_path):
+        from utils.ingest import ensure_dataset
+
+        return ensure_dataset(file_path)
+    return [ensure_columnar(file_path)]
+
+
+def open_columnar(file_path: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """Memory-map the Arrow copy zero-copy, projecting to ``columns`` if given.
+
+    Shards of a dataset definition share one schema, so they are combined as
+    chunks of a single table without copying.
+    """
+    tables = []
+    for path in columnar_files(file_path):
+        table = pa.ipc.open_stream(pa.memory_map(path, 'r')).read_all()
+        tables.append(table.select(columns) if columns is not None else table)
+    return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+
+def read_columnar_metadata(file_path: str) -> Dict:
+    """Read schema and statistics without touching any record batch."""
+    if is_dataset_definition(file_path):
+        from utils.ingest import read_dataset_definition
+
+        columnar_files(file_path)
+        definition = read_dataset_definition(file_path)
+        return {
+            'source': definition['name'],
+            'files': definition['files'],
+            'statistics': definition['statistics'],
+            'schema': definition['schema']
+        }
+
+    with pa.memory_map(ensure_columnar(file_path), 'r') as source:
+        schema = pa.ipc.open_stream(source).schema
+
+    metadata = json.loads(schema.metadata[METADATA_KEY])
+    metadata['schema'] = {field.name: str(field.type) for field in schema}
+    return metadata
+
+
+def read_dataframe(file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a dataset as a DataFrame through its memory-mapped Arrow copy."""
+    return open_columnar(file_path, columns).to_pandas()
+
+
+def read_preview(file_path: str, num_rows: int = 5) -> List[Dict]:
+    """First rows of the dataset; only the first record batch is paged in."""
+    return open_columnar(file_path).slice(0, num_rows).to_pylist()
+
+
+def load_hf_dataset(file_path: str):
+    """Open the Arrow copy as a memory-mapped Hugging Face ``Dataset``."""
+    from datasets import Dataset, concatenate_datasets
+
+    datasets = [Dataset.from_file(path) for path in columnar_files(file_path)]
+    return datasets[0] if len(datasets) == 1 else concatenate_datasets(datasets)
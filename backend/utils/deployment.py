@@ -0,0 +1,452 @@
+import http.client
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from utils.adapters import MultiAdapterGenerator
+from utils.speculative import AssistedGenerator, load_draft_model
+
+WEIGHTS_FILE = 'weights.pt'
+
+
+def _serving_state_dict(model, merge_lora: bool = True) -> Dict[str, torch.Tensor]:
+    """Plain base-model state dict of a model that may carry injected LoRA layers.
+
+    LoRA training wraps layers of the loaded model in place, so its state dict has
+    ``base_layer`` and ``lora_*`` entries that a fresh model cannot load. Those are
+    folded back into the original keys, with the active adapters merged into the
+    weights when ``merge_lora`` is set.
+    """
+    from peft import PeftModel
+    from peft.tuners.lora import LoraLayer
+
+    if isinstance(model, PeftModel):
+        model = model.get_base_model()
+
+    state_dict = {
+        name.replace('.base_layer.', '.'): tensor.detach()
+        for name, tensor in model.state_dict().items()
+        if 'lora_' not in name
+    }
+
+    if merge_lora:
+        for name, module in model.named_modules():
+            if not isinstance(module, LoraLayer) or module.merged or module.disable_adapters:
+                continue
+            key = f'{name}.weight'
+            for adapter in module.active_adapters:
+                if adapter in module.lora_A:
+                    state_dict[key] = state_dict[key] + module.get_delta_weight(adapter).detach()
+
+    return {name: tensor.cpu().contiguous() for name, tensor in state_dict.items()}
+
+
+def export_for_serving(model, tokenizer, output_dir: str, merge_lora: bool = True) -> str:
+    """Write config, tokenizer and a flat state dict that replicas can memory-map."""
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    torch.save(_serving_state_dict(model, merge_lora), os.path.join(output_dir, WEIGHTS_FILE))
+    return output_dir
+
+
+def load_shared_model(model_dir: str):
+    """Load a model whose weights are memory-mapped from ``weights.pt``.
+
+    Parameters point straight at the page cache (``mmap=True`` plus ``assign=True``),
+    so replicas on one host share a single physical copy of the weights.
+    """
+    from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+    from transformers.modeling_utils import no_init_weights
+
+    config = AutoConfig.from_pretrained(model_dir)
+    state_dict = torch.load(os.path.join(model_dir, WEIGHTS_FILE), mmap=True, weights_only=True)
+    dtype = next(iter(state_dict.values())).dtype
+
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype)
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+    model.eval()
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return model, tokenizer
+
+
+def build_generator(model_dir: str, serving_config: Optional[Dict] = None):
+    """Load the deployed model (and its draft model or adapters, if configured) for one replica."""
+    serving_config = serving_config or {}
+    model, tokenizer = load_shared_model(model_dir)
+    if serving_config.get('adapters_dir'):
+        return MultiAdapterGenerator(
+            model,
+            tokenizer,
+            serving_config['adapters_dir'],
+            cache_size=serving_config.get('adapter_cache_size', 8),
+            max_batch_size=serving_config.get('max_batch_size', 8)
+        )
+
+    draft_model = None
+    if serving_config.get('draft_model'):
+        draft_model = load_draft_model(serving_config['draft_model'], model, tokenizer)
+    return AssistedGenerator(
+        model,
+        tokenizer,
+        draft_model=draft_model,
+        min_acceptance_rate=serving_config.get('min_acceptance_rate', 0.3)
+    )
+
+
+def build_generation_app(generator):
+    """FastAPI app exposing ``/generate`` and ``/health`` for one generator."""
+    from fastapi import FastAPI, HTTPException
+
+    app = FastAPI()
+
+    @app.post("/generate")
+    def generate(prompt: str, max_length: int = 100, adapter_id: Optional[str] = None):
+        # Sync endpoint: FastAPI runs it in a thread pool and torch releases the GIL
+        try:
+            return {"generated_text": generator.generate(prompt, max_length, adapter_id=adapter_id)}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "pid": os.getpid(), "generation": generator.stats}
+
+    return app
+
+
+def _set_replica_threads(num_threads: Optional[int]):
+    if num_threads:
+        os.environ['OMP_NUM_THREADS'] = str(num_threads)
+        torch.set_num_threads(num_threads)
+
+
+def _api_replica_main(model_dir: str, port: int, num_threads: Optional[int], serving_config: Dict):
+    """Entry point of an API replica process."""
+    import uvicorn
+
+    _set_replica_threads(num_threads)
+    generator = build_generator(model_dir, serving_config)
+    uvicorn.run(build_generation_app(generator), host="127.0.0.1", port=port, log_level="warning")
+
+
+def _gradio_replica_main(
+    model_dir: str,
+    port: int,
+    num_threads: Optional[int],
+    serving_config: Dict,
+    share: bool,
+    url_queue
+):
+    """Entry point of the Gradio replica process."""
+    import gradio as gr
+
+    _set_replica_threads(num_threads)
+    generator = build_generator(model_dir, serving_config)
+
+    inputs = [
+        gr.Textbox(label="Input Prompt"),
+        gr.Slider(minimum=10, maximum=200, value=100, label="Max Length")
+    ]
+    if isinstance(generator, MultiAdapterGenerator):
+        inputs.append(gr.Textbox(label="Adapter ID (empty for the base model)"))
+
+    interface = gr.Interface(
+        fn=lambda prompt, max_length=100, adapter_id=None: generator.generate(
+            prompt, int(max_length), adapter_id=adapter_id or None
+        ),
+        inputs=inputs,
+        outputs=gr.Textbox(label="Generated Text"),
+        title="Fine-tuned LLM Chat Interface"
+    )
+    _, local_url, share_url = interface.launch(
+        server_name="0.0.0.0",
+        server_port=port,
+        share=share,
+        prevent_thread_lock=True
+    )
+    url_queue.put({'local_url': local_url, 'share_url': share_url})
+    interface.block_thread()
+
+
+class Replica:
+    """One serving process and its bookkeeping."""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.healthy = False
+        self.generation = None
+
+    def status(self) -> Dict:
+        return {
+            'index': self.index,
+            'port': self.port,
+            'pid': self.process.pid if self.process else None,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'restarts': self.restarts,
+            'generation': self.generation
+        }
+
+
+class DeploymentSupervisor:
+    """Runs the serving layer as replica processes behind a local dispatcher.
+
+    API deployments start ``num_replicas`` uvicorn processes on ``base_port``,
+    ``base_port + 1``, ... and a dispatcher on ``dispatch_port`` that forwards each
+    request to a healthy replica (``least_busy`` or ``round_robin``). A monitor
+    thread health-checks replicas and restarts crashed ones. Gradio deployments
+    run a single supervised Gradio process on ``dispatch_port``. ``stop`` terminates everything, which
+    releases the ports and the model memory.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        deployment_type: str = 'api',
+        num_replicas: int = 1,
+        dispatch_port: int = 8000,
+        base_port: int = 8100,
+        policy: str = 'least_busy',
+        threads_per_replica: Optional[int] = None,
+        serving_config: Optional[Dict] = None,
+        share: bool = False,
+        health_interval: float = 5.0,
+        startup_timeout: float = 600.0,
+        on_update: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        if deployment_type not in ('api', 'gradio'):
+            raise ValueError(f"Invalid deployment type: {deployment_type}")
+        if policy not in ('least_busy', 'round_robin'):
+            raise ValueError(f"Invalid dispatch policy: {policy}")
+
+        self.model_dir = model_dir
+        self.deployment_type = deployment_type
+        self.num_replicas = 1 if deployment_type == 'gradio' else num_replicas
+        self.dispatch_port = dispatch_port
+        self.policy = policy
+        self.threads_per_replica = threads_per_replica or max(1, (os.cpu_count() or 1) // self.num_replicas)
+        self.serving_config = serving_config or {}
+        self.share = share
+        self.health_interval = health_interval
+        self.startup_timeout = startup_timeout
+        self.on_update = on_update
+
+        if deployment_type == 'gradio':
+            # Gradio serves directly on the public port, without a dispatcher
+            self.replicas = [Replica(0, dispatch_port)]
+        else:
+            self.replicas = [Replica(i, base_port + i) for i in range(self.num_replicas)]
+        self.urls = {}
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._round_robin = itertools.cycle(range(self.num_replicas))
+        self._stop = threading.Event()
+        self._dispatcher = None
+        self._monitor = None
+
+    # Replica lifecycle
+
+    def _spawn(self, replica: Replica):
+        if self.deployment_type == 'gradio':
+            url_queue = self._context.Queue()
+            target = _gradio_replica_main
+            args = (self.model_dir, replica.port, self.threads_per_replica, self.serving_config, self.share, url_queue)
+        else:
+            url_queue = None
+            target = _api_replica_main
+            args = (self.model_dir, replica.port, self.threads_per_replica, self.serving_config)
+
+        replica.process = self._context.Process(target=target, args=args, daemon=True)
+        replica.process.start()
+        replica.healthy = False
+        replica.failures = 0
+        replica.in_flight = 0
+        return url_queue
+
+    def _check_health(self, replica: Replica) -> bool:
+        if replica.process is None or not replica.process.is_alive():
+            return False
+        path = '/' if self.deployment_type == 'gradio' else '/health'
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', replica.port, timeout=2)
+            connection.request('GET', path)
+            response = connection.getresponse()
+            healthy = response.status == 200
+            if healthy and self.deployment_type == 'api':
+                replica.generation = json.loads(response.read()).get('generation')
+            connection.close()
+            return healthy
+        except OSError:
+            return False
+
+    def _wait_until_healthy(self, replica: Replica, deadline: float):
+        while time.monotonic() < deadline:
+            if replica.process.exitcode is not None:
+                raise RuntimeError(f"Replica {replica.index} exited with code {replica.process.exitcode}")
+            if self._check_health(replica):
+                replica.healthy = True
+                return
+            time.sleep(0.5)
+        raise TimeoutError(f"Replica {replica.index} did not become healthy")
+
+    def _terminate(self, replica: Replica, timeout: float = 10.0):
+        process = replica.process
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        replica.process = None
+        replica.healthy = False
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.health_interval):
+            before = [(r.healthy, r.restarts, r.generation) for r in self.replicas]
+            for replica in self.replicas:
+                if self._check_health(replica):
+                    replica.healthy = True
+                    replica.failures = 0
+                    continue
+
+                replica.failures += 1
+                replica.healthy = False
+                crashed = replica.process is None or not replica.process.is_alive()
+                if (crashed or replica.failures >= 3) and not self._stop.is_set():
+                    self._terminate(replica)
+                    self._spawn(replica)
+                    replica.restarts += 1
+
+            if self.on_update and before != [(r.healthy, r.restarts, r.generation) for r in self.replicas]:
+                self.on_update(self.status())
+
+    # Dispatching
+
+    def acquire_replica(self, exclude=()) -> Optional[Replica]:
+        with self._lock:
+            candidates = [r for r in self.replicas if r.healthy and r.index not in exclude]
+            if not candidates:
+                return None
+            if self.policy == 'round_robin':
+                for _ in range(self.num_replicas):
+                    index = next(self._round_robin)
+                    replica = self.replicas[index]
+                    if replica in candidates:
+                        break
+            else:
+                replica = min(candidates, key=lambda r: r.in_flight)
+            replica.in_flight += 1
+            replica.requests += 1
+            return replica
+
+    def release_replica(self, replica: Replica):
+        with self._lock:
+            replica.in_flight -= 1
+
+    def _start_dispatcher(self):
+        supervisor = self
+
+        class DispatchHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _forward(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                tried = set()
+                while True:
+                    replica = supervisor.acquire_replica(exclude=tried)
+                    if replica is None:
+                        self._reply(503, json.dumps({'error': 'No healthy replicas'}).encode('utf-8'), 'application/json')
+                        return
+                    try:
+                        connection = http.client.HTTPConnection('127.0.0.1', replica.port)
+                        connection.request(self.command, self.path, body=body, headers={
+                            'Content-Type': self.headers.get('Content-Type', 'application/json')
+                        })
+                        response = connection.getresponse()
+                        payload = response.read()
+                        connection.close()
+                        self._reply(response.status, payload, response.getheader('Content-Type', 'application/json'))
+                        return
+                    except OSError:
+                        # Replica went away mid-request; let the monitor restart it
+                        replica.healthy = False
+                        tried.add(replica.index)
+                    finally:
+                        supervisor.release_replica(replica)
+
+            def _reply(self, status, payload, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _forward
+            do_POST = _forward
+
+            def log_message(self, format, *args):
+                pass
+
+        self._dispatcher = ThreadingHTTPServer(('0.0.0.0', self.dispatch_port), DispatchHandler)
+        self._dispatcher.daemon_threads = True
+        threading.Thread(target=self._dispatcher.serve_forever, daemon=True).start()
+
+    # Public API
+
+    def start(self) -> Dict:
+        """Start replicas, wait until they are healthy, then start dispatching."""
+        deadline = time.monotonic() + self.startup_timeout
+        try:
+            queues = [self._spawn(replica) for replica in self.replicas]
+            for replica in self.replicas:
+                self._wait_until_healthy(replica, deadline)
+
+            if self.deployment_type == 'gradio':
+                self.urls = queues[0].get(timeout=max(1.0, deadline - time.monotonic()))
+            else:
+                self._start_dispatcher()
+                self.urls = {'local_url': f'http://localhost:{self.dispatch_port}'}
+        except Exception:
+            self.stop()
+            raise
+
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+        return self.urls
+
+    def stop(self):
+        """Stop dispatching and terminate all replicas, releasing ports and memory."""
+        self._stop.set()
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown()
+            self._dispatcher.server_close()
+            self._dispatcher = None
+        if self._monitor is not None and self._monitor is not threading.current_thread():
+            self._monitor.join()
+            self._monitor = None
+        for replica in self.replicas:
+            self._terminate(replica)
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [replica.status() for replica in self.replicas]
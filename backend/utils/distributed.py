@@ -0,0 +1,166 @@
+import os
+import queue
+import socket
+from typing import Callable, Dict, Optional
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def find_free_port() -> int:
+    """Find a free local TCP port for the gloo rendezvous."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def plan_rank_threads(world_size: int, threads_per_rank: Optional[int] = None) -> int:
+    """Split the available cores evenly between local ranks."""
+    if threads_per_rank:
+        return threads_per_rank
+    return max(1, (os.cpu_count() or 1) // world_size)
+
+
+def prepare_tokenized_dataset(file_path, tokenizer, config, output_dir):
+    """Tokenize once in the launcher so ranks only memory-map the result."""
+    from datasets import DatasetDict
+    from utils.training_utils import prepare_dataset
+
+    train_dataset, eval_dataset = prepare_dataset(file_path, tokenizer, config)
+    splits = {'train': train_dataset}
+    if eval_dataset is not None:
+        splits['validation'] = eval_dataset
+
+    dataset_dir = os.path.join(output_dir, 'tokenized')
+    DatasetDict(splits).save_to_disk(dataset_dir)
+    return dataset_dir
+
+
+def _pin_rank(rank, threads_per_rank):
+    """Pin a rank to its own slice of cores and size its thread pools accordingly."""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_rank)
+    os.environ['MKL_NUM_THREADS'] = str(threads_per_rank)
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+    if hasattr(os, 'sched_setaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+        start = rank * threads_per_rank
+        if start + threads_per_rank <= len(cores):
+            os.sched_setaffinity(0, cores[start:start + threads_per_rank])
+
+    torch.set_num_threads(threads_per_rank)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def _rank_worker(rank, world_size, master_port, threads_per_rank, model_name, config,
+                 dataset_dir, output_dir, metrics_queue):
+    """Entry point of one data-parallel rank."""
+    from datasets import load_from_disk
+    from transformers import AutoModelForCausalLM, AutoTokenizer, DataCollatorForLanguageModeling, TrainerCallback
+    from utils.training_utils import create_trainer, get_training_arguments, prepare_model_for_training
+
+    os.environ.update({
+        'MASTER_ADDR': '127.0.0.1',
+        'MASTER_PORT': str(master_port),
+        'RANK': str(rank),
+        'LOCAL_RANK': str(rank),
+        'WORLD_SIZE': str(world_size)
+    })
+    _pin_rank(rank, threads_per_rank)
+    dist.init_process_group(backend='gloo', rank=rank, world_size=world_size)
+
+    class MetricsQueueCallback(TrainerCallback):
+        # Logged losses are already gathered across ranks, so rank 0 reports for everyone
+        def on_log(self, args, state, control, logs=None, **kwargs):
+            if state.is_world_process_zero and logs:
+                metrics_queue.put({
+                    'type': 'log',
+                    'epoch': state.epoch,
+                    'global_step': state.global_step,
+                    'max_steps': state.max_steps,
+                    'logs': logs
+                })
+
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        model = prepare_model_for_training(model, config)
+
+        dataset = load_from_disk(dataset_dir)
+        training_args = get_training_arguments(
+            {**config, 'ddp_backend': 'gloo', 'use_cpu': True},
+            output_dir
+        )
+
+        # Trainer shards the training set across ranks with a DistributedSampler
+        trainer = create_trainer(
+            model,
+            dataset['train'],
+            dataset['validation'] if 'validation' in dataset else None,
+            training_args,
+            tokenizer
+        )
+        trainer.data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+        trainer.add_callback(MetricsQueueCallback())
+        result = trainer.train()
+
+        if trainer.is_world_process_zero():
+            trainer.save_model(output_dir)
+            metrics_queue.put({'type': 'end', 'metrics': result.metrics})
+    finally:
+        dist.destroy_process_group()
+
+
+def launch_data_parallel(
+    model_name: str,
+    config: Dict,
+    dataset_dir: str,
+    output_dir: str,
+    world_size: int,
+    threads_per_rank: Optional[int] = None,
+    on_metrics: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """Spawn ``world_size`` local gloo ranks and block until training finishes.
+
+    Rank-0 log events are forwarded to ``on_metrics`` while training runs.
+    Returns the final train metrics reported by rank 0.
+    """
+    threads_per_rank = plan_rank_threads(world_size, threads_per_rank)
+    context = mp.get_context('spawn')
+    metrics_queue = context.Queue()
+
+    process_context = mp.start_processes(
+        _rank_worker,
+        args=(world_size, find_free_port(), threads_per_rank, model_name, config,
+              dataset_dir, output_dir, metrics_queue),
+        nprocs=world_size,
+        join=False,
+        start_method='spawn'
+    )
+
+    final_metrics = {}
+
+    def drain():
+        while True:
+            try:
+                event = metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            if event['type'] == 'end':
+                final_metrics.update(event['metrics'])
+            elif on_metrics:
+                on_metrics(event)
+
+    # join() re-raises the first rank failure as ProcessRaisedException
+    while not process_context.join(timeout=1):
+        drain()
+    drain()
+
+    return final_metrics
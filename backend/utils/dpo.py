@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from datasets import Dataset
+from transformers import Trainer
+
+from utils.columnar import open_columnar
+from utils.evaluation import token_budget_batches
+
+
+def load_preference_dataset(file_path: str, tokenizer, config: Dict) -> Dataset:
+    """Tokenize ``prompt``/``chosen``/``rejected`` rows into pairs of full sequences.
+
+    Prompts keep their last ``max_prompt_length`` tokens; responses end with EOS and
+    are cut so each sequence fits in ``max_length``. ``index`` is the pair's position
+    in the reference log-prob cache.
+    """
+    columns = [config.get(f'{name}_column', name) for name in ('prompt', 'chosen', 'rejected')]
+    table = open_columnar(file_path, columns)
+    # Pairs with a missing prompt or response are skipped
+    pairs = [
+        values for values in zip(*(table.column(column).to_pylist() for column in columns))
+        if all(value is not None and str(value).strip() for value in values)
+    ]
+    if not pairs:
+        raise ValueError(f"No complete preference pairs in columns {', '.join(columns)}")
+    prompts, chosen, rejected = ([str(value) for value in column] for column in zip(*pairs))
+
+    max_length = config.get('max_length', 512)
+    max_prompt_length = config.get('max_prompt_length', max_length // 2)
+    eos = [tokenizer.eos_token_id] if tokenizer.eos_token_id is not None else []
+
+    prompt_ids = tokenizer(prompts)['input_ids']
+    chosen_ids = tokenizer(chosen, add_special_tokens=False)['input_ids']
+    rejected_ids = tokenizer(rejected, add_special_tokens=False)['input_ids']
+
+    rows = {'index': [], 'prompt_length': [], 'chosen_input_ids': [], 'rejected_input_ids': []}
+    for index, (prompt, good, bad) in enumerate(zip(prompt_ids, chosen_ids, rejected_ids)):
+        prompt = prompt[-max_prompt_length:]
+        budget = max(max_length - len(prompt), 1)
+        rows['index'].append(index)
+        rows['prompt_length'].append(len(prompt))
+        rows['chosen_input_ids'].append(prompt + (good + eos)[:budget])
+        rows['rejected_input_ids'].append(prompt + (bad + eos)[:budget])
+    return Dataset.from_dict(rows)
+
+
+def sequence_log_probs(logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
+    """Summed log-probability of the labelled (response) tokens of each row."""
+    labels = labels[:, 1:]
+    logits = logits[:, :-1]
+    mask = labels != -100
+    token_log_probs = torch.gather(
+        logits.float().log_softmax(-1), 2, labels.clamp(min=0).unsqueeze(2)
+    ).squeeze(2)
+    return (token_log_probs * mask).sum(-1)
+
+
+class DPODataCollator:
+    """Pad the chosen and rejected sequences of a batch into one ``2 * B`` row batch.
+
+    Rows ``0..B-1`` are the chosen and ``B..2B-1`` the rejected sequences; prompt and
+    padding tokens are masked out of the labels. With ``reference_log_probs`` (an
+    ``(N, 2)`` array indexed by ``index``) the cached reference values are added.
+    """
+
+    def __init__(self, pad_token_id: int, reference_log_probs: Optional[np.ndarray] = None):
+        self.pad_token_id = pad_token_id
+        self.reference_log_probs = reference_log_probs
+
+    def __call__(self, features: List[Dict]) -> Dict[str, torch.Tensor]:
+        sequences = [f['chosen_input_ids'] for f in features] + [f['rejected_input_ids'] for f in features]
+        prompt_lengths = [f['prompt_length'] for f in features] * 2
+        width = max(len(ids) for ids in sequences)
+
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        labels = torch.full((len(sequences), width), -100, dtype=torch.long)
+        for row, (ids, prompt_length) in enumerate(zip(sequences, prompt_lengths)):
+            ids = torch.tensor(ids, dtype=torch.long)
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+            labels[row, prompt_length:len(ids)] = ids[prompt_length:]
+
+        batch = {'input_ids': input_ids, 'attention_mask': attention_mask, 'labels': labels}
+        if self.reference_log_probs is not None:
+            reference = torch.from_numpy(np.asarray(self.reference_log_probs[[f['index'] for f in features]]))
+            batch['reference_chosen_logps'] = reference[:, 0]
+            batch['reference_rejected_logps'] = reference[:, 1]
+        return batch
+
+
+class ReferenceLogProbCache:
+    """Reference-model log-probs of preference pairs, one ``.npy`` file per key.
+
+    The key covers the dataset hash, the reference model or checkpoint and the
+    tokenization settings. Arrays are written once in a batched pass and then
+    memory-mapped read-only, so training never needs the reference model.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: Dict) -> str:
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.npy')
+
+    def get(self, key: Dict) -> Optional[np.ndarray]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def compute(
+        self,
+        key: Dict,
+        model,
+        dataset: Dataset,
+        pad_token_id: int,
+        token_budget: int = 16384,
+        max_batch_size: int = 32
+    ) -> np.ndarray:
+        """Score every pair with ``model`` and store the ``(N, 2)`` chosen/rejected array."""
+        path = self._path(key)
+        tmp_path = f'{path[:-len(".npy")]}.{os.getpid()}.tmp.npy'
+        values = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(dataset), 2))
+
+        collator = DPODataCollator(pad_token_id)
+        # A pair is padded to its longer sequence, and each batch holds both sequences
+        lengths = [2 * max(len(good), len(bad)) for good, bad in
+                   zip(dataset['chosen_input_ids'], dataset['rejected_input_ids'])]
+
+        was_training = model.training
+        model.eval()
+        try:
+            with torch.inference_mode():
+                for batch in token_budget_batches(lengths, token_budget, max_batch_size):
+                    features = dataset.select(batch)
+                    inputs = collator(list(features))
+                    logits = model(
+                        input_ids=inputs['input_ids'].to(model.device),
+                        attention_mask=inputs['attention_mask'].to(model.device)
+                    ).logits
+                    log_probs = sequence_log_probs(logits, inputs['labels'].to(model.device)).cpu().numpy()
+                    indices = features['index']
+                    values[indices, 0] = log_probs[:len(batch)]
+                    values[indices, 1] = log_probs[len(batch):]
+        finally:
+            model.train(was_training)
+
+        values.flush()
+        del values
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+
+class DPOTrainer(Trainer):
+    """Trainer for Direct Preference Optimization against cached reference log-probs.
+
+    The policy scores chosen and rejected sequences in one forward pass; the
+    reference terms come from the batch (see ``DPODataCollator``), so no
+    reference model is kept in memory. ``args.remove_unused_columns`` must be off.
+    """
+
+    def __init__(self, *args, beta: float = 0.1, label_smoothing: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.beta = beta
+        self.label_smoothing = label_smoothing
+        self._dpo_metrics = defaultdict(list)
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        reference_chosen = inputs.pop('reference_chosen_logps')
+        reference_rejected = inputs.pop('reference_rejected_logps')
+        labels = inputs.pop('labels')
+
+        outputs = model(**inputs)
+        log_probs = sequence_log_probs(outputs.logits, labels)
+        policy_chosen, policy_rejected = log_probs.chunk(2)
+
+        chosen_rewards = self.beta * (policy_chosen - reference_chosen)
+        rejected_rewards = self.beta * (policy_rejected - reference_rejected)
+        margin = chosen_rewards - rejected_rewards
+        # Conservative DPO when label_smoothing > 0 (preference labels may be noisy)
+        loss = (
+            -F.logsigmoid(margin) * (1 - self.label_smoothing)
+            - F.logsigmoid(-margin) * self.label_smoothing
+        ).mean()
+
+        if model.training:
+            self._dpo_metrics['rewards/chosen'].append(chosen_rewards.mean().item())
+            self._dpo_metrics['rewards/rejected'].append(rejected_rewards.mean().item())
+            self._dpo_metrics['rewards/margin'].append(margin.mean().item())
+            self._dpo_metrics['rewards/accuracy'].append((margin > 0).float().mean().item())
+
+        return (loss, outputs) if return_outputs else loss
+
+    def prediction_step(self, model, inputs, prediction_loss_only, ignore_keys=None):
+        inputs = self._prepare_inputs(inputs)
+        with torch.no_grad():
+            loss = self.compute_loss(model, inputs)
+        return loss.detach(), None, None
+
+    def log(self, logs, *args, **kwargs):
+        # Reward statistics are averaged over the steps since the last log
+        for name, values in self._dpo_metrics.items():
+            logs[name] = sum(values) / len(values)
+        self._dpo_metrics.clear()
+        super().log(logs, *args, **kwargs)
@@ -0,0 +1,299 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from utils.batch_planner import PeakMemorySampler, _is_out_of_memory, default_memory_limit
+
+# Optimizer state bytes per trainable parameter; adafactor is sized from shapes
+OPTIMIZER_STATE_BYTES = {
+    'adamw_torch': 8,
+    'adamw_torch_fused': 8,
+    'adamw_hf': 8,
+    'adamw_bnb_8bit': 2,
+    'adamw_8bit': 2,
+    'paged_adamw_8bit': 2,
+    'sgd': 0
+}
+
+# Headroom for allocator fragmentation and framework buffers
+MEMORY_OVERHEAD = 1.1
+
+
+def _config_value(config, *names, default=None):
+    for name in names:
+        value = getattr(config, name, None)
+        if value is not None:
+            return value
+    return default
+
+
+def model_dimensions(model) -> Dict:
+    """Hidden size, layer count, head count and vocabulary size from the model config."""
+    config = model.config
+    return {
+        'hidden_size': _config_value(config, 'hidden_size', 'n_embd', 'd_model'),
+        'num_layers': _config_value(config, 'num_hidden_layers', 'n_layer', 'num_layers'),
+        'num_heads': _config_value(config, 'num_attention_heads', 'n_head'),
+        'vocab_size': _config_value(config, 'vocab_size')
+    }
+
+
+def _linear_shapes(model) -> List[Tuple[str, int, int]]:
+    """(name, in_features, out_features) of every linear-like layer."""
+    shapes = []
+    for name, module in model.named_modules():
+        if hasattr(module, 'in_features') and hasattr(module, 'out_features'):
+            shapes.append((name, module.in_features, module.out_features))
+        elif type(module).__name__ == 'Conv1D':
+            # GPT-2 style Conv1D stores its weight as (in, out)
+            shapes.append((name, module.weight.shape[0], module.weight.shape[1]))
+    return shapes
+
+
+def _matches_target(name: str, target_modules: List[str]) -> bool:
+    # Same suffix rule peft uses to pick LoRA target modules
+    return any(name == target or name.endswith(f'.{target}') for target in target_modules)
+
+
+def count_parameters(model, config: Dict) -> Dict:
+    """Total and trainable parameter counts for the configured fine-tuning type."""
+    total = sum(p.numel() for p in model.parameters())
+    finetune_type = config.get('finetune_type', 'full')
+    if finetune_type not in ('lora', 'qlora'):
+        return {'total': total, 'trainable': total, 'lora_layers': 0}
+
+    target_modules = config.get('target_modules', ['q_proj', 'v_proj'])
+    r = config.get('lora_r', 16)
+    targets = [(name, fan_in, fan_out) for name, fan_in, fan_out in _linear_shapes(model)
+               if _matches_target(name, target_modules)]
+    if not targets:
+        raise ValueError(f"target_modules {target_modules} match no layers of the model")
+
+    # Each adapted layer adds A (r x in) and B (out x r)
+    trainable = sum(r * (fan_in + fan_out) for _, fan_in, fan_out in targets)
+    return {'total': total + trainable, 'trainable': trainable, 'lora_layers': len(targets)}
+
+
+def optimizer_state_bytes(model, config: Dict, trainable: int) -> int:
+    optim = config.get('optim', 'adamw_torch')
+    if optim != 'adafactor':
+        return trainable * OPTIMIZER_STATE_BYTES.get(optim, 8)
+
+    if config.get('finetune_type', 'full') in ('lora', 'qlora'):
+        # LoRA factors are thin matrices, so factoring saves little
+        return trainable * 4
+    # Factored second moments: one fp32 row and column vector per matrix
+    return sum(4 * (sum(p.shape) if p.dim() == 2 else p.numel()) for p in model.parameters())
+
+
+def activation_bytes(dimensions: Dict, batch_size: int, seq_length: int, element_size: int,
+                     gradient_checkpointing: bool = False) -> int:
+    """Activation memory of a transformer decoder step.
+
+    Per layer ``s*b*h*(34 + 5*a*s/h)`` bytes at 16-bit precision (Korthikanti et
+    al., 2022), scaled to ``element_size``. With gradient checkpointing only each
+    layer's input is kept plus one layer being recomputed. fp32 logits and their
+    gradient are added on top.
+    """
+    h = dimensions['hidden_size']
+    a = dimensions['num_heads']
+    layers = dimensions['num_layers']
+    s, b = seq_length, batch_size
+
+    per_layer = s * b * h * (34 + 5 * a * s / h) * element_size / 2
+    if gradient_checkpointing:
+        layer_total = layers * s * b * h * element_size + per_layer
+    else:
+        layer_total = layers * per_layer
+    logits = 2 * b * s * dimensions['vocab_size'] * 4
+    return int(layer_total + logits)
+
+
+def step_flops(parameters: Dict, tokens: int, gradient_checkpointing: bool) -> float:
+    """FLOPs of one forward/backward pass over ``tokens`` tokens."""
+    # Forward 2N, input gradients 2N, weight gradients 2 per trainable parameter
+    per_token = 4 * parameters['total'] + 2 * parameters['trainable']
+    if gradient_checkpointing:
+        # Activations are recomputed with a second forward pass
+        per_token += 2 * parameters['total']
+    return float(per_token * tokens)
+
+
+def calibrate(model, tokenizer, seq_length: int, batch_size: int = 1, steps: int = 2) -> Optional[Dict]:
+    """Measure activation memory and compute throughput with a short probe.
+
+    All weights are frozen and the gradient flows from the loss back to the input
+    embeddings. This stores the same activations as training but never allocates
+    weight gradients, so the probe itself cannot run out of memory on them. If the
+    activations alone do not fit, None is returned and callers fall back to the
+    uncalibrated estimate.
+    """
+    device = next(model.parameters()).device
+    dimensions = model_dimensions(model)
+    vocab_size = min(dimensions['vocab_size'], len(tokenizer))
+    input_ids = torch.randint(0, vocab_size, (batch_size, seq_length), device=device)
+
+    requires_grad = [p.requires_grad for p in model.parameters()]
+    was_training = model.training
+    for p in model.parameters():
+        p.requires_grad_(False)
+    model.train()
+
+    def run_step():
+        embeds = model.get_input_embeddings()(input_ids).detach().requires_grad_(True)
+        model(inputs_embeds=embeds, labels=input_ids).loss.backward()
+
+    try:
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+            baseline = torch.cuda.memory_allocated(device)
+        else:
+            import psutil
+            baseline = psutil.Process().memory_info().rss
+
+        # The warm-up step is inside the sampler: on CPU freed activations stay in
+        # the process, so later steps would not raise RSS above it
+        with PeakMemorySampler(device) as sampler:
+            run_step()
+            start = time.perf_counter()
+            for _ in range(steps):
+                run_step()
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            step_time = (time.perf_counter() - start) / steps
+    except (RuntimeError, MemoryError) as e:
+        if not _is_out_of_memory(e):
+            raise
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+        return None
+    finally:
+        for p, flag in zip(model.parameters(), requires_grad):
+            p.requires_grad_(flag)
+        model.train(was_training)
+
+    element_size = next(model.parameters()).element_size()
+    predicted = activation_bytes(dimensions, batch_size, seq_length, element_size)
+    measured = max(sampler.peak - baseline, 0)
+    total = sum(p.numel() for p in model.parameters())
+    # Frozen-weight probe does forward 2N plus backward 2N per token
+    flops = 4 * total * batch_size * seq_length
+
+    return {
+        'batch_size': batch_size,
+        'seq_length': seq_length,
+        'step_time': step_time,
+        'measured_activation_bytes': measured,
+        'predicted_activation_bytes': predicted,
+        # Clamped so a noisy RSS reading cannot make the estimate absurd
+        'activation_scale': min(max(measured / predicted, 0.25), 4.0) if measured and predicted else 1.0,
+        'flops_per_second': flops / step_time
+    }
+
+
+def estimate_training(
+    model,
+    config: Dict,
+    calibration: Optional[Dict] = None,
+    memory_limit: Optional[int] = None,
+    num_samples: Optional[int] = None
+) -> Dict:
+    """Predict peak memory and step time of a training config on the loaded model."""
+    finetune_type = config.get('finetune_type', 'full')
+    batch_size = config.get('batch_size', 4)
+    # DPO runs the chosen and rejected sequence of every pair in the same batch
+    rows = batch_size * 2 if finetune_type == 'dpo' else batch_size
+    seq_length = config.get('max_length', 512)
+    accumulation = config.get('gradient_accumulation_steps', 1)
+    checkpointing = bool(config.get('gradient_checkpointing', False))
+
+    dimensions = model_dimensions(model)
+    parameters = count_parameters(model, config)
+    element_size = next(model.parameters()).element_size()
+
+    weights = sum(p.numel() * p.element_size() for p in model.parameters())
+    lora_weights = 0
+    if finetune_type in ('lora', 'qlora'):
+        lora_weights = parameters['trainable'] * element_size
+    gradients = parameters['trainable'] * element_size
+    optimizer = optimizer_state_bytes(model, config, parameters['trainable'])
+
+    # Autocast keeps fp32 weights but saves 16-bit activations for the backward pass
+    activation_element_size = 2 if config.get('bf16') or config.get('fp16') else element_size
+    activation_scale = calibration['activation_scale'] if calibration else 1.0
+    activations = int(activation_bytes(dimensions, rows, seq_length, activation_element_size, checkpointing)
+                      * activation_scale)
+
+    total = int((weights + lora_weights + gradients + optimizer + activations) * MEMORY_OVERHEAD)
+    if memory_limit is None:
+        memory_limit = default_memory_limit(next(model.parameters()).device)
+
+    estimate = {
+        'finetune_type': finetune_type,
+        'parameters': parameters,
+        'memory': {
+            'weights': weights + lora_weights,
+            'gradients': gradients,
+            'optimizer': optimizer,
+            'activations': activations,
+            'total': total
+        },
+        'memory_limit': memory_limit,
+        'fits': total <= memory_limit,
+        'calibrated': calibration is not None
+    }
+
+    if calibration:
+        flops = step_flops(parameters, rows * seq_length, checkpointing)
+        step_time = flops / calibration['flops_per_second'] * accumulation
+        estimate['step_time_seconds'] = step_time
+        estimate['tokens_per_second'] = rows * accumulation * seq_length / step_time
+
+        if config.get('max_steps', -1) > 0:
+            total_steps = config['max_steps']
+        elif num_samples:
+            train_samples = num_samples * (1 - config.get('validation_split', 0))
+            total_steps = math.ceil(train_samples / (batch_size * accumulation)) * config.get('epochs', 3)
+        else:
+            total_steps = None
+        if total_steps:
+            estimate['total_steps'] = total_steps
+            estimate['estimated_training_seconds'] = total_steps * step_time
+
+    return estimate
+
+
+def adjust_config(model, config: Dict, calibration: Optional[Dict] = None,
+                  memory_limit: Optional[int] = None, num_samples: Optional[int] = None) -> Tuple[Dict, Dict, List[str]]:
+    """Change a config that would not fit until it does, if possible.
+
+    Gradient checkpointing is enabled first, then the micro batch size is halved
+    (rounded down to a divisor of the effective batch size) while gradient
+    accumulation keeps the effective batch size. The fine-tuning
+    type is never switched. Returns the new config, its estimate and the changes.
+    """
+    config = dict(config)
+    adjustments = []
+    estimate = estimate_training(model, config, calibration, memory_limit, num_samples)
+
+    if not estimate['fits'] and not config.get('gradient_checkpointing'):
+        config['gradient_checkpointing'] = True
+        adjustments.append('enabled gradient_checkpointing')
+        estimate = estimate_training(model, config, calibration, memory_limit, num_samples)
+
+    while not estimate['fits'] and config.get('batch_size', 4) > 1:
+        batch_size = config.get('batch_size', 4)
+        effective = batch_size * config.get('gradient_accumulation_steps', 1)
+        # Largest divisor of the effective batch at most half the current size,
+        # so batch_size * gradient_accumulation_steps stays exactly the same
+        config['batch_size'] = max(size for size in range(1, batch_size // 2 + 1) if effective % size == 0)
+        config['gradient_accumulation_steps'] = effective // config['batch_size']
+        adjustments.append(
+            f"batch_size {batch_size} -> {config['batch_size']}, "
+            f"gradient_accumulation_steps -> {config['gradient_accumulation_steps']}"
+        )
+        estimate = estimate_training(model, config, calibration, memory_limit, num_samples)
+
+    return config, estimate, adjustments
@@ -0,0 +1,211 @@
+import contextlib
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from utils.columnar import open_columnar
+from utils.splits import SPLIT_NAMES, hash_split_indices, split_settings
+
+_fingerprints = {}
+
+
+def dataset_fingerprint(file_path: str) -> str:
+    """SHA-256 of the dataset file, memoized per size and modification time."""
+    stat = os.stat(file_path)
+    marker = (file_path, stat.st_size, stat.st_mtime_ns)
+    if marker not in _fingerprints:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _fingerprints[marker] = digest.hexdigest()
+    return _fingerprints[marker]
+
+
+def load_evaluation_texts(file_path: str, config: Dict) -> List[str]:
+    """Read the texts to score, optionally restricted to one hash split."""
+    text_column = config.get('text_column', 'text')
+    split = config.get('split')
+    if split is not None and split not in SPLIT_NAMES:
+        raise ValueError(f"Invalid split: {split}")
+
+    settings = split_settings(config)
+    split_key = settings['key']
+    columns = [text_column] if split is None or split_key == text_column else [text_column, split_key]
+    df = open_columnar(file_path, columns).to_pandas()
+
+    if split is not None:
+        indices = hash_split_indices(
+            df[split_key],
+            settings['validation_split'],
+            settings['test_split'],
+            settings['seed']
+        )[split]
+        df = df.iloc[indices]
+
+    texts = df[text_column].dropna().astype(str).tolist()
+    max_samples = config.get('max_samples')
+    return texts[:max_samples] if max_samples else texts
+
+
+def token_budget_batches(lengths: List[int], token_budget: int, max_batch_size: int) -> Iterator[List[int]]:
+    """Group indices, longest first, into batches of at most ``token_budget`` padded tokens."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batch = []
+    for index in order:
+        # The first (longest) item of a sorted batch sets its padded width
+        width = lengths[batch[0]] if batch else lengths[index]
+        if batch and ((len(batch) + 1) * width > token_budget or len(batch) >= max_batch_size):
+            yield batch
+            batch = []
+        batch.append(index)
+    if batch:
+        yield batch
+
+
+def evaluate_texts(
+    model,
+    tokenizer,
+    texts: List[str],
+    max_length: int = 512,
+    token_budget: int = 16384,
+    max_batch_size: int = 64
+) -> Dict:
+    """Token-weighted causal LM loss and perplexity of ``model`` over ``texts``.
+
+    Texts are tokenized once, sorted by length and packed into dynamic batches of
+    at most ``token_budget`` padded tokens, so little compute goes to padding.
+    """
+    if not texts:
+        raise ValueError("No texts to evaluate")
+
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)['input_ids']
+    lengths = [len(ids) for ids in encodings]
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    was_training = model.training
+    model.eval()
+    total_loss = 0.0
+    total_tokens = 0
+    num_batches = 0
+    start = time.perf_counter()
+
+    try:
+        with torch.inference_mode():
+            for batch in token_budget_batches(lengths, token_budget, max_batch_size):
+                width = max(lengths[i] for i in batch)
+                input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+                attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+                for row, index in enumerate(batch):
+                    input_ids[row, :lengths[index]] = torch.tensor(encodings[index])
+                    attention_mask[row, :lengths[index]] = 1
+
+                input_ids = input_ids.to(model.device)
+                attention_mask = attention_mask.to(model.device)
+                logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+                labels = input_ids[:, 1:].masked_fill(attention_mask[:, 1:] == 0, -100)
+                total_loss += F.cross_entropy(
+                    logits[:, :-1].reshape(-1, logits.size(-1)).float(),
+                    labels.reshape(-1),
+                    ignore_index=-100,
+                    reduction='sum'
+                ).item()
+                total_tokens += int((labels != -100).sum())
+                num_batches += 1
+    finally:
+        model.train(was_training)
+
+    elapsed = time.perf_counter() - start
+    loss = total_loss / max(total_tokens, 1)
+    return {
+        'loss': loss,
+        'perplexity': math.exp(min(loss, 700)),
+        'num_examples': len(texts),
+        'num_tokens': total_tokens,
+        'num_batches': num_batches,
+        'elapsed_seconds': elapsed,
+        'tokens_per_second': total_tokens / elapsed if elapsed > 0 else None
+    }
+
+
+@contextlib.contextmanager
+def checkpoint_model(base_model, checkpoint_path: Optional[str]):
+    """Yield the model to score for a checkpoint directory.
+
+    LoRA checkpoints are attached to ``base_model`` as the only active adapter and
+    removed again afterwards. Adapters the model already carries (e.g. from an
+    in-process LoRA fine-tune) are kept and reactivated. Full checkpoints are
+    loaded as a separate model. ``None`` yields the base model.
+    """
+    if checkpoint_path is None:
+        yield base_model
+        return
+
+    if os.path.isfile(os.path.join(checkpoint_path, 'adapter_config.json')):
+        from peft import PeftModel
+        from peft.tuners.lora import LoraLayer
+
+        lora_layers = [module for module in base_model.modules() if isinstance(module, LoraLayer)]
+        previous_adapters = list(lora_layers[0].active_adapters) if lora_layers else None
+        previous_config = getattr(base_model, 'peft_config', None)
+
+        model = PeftModel.from_pretrained(base_model, checkpoint_path, adapter_name='evaluation')
+        model.set_adapter('evaluation')
+        try:
+            yield model
+        finally:
+            if previous_adapters is None:
+                # The checkpoint was the only adapter, so the original modules are restored
+                model.unload()
+            else:
+                model.delete_adapter('evaluation')
+                for layer in lora_layers:
+                    layer.set_adapter(previous_adapters)
+                if previous_config is not None:
+                    base_model.peft_config = previous_config
+        return
+
+    from transformers import AutoModelForCausalLM
+
+    model = AutoModelForCausalLM.from_pretrained(
+        checkpoint_path,
+        torch_dtype=base_model.dtype,
+        low_cpu_mem_usage=True
+    ).to(base_model.device)
+    try:
+        yield model
+    finally:
+        del model
+
+
+class ScoreCache:
+    """JSON files of evaluation results keyed by model, dataset hash and settings."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: Dict) -> str:
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.json')
+
+    def get(self, key: Dict) -> Optional[Dict]:
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)['result']
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def put(self, key: Dict, result: Dict):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'result': result}, f)
+        os.replace(tmp_path, path)
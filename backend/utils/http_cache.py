@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from flask import Response, current_app, request
+from werkzeug.http import quote_etag
+
+from utils.state_store import get_state_store
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+_body_cache = OrderedDict()
+_body_cache_lock = threading.Lock()
+_BODY_CACHE_SIZE = 64
+
+# Identifies the current server run; state versions restart when the store is cleared
+BOOT_NAMESPACE = 'boot'
+_boot_id = None
+
+
+def file_version(path: str):
+    """Cheap change marker for a file: size and modification time."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def directory_version(path: str):
+    """Change marker for a directory tree: number of directories and their latest mtime.
+
+    Adding or removing an entry bumps its parent directory's mtime, so changes at
+    any depth (e.g. a new ``run-*/checkpoint-N``) are seen.
+    """
+    if not os.path.isdir(path):
+        return None
+    count, latest = 0, 0
+    for root, _, _ in os.walk(path):
+        try:
+            latest = max(latest, os.stat(root).st_mtime_ns)
+        except FileNotFoundError:
+            continue
+        count += 1
+    return count, latest
+
+
+def boot_id() -> str:
+    """Random id of the current server run, shared by all worker processes.
+
+    The first process to ask after the state store was cleared creates it, so an
+    ETag from a previous run never matches a restarted version counter.
+    """
+    global _boot_id
+    if _boot_id is None:
+        store = get_state_store()
+        stored = store.get(BOOT_NAMESPACE)
+        if stored is None:
+            # Defaults only apply when the namespace is still empty, so racing workers agree
+            store.update(BOOT_NAMESPACE, {}, {'id': uuid.uuid4().hex})
+            stored = store.get(BOOT_NAMESPACE)
+        _boot_id = stored['id']
+    return _boot_id
+
+
+def make_etag(version) -> str:
+    """Unquoted ETag value for the current URL at ``version`` in this server run."""
+    key = f'{boot_id()}|{request.path}?{request.query_string.decode()}|{version!r}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _cache_get(key):
+    with _body_cache_lock:
+        value = _body_cache.get(key)
+        if value is not None:
+            _body_cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key, value):
+    with _body_cache_lock:
+        _body_cache[key] = value
+        if len(_body_cache) > _BODY_CACHE_SIZE:
+            _body_cache.popitem(last=False)
+
+
+def _negotiate_encoding(size: int) -> Optional[str]:
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _encode(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def cached_json_response(version, build_payload: Callable[[], Dict]) -> Response:
+    """JSON response with ETag/If-None-Match handling and gzip/brotli negotiation.
+
+    ``version`` must change whenever the payload would. When the client already
+    holds the matching ETag the payload is never built and a 304 is returned;
+    serialized and encoded bodies are memoized per ETag for repeated polls.
+    """
+    etag = make_etag(version)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body = _cache_get(etag)
+        if body is None:
+            body = current_app.json.response(build_payload()).get_data()
+            _cache_put(etag, body)
+
+        encoding = _negotiate_encoding(len(body))
+        encoded = _cache_get((etag, encoding)) if encoding else body
+        if encoded is None:
+            encoded = _encode(body, encoding)
+            _cache_put((etag, encoding), encoded)
+
+        response = current_app.response_class(encoded, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.headers['ETag'] = quote_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,222 @@
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+from utils.columnar import DATASET_SUFFIX, METADATA_KEY, ROW_GROUP_SIZE, ensure_columnar, write_columnar
+
+INGEST_EXTENSIONS = ('.csv', '.jsonl', '.xlsx', '.txt', '.md')
+
+
+def resolve_patterns(root: str, patterns: List[str]) -> List[str]:
+    """Expand file names and glob patterns (``**`` allowed) relative to ``root``.
+
+    Only raw dataset files inside ``root`` are returned, sorted and de-duplicated.
+    """
+    root = os.path.realpath(root)
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(root, pattern), recursive=True):
+            path = os.path.realpath(path)
+            if os.path.commonpath([root, path]) != root:
+                raise ValueError(f"Pattern {pattern} points outside the upload folder")
+            if os.path.isfile(path) and path.endswith(INGEST_EXTENSIONS):
+                files.add(path)
+    return sorted(files)
+
+
+def _convert_file(file_path: str) -> Tuple[str, str, pa.Schema]:
+    """Process pool task: parse one shard into its Arrow copy and return the schema."""
+    arrow_path = ensure_columnar(file_path)
+    with pa.memory_map(arrow_path, 'r') as source:
+        schema = pa.ipc.open_stream(source).schema
+    return file_path, arrow_path, schema.remove_metadata()
+
+
+def convert_files(file_paths: List[str], max_workers: Optional[int] = None) -> List[str]:
+    """Convert uploads to their Arrow copies in parallel; returns the Arrow paths."""
+    if len(file_paths) == 1:
+        return [ensure_columnar(file_paths[0])]
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return [arrow_path for _, arrow_path, _ in executor.map(_convert_file, file_paths)]
+
+
+def reconcile_schemas(schemas: List[pa.Schema]) -> Tuple[pa.Schema, List[str]]:
+    """Unify shard schemas column by column.
+
+    Columns keep their first-seen order. Compatible types are promoted (e.g. int64
+    and double to double, null to anything). Columns whose types cannot be unified
+    fall back to string; their names are returned alongside the schema.
+    """
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, []).append(field.type)
+
+    fields, fallbacks = [], []
+    for name, column_types in types.items():
+        try:
+            unified = pa.unify_schemas(
+                [pa.schema([pa.field(name, column_type)]) for column_type in column_types],
+                promote_options='permissive'
+            ).field(name).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            unified = pa.string()
+            fallbacks.append(name)
+        fields.append(pa.field(name, unified))
+    return pa.schema(fields), fallbacks
+
+
+def _align_shard(task: Tuple[str, str, str, pa.Schema]) -> Tuple[str, str]:
+    """Process pool task: rewrite one shard's Arrow copy with the unified schema."""
+    file_path, arrow_path, output_path, schema = task
+    table = pa.ipc.open_stream(pa.memory_map(arrow_path, 'r')).read_all()
+
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                column = column.cast(field.type)
+            columns.append(column)
+        else:
+            columns.append(pa.nulls(table.num_rows, field.type))
+    aligned = pa.Table.from_arrays(columns, schema=schema)
+
+    write_columnar(aligned, output_path, os.path.basename(file_path), os.path.getmtime(file_path), ROW_GROUP_SIZE)
+    return file_path, output_path
+
+
+def _merge_statistics(shard_statistics: List[Dict], schema: pa.Schema) -> Dict:
+    """Combine per-shard statistics into dataset-wide ones; row groups keep global offsets."""
+    num_rows = 0
+    columns = {field.name: {'null_count': 0} for field in schema}
+    row_groups = []
+    for statistics in shard_statistics:
+        for group in statistics['row_groups']:
+            row_groups.append({**group, 'offset': group['offset'] + num_rows})
+        for name, merged in columns.items():
+            column = statistics['columns'].get(name)
+            if column is None:
+                merged['null_count'] += statistics['num_rows']
+                continue
+            merged['null_count'] += column['null_count']
+            for key, combine in (('min', min), ('max', max)):
+                if column.get(key) is not None:
+                    merged[key] = column[key] if merged.get(key) is None else combine(merged[key], column[key])
+            if column.get('length'):
+                merged['length'] = True
+        num_rows += statistics['num_rows']
+    return {'num_rows': num_rows, 'columns': columns, 'row_groups': row_groups}
+
+
+def ingest_dataset(root: str, name: str, patterns: List[str], max_workers: Optional[int] = None) -> str:
+    """Build the dataset definition ``<root>/<name>.dataset.json`` from files and globs.
+
+    Every matched file is parsed into its Arrow copy in a process pool, one file
+    per task, so ingest time scales with the number of cores. Up-to-date copies
+    are reused. Shards whose schema differs from the reconciled one are rewritten
+    to ``<name>.dataset/`` in the same pool. The shards are never concatenated:
+    readers memory-map them as chunks of one logical table.
+    """
+    start = time.perf_counter()
+    root = os.path.realpath(root)
+    files = resolve_patterns(root, patterns)
+    if not files:
+        raise ValueError(f"No dataset files match {', '.join(patterns)}")
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(files))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        converted = list(executor.map(_convert_file, files))
+
+        schema, fallbacks = reconcile_schemas([shard_schema for _, _, shard_schema in converted])
+
+        shard_dir = os.path.join(root, f'{name}.dataset')
+        tasks, arrow_paths = [], {}
+        for index, (file_path, arrow_path, shard_schema) in enumerate(converted):
+            if shard_schema.equals(schema):
+                arrow_paths[file_path] = arrow_path
+            else:
+                os.makedirs(shard_dir, exist_ok=True)
+                tasks.append((file_path, arrow_path, os.path.join(shard_dir, f'shard-{index:05d}.arrow'), schema))
+        reconciled = dict(executor.map(_align_shard, tasks))
+        arrow_paths.update(reconciled)
+
+    shards, shard_statistics = [], []
+    for file_path in files:
+        arrow_path = arrow_paths[file_path]
+        with pa.memory_map(arrow_path, 'r') as source:
+            metadata = json.loads(pa.ipc.open_stream(source).schema.metadata[METADATA_KEY])
+        shard_statistics.append(metadata['statistics'])
+        stat = os.stat(file_path)
+        shards.append({
+            'source': os.path.relpath(file_path, root),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'arrow': os.path.relpath(arrow_path, root),
+            'num_rows': metadata['statistics']['num_rows'],
+            'reconciled': file_path in reconciled
+        })
+
+    definition = {
+        'name': name,
+        'patterns': patterns,
+        'created_at': datetime.now().isoformat(),
+        'files': shards,
+        'schema': {field.name: str(field.type) for field in schema},
+        'string_fallback_columns': fallbacks,
+        'statistics': _merge_statistics(shard_statistics, schema),
+        'ingest_seconds': time.perf_counter() - start,
+        'workers': max_workers
+    }
+
+    definition_path = os.path.join(root, f'{name}{DATASET_SUFFIX}')
+    tmp_path = definition_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(definition, f, indent=2)
+    os.replace(tmp_path, definition_path)
+    return definition_path
+
+
+def define_dataset(root: str, name: str, patterns: List[str]) -> str:
+    """Definition path for ``patterns``, ingesting only if it is missing or defined differently."""
+    definition_path = os.path.join(root, f'{name}{DATASET_SUFFIX}')
+    if os.path.exists(definition_path) and read_dataset_definition(definition_path)['patterns'] == patterns:
+        # Changed or added source files are picked up by ensure_dataset when it is read
+        return definition_path
+    return ingest_dataset(root, name, patterns)
+
+
+def read_dataset_definition(definition_path: str) -> Dict:
+    with open(definition_path, 'r') as f:
+        return json.load(f)
+
+
+def ensure_dataset(definition_path: str) -> List[str]:
+    """Arrow shard paths of a definition, re-ingesting it if any source file changed."""
+    root = os.path.dirname(os.path.realpath(definition_path))
+    definition = read_dataset_definition(definition_path)
+
+    def is_current(shard):
+        source = os.path.join(root, shard['source'])
+        if not os.path.exists(source) or not os.path.exists(os.path.join(root, shard['arrow'])):
+            return False
+        stat = os.stat(source)
+        return stat.st_size == shard['size'] and stat.st_mtime == shard['mtime']
+
+    current_files = [os.path.relpath(path, root) for path in resolve_patterns(root, definition['patterns'])]
+    if current_files != [shard['source'] for shard in definition['files']] or \
+            not all(is_current(shard) for shard in definition['files']):
+        ingest_dataset(root, definition['name'], definition['patterns'])
+        definition = read_dataset_definition(definition_path)
+
+    return [os.path.join(root, shard['arrow']) for shard in definition['files']]
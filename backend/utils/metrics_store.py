@@ -0,0 +1,240 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from transformers import TrainerCallback
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb(steps: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``max_points`` visually representative points."""
+    n = len(steps)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    selected = [0]
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = steps[end:next_end].mean() if next_end > end else steps[-1]
+        next_y = values[end:next_end].mean() if next_end > end else values[-1]
+
+        prev = selected[-1]
+        x, y = steps[start:end], values[start:end]
+        areas = np.abs((steps[prev] - next_x) * (y - values[prev]) - (steps[prev] - x) * (next_y - values[prev]))
+        selected.append(start + int(np.argmax(areas)))
+    selected.append(n - 1)
+    return np.asarray(selected)
+
+
+class MetricsStore:
+    """Training metrics of all runs in one SQLite file.
+
+    Points live in a ``WITHOUT ROWID`` table clustered on ``(run_id, name, step)``,
+    so a step range of one series is a contiguous index scan. Min-max bucketing
+    runs inside SQLite; LTTB runs on the fetched range with numpy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs ('
+            'run_id TEXT PRIMARY KEY, config TEXT, output_dir TEXT, status TEXT NOT NULL, '
+            'started_at TEXT, ended_at TEXT)'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS metrics ('
+            'run_id TEXT NOT NULL, name TEXT NOT NULL, step INTEGER NOT NULL, value REAL NOT NULL, '
+            'wall_time REAL, PRIMARY KEY (run_id, name, step)) WITHOUT ROWID'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, re-opened after fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # Runs
+
+    def create_run(self, run_id: str, config: Dict, output_dir: str):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO runs (run_id, config, output_dir, status, started_at) VALUES (?, ?, ?, ?, ?)',
+            (run_id, json.dumps(config), output_dir, 'running', datetime.now().isoformat())
+        )
+
+    def finish_run(self, run_id: str, status: str = 'completed'):
+        self._connection().execute(
+            'UPDATE runs SET status = ?, ended_at = ? WHERE run_id = ?',
+            (status, datetime.now().isoformat(), run_id)
+        )
+
+    def list_runs(self) -> List[Dict]:
+        connection = self._connection()
+        rows = connection.execute(
+            'SELECT run_id, config, output_dir, status, started_at, ended_at FROM runs ORDER BY started_at'
+        ).fetchall()
+        runs = []
+        for run_id, config, output_dir, status, started_at, ended_at in rows:
+            names = connection.execute(
+                'SELECT name, COUNT(*), MAX(step) FROM metrics WHERE run_id = ? GROUP BY name', (run_id,)
+            ).fetchall()
+            runs.append({
+                'run_id': run_id,
+                'config': json.loads(config) if config else None,
+                'output_dir': output_dir,
+                'status': status,
+                'started_at': started_at,
+                'ended_at': ended_at,
+                'metrics': {name: {'points': count, 'last_step': last_step} for name, count, last_step in names}
+            })
+        return runs
+
+    def get_run(self, run_id: str) -> Optional[Dict]:
+        return next((run for run in self.list_runs() if run['run_id'] == run_id), None)
+
+    # Points
+
+    def log(self, run_id: str, step: int, values: Dict[str, float], wall_time: Optional[float] = None):
+        wall_time = wall_time if wall_time is not None else time.time()
+        rows = [
+            (run_id, name, int(step), float(value), wall_time)
+            for name, value in values.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+        ]
+        if rows:
+            self._connection().executemany(
+                'INSERT OR REPLACE INTO metrics (run_id, name, step, value, wall_time) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def _range_clause(self, start_step: Optional[int], end_step: Optional[int]):
+        clause, params = '', []
+        if start_step is not None:
+            clause += ' AND step >= ?'
+            params.append(int(start_step))
+        if end_step is not None:
+            clause += ' AND step <= ?'
+            params.append(int(end_step))
+        return clause, params
+
+    def query(self, run_id: str, name: str, start_step: Optional[int] = None,
+              end_step: Optional[int] = None):
+        """All points of one series in a step range as ``(steps, values)`` arrays."""
+        clause, params = self._range_clause(start_step, end_step)
+        rows = self._connection().execute(
+            f'SELECT step, value FROM metrics WHERE run_id = ? AND name = ?{clause} ORDER BY step',
+            [run_id, name, *params]
+        ).fetchall()
+        data = np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def _minmax(self, run_id, name, start_step, end_step, max_points) -> List[List[float]]:
+        clause, params = self._range_clause(start_step, end_step)
+        connection = self._connection()
+        first, last, count = connection.execute(
+            f'SELECT MIN(step), MAX(step), COUNT(*) FROM metrics WHERE run_id = ? AND name = ?{clause}',
+            [run_id, name, *params]
+        ).fetchone()
+        if not count:
+            return []
+
+        width = max(1, math.ceil((last - first + 1) / max(1, max_points // 2)))
+        points = []
+        # SQLite returns the row holding the MIN()/MAX() for the bare step column
+        for aggregate in ('MIN', 'MAX'):
+            points.extend(connection.execute(
+                f'SELECT step, {aggregate}(value) FROM metrics WHERE run_id = ? AND name = ?{clause} '
+                f'GROUP BY (step - ?) / ?',
+                [run_id, name, *params, first, width]
+            ).fetchall())
+        return [[step, value] for step, value in sorted(set(points))]
+
+    def series(self, run_id: str, name: str, start_step: Optional[int] = None,
+               end_step: Optional[int] = None, max_points: Optional[int] = None,
+               method: str = 'lttb') -> List[List[float]]:
+        """Points ``[step, value]`` of one series, downsampled to at most ``max_points``."""
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Invalid downsampling method: {method}")
+        if max_points and method == 'minmax':
+            return self._minmax(run_id, name, start_step, end_step, max_points)
+
+        steps, values = self.query(run_id, name, start_step, end_step)
+        if max_points:
+            indices = lttb(steps, values, max_points)
+            steps, values = steps[indices], values[indices]
+        return np.column_stack([steps, values]).tolist()
+
+    def version(self, run_id: str):
+        """Cheap change marker of a run's points: count and last write time."""
+        return tuple(self._connection().execute(
+            'SELECT COUNT(*), MAX(wall_time) FROM metrics WHERE run_id = ?', (run_id,)
+        ).fetchone())
+
+    def logs(self, run_id: str) -> List[Dict]:
+        """Log entries of a run, one ``{'step', <metric>: value, ...}`` dict per step."""
+        entries = {}
+        for step, name, value in self._connection().execute(
+            'SELECT step, name, value FROM metrics WHERE run_id = ? ORDER BY step', (run_id,)
+        ):
+            entries.setdefault(step, {'step': step})[name] = value
+        return list(entries.values())
+
+    def latest(self, run_id: str) -> Dict:
+        """Values logged at the last step of a run."""
+        rows = self._connection().execute(
+            'SELECT step, name, value FROM metrics WHERE run_id = ? AND '
+            'step = (SELECT MAX(step) FROM metrics WHERE run_id = ?)',
+            (run_id, run_id)
+        ).fetchall()
+        return {'step': rows[0][0], **{name: value for _, name, value in rows}} if rows else {}
+
+    def latest_run_id(self) -> Optional[str]:
+        row = self._connection().execute('SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def compare(self, run_ids: Iterable[str], name: str, **kwargs) -> Dict[str, List[List[float]]]:
+        """The same series for several runs, each downsampled independently."""
+        return {run_id: self.series(run_id, name, **kwargs) for run_id in run_ids}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metrics_store(path: str) -> MetricsStore:
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = MetricsStore(path)
+        return _stores[path]
+
+
+class MetricsStoreCallback(TrainerCallback):
+    """Write every Trainer log event of a run into the metrics store."""
+
+    def __init__(self, store: MetricsStore, run_id: str):
+        self.store = store
+        self.run_id = run_id
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if state.is_world_process_zero and logs:
+            values = dict(logs)
+            if state.epoch is not None:
+                values.setdefault('epoch', state.epoch)
+            self.store.log(self.run_id, state.global_step, values)
@@ -0,0 +1,157 @@
+import fcntl
+import functools
+import hmac
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from flask import Response, current_app, jsonify, request
+from werkzeug.serving import make_server
+
+from utils.state_store import SharedState
+
+# Header marking requests already forwarded to the owner, so they are never re-forwarded.
+# Its value is the owner's secret; it is only honored on the owner's loopback listener.
+FORWARDED_HEADER = 'X-Model-Owner-Forwarded'
+_FORWARDED_ENVIRON_KEY = 'HTTP_' + FORWARDED_HEADER.upper().replace('-', '_')
+_TRUSTED_ENVIRON_KEY = 'model_owner.forwarded'
+_LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+# Hop-by-hop headers that must not be copied between proxied requests/responses
+_SKIPPED_HEADERS = {'connection', 'content-length', 'date', 'host', 'keep-alive', 'server', 'transfer-encoding'}
+
+owner_state = SharedState('model_owner', {'pid': None, 'url': None, 'secret': None})
+
+
+class _LoopbackListener:
+    """WSGI wrapper of the owner's loopback server that verifies forwarded requests."""
+
+    def __init__(self, app, secret: str):
+        self.app = app
+        self.secret = secret
+
+    def __call__(self, environ, start_response):
+        value = environ.pop(_FORWARDED_ENVIRON_KEY, None)
+        environ[_TRUSTED_ENVIRON_KEY] = (
+            value is not None
+            and environ.get('REMOTE_ADDR') in _LOOPBACK_ADDRESSES
+            and hmac.compare_digest(value, self.secret)
+        )
+        return self.app(environ, start_response)
+
+
+class ModelOwner:
+    """Elects one worker process to hold the model and serves it to the others.
+
+    The first worker to take the lock file becomes the owner: it keeps the loaded
+    model, training and deployments, and exposes the app on a loopback port. Other
+    workers forward model-bound requests there. If the owner dies, its lock is
+    released and the next model-bound request elects a new owner.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._server = None
+
+    @property
+    def is_owner(self) -> bool:
+        return self._lock_file is not None
+
+    def try_acquire(self, app, lock_path: str) -> bool:
+        with self._lock:
+            if self.is_owner:
+                return True
+
+            lock_file = open(lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+
+            self._lock_file = lock_file
+            # Generated per election and shared only through the state store
+            secret = secrets.token_urlsafe(32)
+            self._server = make_server('127.0.0.1', 0, _LoopbackListener(app, secret), threaded=True)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            owner_state.update({
+                'pid': os.getpid(),
+                'url': f'http://127.0.0.1:{self._server.server_port}',
+                'secret': secret
+            })
+            return True
+
+    def owner_endpoint(self, timeout: float = 5.0):
+        """(URL, secret) of the current owner, waiting briefly while a new owner publishes them."""
+        deadline = time.monotonic() + timeout
+        while True:
+            state = owner_state.to_dict()
+            if state['url'] and state['secret'] and state['pid'] != os.getpid():
+                return state['url'], state['secret']
+            if time.monotonic() > deadline:
+                raise RuntimeError('No model owner process is available')
+            time.sleep(0.05)
+
+
+model_owner = ModelOwner()
+
+
+def _forward_to_owner(owner_url: str, secret: str) -> Response:
+    headers = {
+        name: value for name, value in request.headers.items()
+        if name.lower() not in _SKIPPED_HEADERS and name.lower() != FORWARDED_HEADER.lower()
+    }
+    headers[FORWARDED_HEADER] = secret
+    url = owner_url + request.full_path.rstrip('?')
+    forwarded = urllib.request.Request(
+        url,
+        data=request.get_data() or None,
+        headers=headers,
+        method=request.method
+    )
+
+    try:
+        with urllib.request.urlopen(forwarded, timeout=current_app.config.get('MODEL_OWNER_TIMEOUT')) as response:
+            status, body, response_headers = response.status, response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        status, body, response_headers = e.code, e.read(), e.headers
+
+    return Response(
+        body,
+        status=status,
+        headers=[(k, v) for k, v in response_headers.items() if k.lower() not in _SKIPPED_HEADERS]
+    )
+
+
+def owner_only(view):
+    """Run a model-bound view in the owner process, forwarding the request if needed."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Only the owner's loopback listener marks a request as forwarded; a client-sent
+        # header is dropped
+        request.environ.pop(_FORWARDED_ENVIRON_KEY, None)
+        if request.environ.get(_TRUSTED_ENVIRON_KEY) and model_owner.is_owner:
+            return view(*args, **kwargs)
+
+        lock_path = current_app.config['MODEL_OWNER_LOCK']
+        app = current_app._get_current_object()
+        error = None
+        for _ in range(2):
+            if model_owner.try_acquire(app, lock_path):
+                return view(*args, **kwargs)
+            try:
+                return _forward_to_owner(*model_owner.owner_endpoint())
+            except urllib.error.URLError as e:
+                # A dead owner releases its lock, so the retry can take over
+                error = e
+            except RuntimeError as e:
+                error = e
+                break
+
+        return jsonify({'error': f'Model owner unavailable: {error}'}), 503
+
+    return wrapper
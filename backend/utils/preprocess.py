@@ -1,10 +1,19 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Iterable, Iterator, Union, Optional
 import re
 import json
+import string
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 from sklearn.model_selection import train_test_split
 import os
+from utils.columnar import read_dataframe
+from utils.splits import SPLIT_NAMES, hash_split_assignments, hash_split_indices
+from utils.streaming import iter_file_chunks
 
 def clean_text(text: str) -> str:
     """Clean text by removing special characters and extra whitespace."""
@@ -14,10 +23,19 @@ def clean_text(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
+def clean_text_series(texts: pd.Series) -> pd.Series:
+    """Vectorized ``clean_text`` over a whole column."""
+    return (
+        texts.astype(str)
+        .str.replace(r'[^\w\s]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
 def validate_csv_structure(file_path: str) -> Dict:
     """Validate CSV file structure and content."""
     try:
-        df = pd.read_csv(file_path)
+        df = read_dataframe(file_path)
         
         # Basic validation
         if df.empty:
@@ -52,7 +70,7 @@ def validate_csv_structure(file_path: str) -> Dict:
 def validate_excel_structure(file_path: str) -> Dict:
     """Validate Excel file structure and content."""
     try:
-        df = pd.read_excel(file_path)
+        df = read_dataframe(file_path)
         
         # Basic validation
         if df.empty:
@@ -107,50 +125,254 @@ def validate_text_file(file_path: str) -> Dict:
     except Exception as e:
         return {'valid': False, 'error': str(e)}
 
+# MinHash parameters follow the classic (a * x + b) mod p universal hashing scheme
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+def _normalize_for_dedup(text: str) -> str:
+    """Normalize text so trivially different copies hash identically."""
+    return re.sub(r'\s+', ' ', str(text).lower()).strip()
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """32-bit hashes of the word shingles of a normalized text."""
+    words = text.split(' ')
+    if len(words) < shingle_size:
+        shingles = {text}
+    else:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles],
+        dtype=np.uint64
+    )
+
+def _iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _minhash_permutations(num_perm: int, seed: int):
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def _signature_chunk(texts: List[str], num_perm: int, shingle_size: int, seed: int) -> List[tuple]:
+    """Exact hash, MinHash signature and token count for a chunk of texts (worker process)."""
+    a, b = _minhash_permutations(num_perm, seed)
+    results = []
+    for text in texts:
+        normalized = _normalize_for_dedup(text)
+        exact_hash = hashlib.sha1(normalized.encode('utf-8')).digest()
+        hashes = _shingle_hashes(normalized, shingle_size)
+        with np.errstate(over='ignore'):
+            permuted = ((hashes[:, None] * a + b) % MERSENNE_PRIME) & MAX_HASH
+        results.append((exact_hash, permuted.min(axis=0).astype(np.uint32), len(normalized.split())))
+    return results
+
+def optimal_lsh_bands(threshold: float, num_perm: int) -> int:
+    """Pick the band count whose S-curve threshold (1/b)^(1/r) is closest to ``threshold``."""
+    candidates = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(candidates, key=lambda bands: abs((1 / bands) ** (bands / num_perm) - threshold))
+
+class MinHashDeduplicator:
+    """Streaming exact + near-duplicate filter using MinHash with LSH banding.
+
+    Texts are fed in order with ``filter``; the first occurrence is kept and later
+    copies whose estimated Jaccard similarity reaches ``threshold`` are dropped.
+    Signatures are computed in parallel across ``n_jobs`` processes.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        num_bands: Optional[int] = None,
+        shingle_size: int = 5,
+        n_jobs: Optional[int] = None,
+        chunk_size: int = 1000,
+        seed: int = 42
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.num_bands = num_bands or optimal_lsh_bands(threshold, num_perm)
+        self.rows_per_band = num_perm // self.num_bands
+        self.shingle_size = shingle_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+        self._exact_hashes = set()
+        self._buckets = [{} for _ in range(self.num_bands)]
+        self._signatures = []
+        self.stats = {
+            'rows_total': 0,
+            'rows_removed_exact': 0,
+            'rows_removed_near': 0,
+            'tokens_total': 0,
+            'tokens_removed': 0
+        }
+
+    def _signatures_in_order(self, texts: Iterable[str]) -> Iterator[tuple]:
+        """Compute signatures with a bounded window of in-flight chunks, preserving order."""
+        chunks = _iter_chunks(texts, self.chunk_size)
+        if self.n_jobs == 1:
+            for chunk in chunks:
+                yield from _signature_chunk(chunk, self.num_perm, self.shingle_size, self.seed)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_signature_chunk, chunk, self.num_perm, self.shingle_size, self.seed))
+                if len(pending) >= self.n_jobs * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _is_near_duplicate(self, signature: np.ndarray, band_keys: List[bytes]) -> bool:
+        for band, key in enumerate(band_keys):
+            candidate = self._buckets[band].get(key)
+            if candidate is not None and np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return True
+        return False
+
+    def filter(self, texts: Iterable[str]) -> Iterator[bool]:
+        """Yield ``True`` for each text to keep, in input order."""
+        for exact_hash, signature, num_tokens in self._signatures_in_order(texts):
+            self.stats['rows_total'] += 1
+            self.stats['tokens_total'] += num_tokens
+
+            if exact_hash in self._exact_hashes:
+                self.stats['rows_removed_exact'] += 1
+                self.stats['tokens_removed'] += num_tokens
+                yield False
+                continue
+
+            band_keys = [
+                signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+                for band in range(self.num_bands)
+            ]
+            if self._is_near_duplicate(signature, band_keys):
+                self.stats['rows_removed_near'] += 1
+                self.stats['tokens_removed'] += num_tokens
+                yield False
+                continue
+
+            self._exact_hashes.add(exact_hash)
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, index)
+            yield True
+
+def deduplicate_dataframe(
+    df: pd.DataFrame,
+    column: str = 'text',
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    n_jobs: Optional[int] = None
+) -> tuple:
+    """Drop exact and near-duplicate rows of ``df[column]``; returns ``(df, stats)``."""
+    try:
+        deduplicator = MinHashDeduplicator(threshold=threshold, num_perm=num_perm, n_jobs=n_jobs)
+        keep = np.fromiter(deduplicator.filter(df[column].astype(str)), dtype=bool, count=len(df))
+        return df[keep], deduplicator.stats
+    
+    except Exception as e:
+        raise Exception(f"Error deduplicating dataset: {str(e)}")
+
 def prepare_dataset_for_training(
     file_path: str,
     validation_split: float = 0.1,
     test_split: float = 0.1,
-    random_state: int = 42
+    random_state: int = 42,
+    deduplicate: bool = False,
+    dedup_threshold: float = 0.8,
+    split_mode: str = 'random',
+    split_key: str = 'text'
 ) -> Dict[str, pd.DataFrame]:
-    """Prepare dataset for training with train/validation/test splits."""
+    """Prepare dataset for training with train/validation/test splits.
+
+    With ``deduplicate`` exact and near-duplicate texts are removed before
+    splitting; the removal report is attached as ``attrs['deduplication']``.
+    ``split_mode='hash'`` assigns rows from a stable hash of ``split_key``
+    instead of shuffling, matching ``iter_dataset_for_training``.
+    """
     try:
-        # Read file based on extension
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-        else:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            df = pd.DataFrame({'text': [content]})
+        # Read the memory-mapped columnar copy of the file
+        df = read_dataframe(file_path)
         
         # Clean text
         if 'text' in df.columns:
-            df['text'] = df['text'].apply(clean_text)
+            df['text'] = clean_text_series(df['text'])
+        
+        # Remove duplicates before splitting so they cannot leak across splits
+        dedup_stats = None
+        if deduplicate and 'text' in df.columns:
+            df, dedup_stats = deduplicate_dataframe(df, 'text', threshold=dedup_threshold)
         
         # Split dataset
-        train_df, temp_df = train_test_split(
-            df,
-            test_size=validation_split + test_split,
-            random_state=random_state
-        )
-        
-        val_df, test_df = train_test_split(
-            temp_df,
-            test_size=test_split / (validation_split + test_split),
-            random_state=random_state
-        )
+        if split_mode == 'hash':
+            indices = hash_split_indices(df[split_key], validation_split, test_split, random_state)
+            splits = {name: df.take(split_indices) for name, split_indices in indices.items()}
+        elif split_mode == 'random':
+            train_df, temp_df = train_test_split(
+                df,
+                test_size=validation_split + test_split,
+                random_state=random_state
+            )
+            
+            val_df, test_df = train_test_split(
+                temp_df,
+                test_size=test_split / (validation_split + test_split),
+                random_state=random_state
+            )
+            
+            splits = {
+                'train': train_df,
+                'validation': val_df,
+                'test': test_df
+            }
+        else:
+            raise ValueError(f"Unsupported split mode: {split_mode}")
+        if dedup_stats is not None:
+            for split_df in splits.values():
+                split_df.attrs['deduplication'] = dedup_stats
         
-        return {
-            'train': train_df,
-            'validation': val_df,
-            'test': test_df
-        }
+        return splits
     
     except Exception as e:
         raise Exception(f"Error preparing dataset: {str(e)}")
 
+def iter_dataset_for_training(
+    file_path: str,
+    chunk_size: int = 10000,
+    split: Optional[str] = None,
+    split_key: str = 'text',
+    validation_split: float = 0.1,
+    test_split: float = 0.1,
+    random_state: int = 42
+) -> Iterator[pd.DataFrame]:
+    """Stream a CSV/JSONL dataset as cleaned chunks with constant memory.
+
+    If ``split`` is given, only rows hashed into that split are yielded; the
+    assignment is the same as ``prepare_dataset_for_training(split_mode='hash')``.
+    """
+    try:
+        for chunk in iter_file_chunks(file_path, chunk_size=chunk_size):
+            if 'text' in chunk.columns:
+                chunk['text'] = clean_text_series(chunk['text'])
+            if split is not None:
+                assignments = hash_split_assignments(chunk[split_key], validation_split, test_split, random_state)
+                chunk = chunk[assignments == SPLIT_NAMES.index(split)]
+            yield chunk
+    
+    except Exception as e:
+        raise Exception(f"Error streaming dataset: {str(e)}")
+
 def format_prompt_template(
     template: str,
     variables: Dict[str, str]
@@ -163,6 +385,44 @@ def format_prompt_template(
     except Exception as e:
         raise Exception(f"Error formatting template: {str(e)}")
 
+def compile_prompt_template(template: str) -> List[tuple]:
+    """Parse a template once into ``(literal, field, format_spec, conversion)`` parts."""
+    try:
+        return list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise Exception(f"Error parsing template: {str(e)}")
+
+def render_prompt_template(
+    compiled: List[tuple],
+    df: pd.DataFrame,
+    variables: Optional[Dict[str, str]] = None
+) -> pd.Series:
+    """Render a compiled template for every row, one column operation per field.
+
+    Fields are looked up in ``variables`` (renamed columns) before ``df``.
+    """
+    variables = variables or {}
+    rendered = np.full(len(df), '', dtype=object)
+    for literal, field, format_spec, conversion in compiled:
+        if literal:
+            rendered = rendered + literal
+        if field is None:
+            continue
+        
+        column_name = variables.get(field, field)
+        if column_name not in df.columns:
+            raise Exception(f"Missing required variable in template: '{field}'")
+        values = df[column_name]
+        
+        if format_spec or conversion:
+            # Rare case: fall back to str.format semantics for this field only
+            field_template = '{0' + (f'!{conversion}' if conversion else '') + (f':{format_spec}' if format_spec else '') + '}'
+            rendered = rendered + values.map(field_template.format).to_numpy(dtype=object)
+        else:
+            rendered = rendered + values.astype(str).to_numpy(dtype=object)
+    
+    return pd.Series(rendered, index=df.index, dtype=object)
+
 def create_prompt_dataset(
     df: pd.DataFrame,
     template: str,
@@ -171,50 +431,176 @@ def create_prompt_dataset(
 ) -> pd.DataFrame:
     """Create dataset with formatted prompts."""
     try:
-        # Create copy of dataframe
-        result_df = df.copy()
-        
-        # Format prompts
-        result_df['prompt'] = result_df.apply(
-            lambda row: format_prompt_template(
-                template,
-                {input_column: row[input_column]}
-            ),
-            axis=1
-        )
+        # Parse the template once and render whole columns at a time
+        compiled = compile_prompt_template(template)
+        new_columns = {'prompt': render_prompt_template(compiled, df, {input_column: input_column})}
         
         # Add output if specified
         if output_column and output_column in df.columns:
-            result_df['output'] = df[output_column]
+            new_columns['output'] = df[output_column]
         
-        return result_df
+        # Existing prompt/output columns are replaced in place, as before
+        return df.assign(**new_columns)
     
     except Exception as e:
         raise Exception(f"Error creating prompt dataset: {str(e)}")
 
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+def _iter_frame_chunks(
+    split_data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """Yield a split as DataFrame chunks, whether it is a frame or an iterator of frames."""
+    if isinstance(split_data, pd.DataFrame):
+        for start in range(0, max(len(split_data), 1), chunk_size):
+            yield split_data.iloc[start:start + chunk_size]
+    else:
+        yield from split_data
+
+def _open_compressed(path: str, compression: Optional[str]):
+    """Open a binary output stream with optional gzip/zstd compression."""
+    if compression is None:
+        return open(path, 'wb')
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+def _write_split(
+    split_data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    output_path: str,
+    format: str,
+    compression: Optional[str],
+    chunk_size: int
+) -> Dict:
+    """Write one split chunk by chunk and return its manifest entry."""
+    rows = 0
+    columns = None
+    
+    if format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        empty_table = None
+        try:
+            for chunk in _iter_frame_chunks(split_data, chunk_size):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if len(chunk) == 0:
+                    empty_table = table
+                    continue
+                if writer is None:
+                    # An all-null column of the first chunk is inferred as null type;
+                    # store it as string so later chunks with values still fit
+                    schema = pa.schema([
+                        field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                        for field in table.schema.remove_metadata()
+                    ])
+                    writer = pq.ParquetWriter(output_path, schema, compression=compression or 'none')
+                    columns = table.column_names
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+            if writer is None and empty_table is not None:
+                # Empty split: still write a file with the columns
+                writer = pq.ParquetWriter(output_path, empty_table.schema, compression=compression or 'none')
+                columns = empty_table.column_names
+        finally:
+            if writer is not None:
+                writer.close()
+    
+    elif format in ('jsonl', 'csv'):
+        header_written = False
+        with _open_compressed(output_path, compression) as f:
+            for chunk in _iter_frame_chunks(split_data, chunk_size):
+                if columns is None:
+                    columns = list(chunk.columns)
+                if format == 'jsonl':
+                    text = chunk.to_json(orient='records', lines=True, force_ascii=False)
+                    if text and not text.endswith('\n'):
+                        text += '\n'
+                else:
+                    # Leading empty chunks must not repeat the header
+                    text = chunk.to_csv(index=False, header=not header_written)
+                    header_written = True
+                f.write(text.encode('utf-8'))
+                rows += len(chunk)
+    
+    elif format == 'json':
+        # Legacy single-array output; needs the whole split in memory
+        split_df = pd.concat(list(_iter_frame_chunks(split_data, chunk_size)))
+        split_df.to_json(output_path, orient='records', indent=2)
+        rows, columns = len(split_df), list(split_df.columns)
+    
+    else:
+        raise ValueError(f"Unsupported format: {format}")
+    
+    sha256 = hashlib.sha256()
+    with open(output_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    
+    return {
+        'path': os.path.basename(output_path),
+        'rows': rows,
+        'columns': columns or [],
+        'bytes': os.path.getsize(output_path),
+        'sha256': sha256.hexdigest()
+    }
+
 def save_dataset(
-    dataset: Dict[str, pd.DataFrame],
+    dataset: Dict[str, Union[pd.DataFrame, Iterable[pd.DataFrame]]],
     output_dir: str,
-    format: str = 'csv'
+    format: str = 'csv',
+    compression: Optional[str] = None,
+    chunk_size: int = 100000,
+    max_workers: Optional[int] = None
 ) -> Dict[str, str]:
-    """Save dataset splits to files."""
+    """Save dataset splits to files.
+
+    Splits may be DataFrames or iterators of DataFrame chunks and are written in
+    parallel. ``jsonl`` and ``csv`` support ``gzip``/``zstd`` stream compression;
+    ``parquet`` compresses per column chunk. A ``manifest.json`` with row counts
+    and SHA-256 hashes is written next to the splits.
+    """
     try:
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression and format == 'json':
+            raise ValueError("Compression is not supported for the json format")
+        
         os.makedirs(output_dir, exist_ok=True)
-        saved_files = {}
+        extension = format if format == 'parquet' else format + COMPRESSION_EXTENSIONS[compression]
+        output_paths = {
+            split_name: os.path.join(output_dir, f'{split_name}.{extension}')
+            for split_name in dataset
+        }
         
-        for split_name, split_df in dataset.items():
-            output_path = os.path.join(output_dir, f'{split_name}.{format}')
-            
-            if format == 'csv':
-                split_df.to_csv(output_path, index=False)
-            elif format == 'json':
-                split_df.to_json(output_path, orient='records', indent=2)
-            else:
-                raise ValueError(f"Unsupported format: {format}")
-            
-            saved_files[split_name] = output_path
+        with ThreadPoolExecutor(max_workers=max_workers or len(dataset) or 1) as executor:
+            futures = {
+                split_name: executor.submit(
+                    _write_split, split_data, output_paths[split_name], format, compression, chunk_size
+                )
+                for split_name, split_data in dataset.items()
+            }
+            splits = {split_name: future.result() for split_name, future in futures.items()}
+        
+        manifest = {
+            'format': format,
+            'compression': compression,
+            'created_at': datetime.now().isoformat(),
+            'splits': splits
+        }
+        with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
         
-        return saved_files
+        return output_paths
     
     except Exception as e:
-        raise Exception(f"Error saving dataset: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error saving dataset: {str(e)}")
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import torch
+
+
+def load_draft_model(name_or_path: str, target_model, target_tokenizer):
+    """Load a small draft model and check it shares the target's tokenizer."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    draft_tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+    if draft_tokenizer.get_vocab() != target_tokenizer.get_vocab():
+        raise ValueError(f"Draft model {name_or_path} does not share the deployed model's tokenizer")
+
+    draft = AutoModelForCausalLM.from_pretrained(
+        name_or_path,
+        torch_dtype=target_model.dtype,
+        low_cpu_mem_usage=True
+    )
+    draft.to(target_model.device)
+    draft.eval()
+    return draft
+
+
+class AssistedGenerator:
+    """Greedy text generation with optional draft-model assisted decoding.
+
+    With a draft model, ``model.generate(assistant_model=...)`` lets the draft
+    propose tokens that the target verifies in one forward pass. Under greedy
+    decoding the output is identical to plain decoding. Forward hooks count
+    target and draft calls per request to estimate the acceptance rate. When the
+    rolling rate over ``window`` requests drops below ``min_acceptance_rate``,
+    requests fall back to plain decoding, and every ``probe_interval`` requests
+    one assisted request re-measures the rate.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        draft_model=None,
+        min_acceptance_rate: float = 0.3,
+        window: int = 20,
+        probe_interval: int = 50
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.draft_model = draft_model
+        self.min_acceptance_rate = min_acceptance_rate
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._acceptance = deque(maxlen=window)
+        self._throughput = {'assisted': deque(maxlen=window), 'plain': deque(maxlen=window)}
+        self._requests = 0
+        self._assisted_requests = 0
+        self._since_probe = 0
+
+        # Forward calls are counted per thread, so concurrent requests don't mix
+        self._calls = threading.local()
+        if draft_model is not None:
+            model.register_forward_hook(lambda *args: self._count_call('target'))
+            draft_model.register_forward_hook(lambda *args: self._count_call('draft'))
+
+    def _count_call(self, name: str):
+        counts = getattr(self._calls, 'counts', None)
+        if counts is not None:
+            counts[name] += 1
+
+    @property
+    def acceptance_rate(self) -> Optional[float]:
+        with self._lock:
+            if not self._acceptance:
+                return None
+            return sum(self._acceptance) / len(self._acceptance)
+
+    def _use_draft(self) -> bool:
+        if self.draft_model is None:
+            return False
+        rate = self.acceptance_rate
+        if rate is None or rate >= self.min_acceptance_rate:
+            return True
+        with self._lock:
+            self._since_probe += 1
+            if self._since_probe >= self.probe_interval:
+                self._since_probe = 0
+                return True
+        return False
+
+    def generate(self, prompt: str, max_length: int = 100, adapter_id: Optional[str] = None) -> str:
+        if adapter_id is not None:
+            raise ValueError("This deployment does not serve adapters")
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        assisted = self._use_draft()
+        self._calls.counts = {'target': 0, 'draft': 0}
+
+        start = time.perf_counter()
+        try:
+            with torch.inference_mode():
+                if assisted:
+                    outputs = self.model.generate(
+                        **inputs,
+                        assistant_model=self.draft_model,
+                        do_sample=False,
+                        max_length=max_length
+                    )
+                else:
+                    outputs = self.model.generate(
+                        **inputs,
+                        do_sample=False,
+                        max_length=max_length,
+                        num_return_sequences=1
+                    )
+        finally:
+            counts = self._calls.counts
+            self._calls.counts = None
+        elapsed = time.perf_counter() - start
+
+        new_tokens = outputs.shape[1] - inputs['input_ids'].shape[1]
+        with self._lock:
+            self._requests += 1
+            self._throughput['assisted' if assisted else 'plain'].append(new_tokens / max(elapsed, 1e-9))
+            if assisted and counts['draft']:
+                # Each verification pass emits the accepted draft tokens plus one target token
+                accepted = max(0, new_tokens - counts['target'])
+                self._acceptance.append(min(1.0, accepted / counts['draft']))
+                self._assisted_requests += 1
+
+        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+    @property
+    def stats(self) -> Dict:
+        rate = self.acceptance_rate
+        with self._lock:
+            throughput = {
+                mode: (sum(values) / len(values) if values else None)
+                for mode, values in self._throughput.items()
+            }
+            return {
+                'draft_model': getattr(self.draft_model, 'name_or_path', None),
+                'mode': 'assisted' if self.draft_model is not None and (rate is None or rate >= self.min_acceptance_rate) else 'plain',
+                'requests': self._requests,
+                'assisted_requests': self._assisted_requests,
+                'acceptance_rate': rate,
+                'tokens_per_second': throughput
+            }
@@ -0,0 +1,56 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+SPLIT_NAMES = ('train', 'validation', 'test')
+
+# Defaults shared by training, streaming and /evaluate so they assign rows alike
+DEFAULT_VALIDATION_SPLIT = 0.1
+DEFAULT_TEST_SPLIT = 0.0
+DEFAULT_SPLIT_SEED = 42
+
+
+def _hash_key(seed: int) -> str:
+    # hash_pandas_object expects a 16 character key
+    return f'{seed:016d}'[-16:]
+
+
+def hash_split_assignments(
+    keys: pd.Series,
+    validation_split: float = 0.1,
+    test_split: float = 0.1,
+    seed: int = 42
+) -> np.ndarray:
+    """Assign each key to a split (0=train, 1=validation, 2=test) from a stable hash.
+
+    The assignment depends only on the key value and ``seed``, so it is identical
+    across runs, chunkings and processes, including streaming mode.
+    """
+    hashes = pd.util.hash_pandas_object(keys.astype(str), index=False, hash_key=_hash_key(seed)).to_numpy()
+    # Top 53 bits map exactly onto a float in [0, 1)
+    fractions = (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+    train_split = 1.0 - validation_split - test_split
+    return np.searchsorted([train_split, train_split + validation_split], fractions, side='right').astype(np.int8)
+
+
+def hash_split_indices(
+    keys: pd.Series,
+    validation_split: float = 0.1,
+    test_split: float = 0.1,
+    seed: int = 42
+) -> Dict[str, np.ndarray]:
+    """Positional row indices of each split; no rows are copied."""
+    assignments = hash_split_assignments(keys, validation_split, test_split, seed)
+    return {name: np.flatnonzero(assignments == code) for code, name in enumerate(SPLIT_NAMES)}
+
+
+def split_settings(config: Dict) -> Dict:
+    """Hash split parameters of a training or evaluation config, with the shared defaults."""
+    return {
+        'key': config.get('split_key') or config.get('text_column', 'text'),
+        'validation_split': config.get('validation_split') or DEFAULT_VALIDATION_SPLIT,
+        'test_split': config.get('test_split') or DEFAULT_TEST_SPLIT,
+        'seed': config.get('seed', DEFAULT_SPLIT_SEED)
+    }
@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(values: Dict) -> str:
+    return json.dumps(values, default=_json_default)
+
+
+class StateStore:
+    """Interface for state shared between backend worker processes.
+
+    State is grouped in namespaces holding a JSON object. Every write bumps the
+    namespace version, which readers can use as a cheap change counter.
+    """
+
+    def get(self, namespace: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def update(self, namespace: str, values: Dict, defaults: Optional[Dict] = None) -> int:
+        """Merge ``values`` into the namespace atomically and return the new version."""
+        raise NotImplementedError
+
+    def version(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    """In-process store; only valid when the backend runs as a single process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, namespace):
+        with self._lock:
+            entry = self._data.get(namespace)
+            return json.loads(entry[0]) if entry else None
+
+    def update(self, namespace, values, defaults=None):
+        with self._lock:
+            value, version = self._data.get(namespace, (None, 0))
+            current = json.loads(value) if value else dict(defaults or {})
+            current.update(values)
+            self._data[namespace] = (_dumps(current), version + 1)
+            return version + 1
+
+    def version(self, namespace):
+        with self._lock:
+            return self._data.get(namespace, (None, 0))[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteStateStore(StateStore):
+    """Store backed by a SQLite file; SQLite's file locks serialize writers across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS state ('
+            'namespace TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, re-opened after fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace):
+        row = self._connection().execute(
+            'SELECT value FROM state WHERE namespace = ?', (namespace,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, namespace, values, defaults=None):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, version FROM state WHERE namespace = ?', (namespace,)
+            ).fetchone()
+            current = json.loads(row[0]) if row else dict(defaults or {})
+            version = (row[1] if row else 0) + 1
+            current.update(values)
+            connection.execute(
+                'INSERT OR REPLACE INTO state (namespace, value, version) VALUES (?, ?, ?)',
+                (namespace, _dumps(current), version)
+            )
+            connection.execute('COMMIT')
+            return version
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def version(self, namespace):
+        row = self._connection().execute(
+            'SELECT version FROM state WHERE namespace = ?', (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def clear(self):
+        self._connection().execute('DELETE FROM state')
+
+
+# URL scheme -> factory; networked stores (e.g. redis://) can be registered here
+_BACKENDS: Dict[str, Callable[[str], StateStore]] = {
+    'memory': lambda url: MemoryStateStore(),
+    'sqlite': lambda url: SQLiteStateStore(url[len('sqlite:///'):])
+}
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def register_state_backend(scheme: str, factory: Callable[[str], StateStore]) -> None:
+    """Register a store implementation for URLs of the form ``<scheme>://...``."""
+    _BACKENDS[scheme] = factory
+
+
+def configure_state_store(url: str) -> StateStore:
+    """Select the store used by all ``SharedState`` objects in this process.
+
+    ``sqlite:///relative/path.db`` and ``sqlite:////absolute/path.db`` use SQLite,
+    ``memory://`` keeps state in-process.
+    """
+    global _store
+    scheme = urlparse(url).scheme
+    if scheme not in _BACKENDS:
+        raise ValueError(f"Unsupported state store: {scheme}")
+    with _store_lock:
+        _store = _BACKENDS[scheme](url)
+    return _store
+
+
+def get_state_store() -> StateStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MemoryStateStore()
+        return _store
+
+
+class SharedState(MutableMapping):
+    """Dict-like view of one store namespace, used for the blueprint state globals.
+
+    Values must be JSON serializable; datetimes are stored as ISO strings.
+    """
+
+    def __init__(self, namespace: str, defaults: Dict):
+        self.namespace = namespace
+        self.defaults = dict(defaults)
+
+    def to_dict(self) -> Dict:
+        stored = get_state_store().get(self.namespace)
+        return stored if stored is not None else json.loads(_dumps(self.defaults))
+
+    @property
+    def version(self) -> int:
+        return get_state_store().version(self.namespace)
+
+    def update(self, *args, **kwargs):
+        # One atomic write instead of MutableMapping's per-key updates
+        get_state_store().update(self.namespace, dict(*args, **kwargs), self.defaults)
+
+    def reset(self):
+        self.update(self.defaults)
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        raise TypeError("Shared state keys cannot be deleted")
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
@@ -0,0 +1,163 @@
+import io
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.columnar import DATASET_SUFFIX, columnar_files
+from utils.splits import SPLIT_NAMES, hash_split_assignments, split_settings
+
+STREAMABLE_EXTENSIONS = ('.csv', '.jsonl', DATASET_SUFFIX)
+
+
+def _iter_line_ranges(
+    file_path: str,
+    chunk_size: int,
+    shard_index: int,
+    num_shards: int,
+    has_header: bool
+) -> Iterator[Tuple[bytes, List[bytes]]]:
+    """Yield ``(header, lines)`` chunks of the shard's byte range of a line-based file.
+
+    The data after the header is cut into ``num_shards`` equal byte ranges; a shard
+    owns every line that starts inside its range, so each line is read exactly once.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline() if has_header else b''
+        data_start = f.tell()
+        span = os.path.getsize(file_path) - data_start
+        start = data_start + span * shard_index // num_shards
+        end = data_start + span * (shard_index + 1) // num_shards
+
+        if start > data_start:
+            # Skip the rest of the line that began before this range
+            f.seek(start - 1)
+            f.readline()
+
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                lines.append(line)
+            if len(lines) == chunk_size:
+                yield header, lines
+                lines = []
+        if lines:
+            yield header, lines
+
+
+def iter_file_chunks(
+    file_path: str,
+    chunk_size: int = 10000,
+    shard_index: int = 0,
+    num_shards: int = 1
+) -> Iterator[pd.DataFrame]:
+    """Yield shard ``shard_index`` of ``num_shards`` of a CSV/JSONL file as DataFrame chunks.
+
+    With several shards each one parses only its own byte range of the file (CSV
+    fields must not contain line breaks then). Multi-file dataset definitions are
+    read from their memory-mapped Arrow shards, every ``num_shards``-th batch each.
+    """
+    if file_path.endswith(DATASET_SUFFIX):
+        chunk_index = 0
+        for path in columnar_files(file_path):
+            table = pa.ipc.open_stream(pa.memory_map(path, 'r')).read_all()
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                if chunk_index % num_shards == shard_index:
+                    yield batch.to_pandas()
+                chunk_index += 1
+        return
+
+    if not file_path.endswith(('.csv', '.jsonl')):
+        raise ValueError(f"Streaming is only supported for {', '.join(STREAMABLE_EXTENSIONS)} files")
+    is_csv = file_path.endswith('.csv')
+
+    if num_shards == 1:
+        if is_csv:
+            reader = pd.read_csv(file_path, chunksize=chunk_size)
+        else:
+            reader = pd.read_json(file_path, lines=True, chunksize=chunk_size)
+        with reader:
+            yield from reader
+        return
+
+    for header, lines in _iter_line_ranges(file_path, chunk_size, shard_index, num_shards, is_csv):
+        if is_csv:
+            yield pd.read_csv(io.BytesIO(header + b''.join(lines)))
+        else:
+            yield pd.read_json(io.BytesIO(b''.join(lines)), lines=True)
+
+
+def _generate_tokenized_examples(
+    shards: List[Tuple[str, int, int]],
+    tokenizer,
+    text_column: str,
+    max_length: int,
+    chunk_size: int,
+    split: Optional[Dict] = None
+) -> Iterator[Dict]:
+    """Tokenize the chunks of each shard; runs inside DataLoader worker processes."""
+    for file_path, shard_index, num_shards in shards:
+        for chunk in iter_file_chunks(file_path, chunk_size, shard_index, num_shards):
+            if split is not None:
+                assignments = hash_split_assignments(
+                    chunk[split['key']],
+                    split['validation_split'],
+                    split['test_split'],
+                    split['seed']
+                )
+                chunk = chunk[assignments == SPLIT_NAMES.index(split['name'])]
+            texts = chunk[text_column].dropna().astype(str).tolist()
+            if not texts:
+                continue
+            encodings = tokenizer(texts, truncation=True, max_length=max_length)
+            for input_ids, attention_mask in zip(encodings['input_ids'], encodings['attention_mask']):
+                yield {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+
+def build_streaming_dataset(file_path: str, tokenizer, config: Dict, split: Optional[str] = None):
+    """Build a shuffled ``IterableDataset`` that tokenizes the file on the fly.
+
+    The file is split into ``dataloader_num_workers`` byte-range shards so each
+    DataLoader worker parses and tokenizes only its own share. Memory stays bounded
+    by ``chunk_size`` rows per worker plus the ``shuffle_buffer_size`` examples.
+    With ``split``, only rows hashed into that split (see ``utils.splits``) are kept.
+    """
+    from datasets import IterableDataset
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    num_shards = max(1, config.get('dataloader_num_workers', 0))
+    shards = [(file_path, shard_index, num_shards) for shard_index in range(num_shards)]
+
+    dataset = IterableDataset.from_generator(
+        _generate_tokenized_examples,
+        gen_kwargs={
+            'shards': shards,
+            'tokenizer': tokenizer,
+            'text_column': config.get('text_column', 'text'),
+            'max_length': config.get('max_length', 512),
+            'chunk_size': config.get('chunk_size', 10000),
+            'split': None if split is None else {'name': split, **split_settings(config)}
+        }
+    )
+
+    if split not in (None, 'train'):
+        return dataset
+
+    return dataset.shuffle(
+        seed=config.get('seed', 42),
+        buffer_size=config.get('shuffle_buffer_size', 10000)
+    )
+
+
+def read_sample_texts(file_path: str, num_samples: int, text_column: str = 'text') -> List[str]:
+    """Read the first ``num_samples`` texts without loading the whole file."""
+    chunk = next(iter_file_chunks(file_path, chunk_size=num_samples), None)
+    if chunk is None:
+        return []
+    return chunk[text_column].dropna().astype(str).tolist()
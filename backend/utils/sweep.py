@@ -0,0 +1,221 @@
+import itertools
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Configuration keys understood by get_training_arguments / prepare_model_for_training
+SWEEPABLE_PARAMS = ['learning_rate', 'lora_r', 'lora_alpha', 'batch_size', 'epochs']
+
+
+def expand_search_space(
+    search_space: Dict,
+    num_trials: Optional[int] = None,
+    seed: int = 42
+) -> List[Dict]:
+    """Expand a search space into a list of trial configurations.
+
+    Each parameter is either a list of candidate values (grid) or a range
+    ``{'min': ..., 'max': ..., 'scale': 'log' | 'linear'}`` that is sampled.
+    """
+    unknown = [name for name in search_space if name not in SWEEPABLE_PARAMS]
+    if unknown:
+        raise ValueError(f"Unsupported sweep parameters: {', '.join(unknown)}")
+
+    rng = random.Random(seed)
+    grid_params = {k: v for k, v in search_space.items() if isinstance(v, list)}
+    range_params = {k: v for k, v in search_space.items() if isinstance(v, dict)}
+
+    grid = [dict(zip(grid_params, values)) for values in itertools.product(*grid_params.values())]
+    if range_params and num_trials is None:
+        raise ValueError("num_trials is required when sampling parameter ranges")
+
+    if num_trials is not None and num_trials < len(grid):
+        grid = rng.sample(grid, num_trials)
+    elif num_trials is not None and range_params:
+        grid = [grid[i % len(grid)] for i in range(num_trials)]
+
+    trials = []
+    for params in grid:
+        params = dict(params)
+        for name, spec in range_params.items():
+            low, high = spec['min'], spec['max']
+            if spec.get('scale', 'linear') == 'log':
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            params[name] = int(round(value)) if name in ('lora_r', 'lora_alpha', 'batch_size', 'epochs') else value
+        trials.append(params)
+
+    return trials
+
+
+def prepare_shared_dataset(file_path, tokenizer, config, cache_dir):
+    """Tokenize the dataset once and store it as memory-mapped Arrow for all trials."""
+    from datasets import DatasetDict
+    from utils.training_utils import prepare_dataset
+
+    config = dict(config)
+    config['validation_split'] = config.get('validation_split') or 0.1
+    train_dataset, eval_dataset = prepare_dataset(file_path, tokenizer, config)
+
+    dataset_dir = os.path.join(cache_dir, 'tokenized')
+    DatasetDict({'train': train_dataset, 'validation': eval_dataset}).save_to_disk(dataset_dir)
+    return dataset_dir
+
+
+def _init_trial_worker(threads_per_trial):
+    """Pin the intra-op thread pool of a trial worker process."""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_trial)
+    os.environ['MKL_NUM_THREADS'] = str(threads_per_trial)
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+    import torch
+    torch.set_num_threads(threads_per_trial)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Interop threads can only be set once per process
+        pass
+
+
+def _run_trial(model_name, trial_config, dataset_dir, output_dir):
+    """Train one trial up to ``trial_config['epochs']`` and return its eval loss."""
+    import torch
+    from datasets import load_from_disk
+    from transformers import AutoModelForCausalLM, AutoTokenizer, DataCollatorForLanguageModeling, TrainerCallback
+    from transformers.trainer_utils import get_last_checkpoint
+    from utils.training_utils import create_trainer, get_training_arguments, prepare_model_for_training
+
+    class SaveOnTrainEnd(TrainerCallback):
+        # Rung budgets are fractional epochs, so force a checkpoint at the last step
+        def on_step_end(self, args, state, control, **kwargs):
+            if state.global_step >= state.max_steps:
+                control.should_save = True
+            return control
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+    model = prepare_model_for_training(model, trial_config)
+
+    dataset = load_from_disk(dataset_dir)
+    # Evaluation is run explicitly once the rung budget is spent
+    training_args = get_training_arguments(
+        {**trial_config, 'validation_split': 0, 'report_to': 'none', 'use_cpu': True},
+        output_dir
+    )
+
+    trainer = create_trainer(model, dataset['train'], dataset['validation'], training_args, tokenizer)
+    trainer.data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+    trainer.add_callback(SaveOnTrainEnd())
+
+    resume_from = get_last_checkpoint(output_dir) if os.path.isdir(output_dir) else None
+    trainer.train(resume_from_checkpoint=resume_from)
+    metrics = trainer.evaluate()
+
+    return {
+        'eval_loss': metrics['eval_loss'],
+        'global_step': trainer.state.global_step
+    }
+
+
+def run_successive_halving(
+    trials: List[Dict],
+    base_config: Dict,
+    model_name: str,
+    dataset_dir: str,
+    output_dir: str,
+    max_workers: Optional[int] = None,
+    threads_per_trial: int = 1,
+    eta: int = 3,
+    on_update: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """Run trials in a CPU process pool, stopping the worst ``1 - 1/eta`` at each rung.
+
+    Every trial targets its own ``epochs`` budget; rung ``k`` of ``R`` trains it to
+    ``epochs * eta ** (k - R + 1)`` epochs, resuming from the previous rung's checkpoint.
+    """
+    if eta < 2:
+        raise ValueError("eta must be at least 2")
+
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // threads_per_trial)
+
+    num_rungs = max(1, int(math.floor(math.log(len(trials), eta))) + 1) if trials else 0
+    results = {}
+    for trial_id, params in enumerate(trials):
+        results[trial_id] = {
+            'trial_id': trial_id,
+            'params': params,
+            'status': 'pending',
+            'rung': -1,
+            'eval_loss': None,
+            'epochs_trained': 0
+        }
+
+    def notify():
+        if on_update:
+            on_update({'num_rungs': num_rungs, 'trials': list(results.values())})
+
+    alive = list(results)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=_init_trial_worker,
+        initargs=(threads_per_trial,)
+    ) as executor:
+        for rung in range(num_rungs):
+            fraction = eta ** (rung - num_rungs + 1)
+            futures = {}
+            for trial_id in alive:
+                trial = results[trial_id]
+                trial_config = {**base_config, **trial['params']}
+                trial_config['epochs'] = trial_config.get('epochs', 3) * fraction
+                trial.update({'status': 'running', 'rung': rung})
+                future = executor.submit(
+                    _run_trial,
+                    model_name,
+                    trial_config,
+                    dataset_dir,
+                    os.path.join(output_dir, f'trial-{trial_id}')
+                )
+                futures[future] = (trial_id, trial_config['epochs'])
+            notify()
+
+            for future in as_completed(futures):
+                trial_id, epochs = futures[future]
+                try:
+                    metrics = future.result()
+                    results[trial_id].update({
+                        'status': 'completed' if rung == num_rungs - 1 else 'promoted',
+                        'eval_loss': metrics['eval_loss'],
+                        'epochs_trained': epochs
+                    })
+                except Exception as e:
+                    results[trial_id].update({'status': 'failed', 'error': str(e)})
+                notify()
+
+            finished = [t for t in alive if results[t]['status'] != 'failed']
+            finished.sort(key=lambda t: results[t]['eval_loss'])
+            if rung < num_rungs - 1:
+                alive = finished[:max(1, len(finished) // eta)]
+                for trial_id in finished[len(alive):]:
+                    results[trial_id]['status'] = 'stopped'
+                notify()
+            else:
+                alive = finished
+
+    best = results[alive[0]] if alive else None
+    return {
+        'num_rungs': num_rungs,
+        'trials': list(results.values()),
+        'best_trial': best,
+        'finished_at': datetime.now().isoformat()
+    }
@@ -1,9 +1,11 @@
 import torch
 from transformers import Trainer, TrainingArguments
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from datasets import Dataset
-import pandas as pd
 import os
+from datetime import datetime
+from utils.columnar import load_hf_dataset, open_columnar
+from utils.splits import hash_split_indices, split_settings
+from utils.streaming import build_streaming_dataset
 
 def prepare_model_for_training(model, config):
     """Prepare model for fine-tuning based on the specified method."""
@@ -35,50 +37,102 @@ def prepare_model_for_training(model, config):
         return model
     
     elif config['finetune_type'] == 'dpo':
-        # For DPO, we need to prepare the model for preference learning
+        # The model is the DPO policy; reference log-probs are precomputed (utils.dpo),
+        # so no frozen copy of it is kept
         return model
     
     else:  # Full fine-tuning
         return model
 
-def get_training_arguments(config, output_dir):
+# Named bundles of training settings, selected with ``training_profile``
+TRAINING_PROFILES = {
+    'default': {},
+    # bf16 autocast on CPU, recomputed activations and factored optimizer state
+    'cpu_memory_saving': {
+        'use_cpu': True,
+        'bf16': True,
+        'gradient_checkpointing': True,
+        'optim': 'adafactor'
+    }
+}
+
+def apply_training_profile(config):
+    """Fill in the settings of ``config['training_profile']``; keys set explicitly win."""
+    profile = config.get('training_profile', 'default')
+    if profile not in TRAINING_PROFILES:
+        raise ValueError(f"Unknown training_profile: {profile}")
+    return {**TRAINING_PROFILES[profile], **config}
+
+def performance_arguments(config, model=None):
+    """Precision, checkpointing, optimizer and compilation TrainingArguments of ``config``.
+
+    fp16 mixed precision is on by default on CUDA, unless ``model`` has fp16
+    trainable weights, which the fp16 grad scaler cannot unscale.
+    """
+    bf16 = bool(config.get('bf16', False))
+    fp16 = config.get('fp16')
+    if fp16 is None:
+        fp16 = torch.cuda.is_available() and not config.get('use_cpu') and not (model is not None and any(
+            p.requires_grad and p.dtype == torch.float16 for p in model.parameters()
+        ))
+    return {
+        'bf16': bf16,
+        'fp16': not bf16 and bool(fp16),
+        'use_cpu': config.get('use_cpu', False),
+        'gradient_checkpointing': config.get('gradient_checkpointing', False),
+        # Non-reentrant checkpointing also works when the input embeddings are frozen (LoRA)
+        'gradient_checkpointing_kwargs': {'use_reentrant': False} if config.get('gradient_checkpointing') else None,
+        'optim': config.get('optim', 'adamw_torch'),
+        'torch_compile': config.get('torch_compile', False)
+    }
+
+def get_training_arguments(config, output_dir, model=None):
     """Get training arguments based on configuration."""
+    config = apply_training_profile(config)
     return TrainingArguments(
         output_dir=output_dir,
         num_train_epochs=config.get('epochs', 3),
+        max_steps=config.get('max_steps', -1),
         per_device_train_batch_size=config.get('batch_size', 4),
+        gradient_accumulation_steps=config.get('gradient_accumulation_steps', 1),
         learning_rate=config.get('learning_rate', 2e-4),
         max_grad_norm=config.get('max_grad_norm', 0.3),
         warmup_ratio=config.get('warmup_ratio', 0.03),
         logging_steps=config.get('logging_steps', 10),
+        dataloader_num_workers=config.get('dataloader_num_workers', 0),
         save_strategy="epoch",
         evaluation_strategy="epoch" if config.get('validation_split', 0) > 0 else "no",
         load_best_model_at_end=True if config.get('validation_split', 0) > 0 else False,
         metric_for_best_model="eval_loss" if config.get('validation_split', 0) > 0 else None,
         greater_is_better=False if config.get('validation_split', 0) > 0 else None,
-        fp16=torch.cuda.is_available(),
-        report_to="tensorboard"
+        ddp_backend=config.get('ddp_backend'),
+        report_to=config.get('report_to', "tensorboard"),
+        # DPO batches carry reference log-probs the model's forward does not accept
+        remove_unused_columns=config.get('finetune_type') != 'dpo',
+        **performance_arguments(config, model)
     )
 
 def prepare_dataset(file_path, tokenizer, config):
     """Prepare dataset for training."""
-    # Read dataset
-    if file_path.endswith('.csv'):
-        df = pd.read_csv(file_path)
-    elif file_path.endswith('.xlsx'):
-        df = pd.read_excel(file_path)
-    else:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        df = pd.DataFrame({'text': [content]})
+    # Stream and tokenize on the fly instead of loading the whole file
+    if config.get('streaming'):
+        if config.get('max_steps', -1) <= 0:
+            raise ValueError("max_steps is required when streaming the dataset")
+        if config.get('validation_split', 0) > 0:
+            # Hash-based splits are the only ones that can be assigned while streaming
+            return (
+                build_streaming_dataset(file_path, tokenizer, config, split='train'),
+                build_streaming_dataset(file_path, tokenizer, config, split='validation')
+            )
+        return build_streaming_dataset(file_path, tokenizer, config), None
     
-    # Convert to Hugging Face dataset
-    dataset = Dataset.from_pandas(df)
+    # Memory-map the columnar copy directly as a Hugging Face dataset
+    dataset = load_hf_dataset(file_path)
     
     # Tokenize dataset
     def tokenize_function(examples):
         return tokenizer(
-            examples['text'],
+            examples[config.get('text_column', 'text')],
             padding='max_length',
             truncation=True,
             max_length=config.get('max_length', 512)
@@ -90,12 +144,16 @@ def prepare_dataset(file_path, tokenizer, config):
         remove_columns=dataset.column_names
     )
     
-    # Split dataset if validation split is specified
+    # Split by a stable hash of split_key, the same assignment streaming and /evaluate use
     if config.get('validation_split', 0) > 0:
-        split_dataset = tokenized_dataset.train_test_split(
-            test_size=config['validation_split']
+        split = split_settings(config)
+        indices = hash_split_indices(
+            open_columnar(file_path, [split['key']]).column(split['key']).to_pandas(),
+            split['validation_split'],
+            split['test_split'],
+            split['seed']
         )
-        return split_dataset['train'], split_dataset['test']
+        return tokenized_dataset.select(indices['train']), tokenized_dataset.select(indices['validation'])
     
     return tokenized_dataset, None
 
@@ -115,6 +173,29 @@ def save_checkpoint(trainer, output_dir, checkpoint_name):
     trainer.save_model(checkpoint_path)
     return checkpoint_path
 
+def list_checkpoints(checkpoints_dir):
+    """List checkpoint and adapter directories below ``checkpoints_dir``.
+
+    The ``name`` of each entry is its path relative to ``checkpoints_dir``; it is
+    also the adapter ID used when serving LoRA adapters.
+    """
+    checkpoints = []
+    if not os.path.exists(checkpoints_dir):
+        return checkpoints
+    
+    for root, dirs, files in os.walk(checkpoints_dir):
+        dirs.sort()
+        is_adapter = 'adapter_config.json' in files
+        if root != checkpoints_dir and (os.path.basename(root).startswith('checkpoint-') or is_adapter):
+            checkpoints.append({
+                'name': os.path.relpath(root, checkpoints_dir),
+                'path': root,
+                'is_adapter': is_adapter,
+                'created_at': datetime.fromtimestamp(os.path.getctime(root)).isoformat()
+            })
+    
+    return checkpoints
+
 def load_checkpoint(model, checkpoint_path):
     """Load model from checkpoint."""
     return model.from_pretrained(checkpoint_path) 
\ No newline at end of file